@@ -0,0 +1,62 @@
+import os
+import re
+import dataclasses
+from typing import List, Optional
+from decoding import check_encoding
+
+_manifest_line = re.compile(r'^(.+?)\s+(\S+)$')
+_unsafe_name_chars = re.compile(r'[^A-Za-z0-9._-]+')
+
+
+@dataclasses.dataclass()
+class Repository:
+    path: str
+    commit_prefix: str
+    # Prefix of the repository's output files, unique within the batch
+    name: str
+    # Encoding of the repository's sources, detected per file if None
+    encoding: Optional[str] = None
+
+
+def read_manifest(manifest_file: str) -> List[Repository]:
+    # One "<repository path> <commit URL prefix> [<encoding>]" per line, paths relative to the manifest.
+    # Blank lines and lines starting with '#' are skipped.
+    base = os.path.dirname(os.path.abspath(manifest_file))
+    repos = []
+    names = set()
+    # Line of each repository path, as one repository listed twice would be analysed twice
+    lines = {}
+    with open(manifest_file, encoding='utf-8') as f:
+        for n, l in enumerate(f, 1):
+            l = l.strip()
+            if not l or l.startswith('#'):
+                continue
+            mlm = _manifest_line.match(l)
+            if not mlm:
+                raise ValueError("%s:%d: expected '<repository path> <commit URL prefix> [<encoding>]'" % (manifest_file, n))
+            encoding = None
+            eml = _manifest_line.match(mlm.group(1))
+            if eml:
+                # A URL prefix is never the name of an encoding, while a path may have spaces
+                try:
+                    encoding = check_encoding(mlm.group(2))
+                    mlm = eml
+                except ValueError:
+                    pass
+            path = os.path.normpath(os.path.join(base, mlm.group(1)))
+            if not os.path.isdir(path):
+                raise ValueError("%s:%d: no repository at %s" % (manifest_file, n, path))
+            real_path = os.path.realpath(path)
+            if real_path in lines:
+                raise ValueError("%s:%d: repository %s is listed on line %d already"
+                                 % (manifest_file, n, path, lines[real_path]))
+            lines[real_path] = n
+            name = _unsafe_name_chars.sub('_', os.path.basename(path)) or 'repo'
+            unique_name = name
+            k = 2
+            while unique_name in names:
+                unique_name = '%s_%d' % (name, k)
+                k += 1
+            names.add(unique_name)
+            repos.append(Repository(path, mlm.group(2), unique_name, encoding))
+    return repos
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Micro-benchmark of function header detection: re-running the _function_headers regex
+# on the joined lines after every line versus feeding the lines to function_header_feed().
+#   python benchmarks/function_headers.py [-n REPEAT]
+
+import os
+import sys
+import timeit
+import argparse
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from javadoc_analyzer import _function_headers, FUNCTION_HEADER_START, function_header_feed, function_header_matched
+
+
+def regex_lines(lines: List[str]) -> int:
+    linecode_list = []
+    for l in lines:
+        linecode_list.append(l)
+        if _function_headers.search("".join(linecode_list)):
+            break
+    return len(linecode_list)
+
+
+def incremental_lines(lines: List[str]) -> int:
+    state = FUNCTION_HEADER_START
+    n = 0
+    for l in lines:
+        n += 1
+        state = function_header_feed(state, l)
+        if function_header_matched(state):
+            break
+    return n
+
+
+SIGNATURES = {
+    'one-line header': [
+        '     public int add(int a, int b) {'
+    ],
+    'multi-line generic header': [
+        '     public <K extends Comparable<K>, V> java.util.Map<K, java.util.List<V>> groupAll(',
+        '             java.util.Map<K, java.util.List<V>> first,',
+        '             java.util.Map<K, java.util.List<V>> second,',
+        '             java.util.Map<K, java.util.List<V>> third)',
+        '             throws IllegalStateException, IllegalArgumentException {',
+    ],
+    'long generic field, no header': [
+        '     private final java.util.Map<String, java.util.Map<String, java.util.List<'
+        + 'java.util.Map<String, Integer>>>> ' + 'x' * 20 + ' = null;'
+    ] * 10,
+    'long argument list, never closed': [
+        '             ' + ', '.join('java.util.List<T%d> a%d' % (i, i) for i in range(12)) + ','
+    ] * 10,
+    'word soup without parentheses': [
+        '     ' + ' '.join(['a'] * 200)
+    ] * 10,
+}
+
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('-n', '--repeat', type=int, default=20)
+    args = argparser.parse_args()
+
+    print("%-34s %14s %14s %9s" % ("Signature", "regex, ms", "state, ms", "speedup"))
+    for name, lines in SIGNATURES.items():
+        assert regex_lines(lines) == incremental_lines(lines)
+        regex_time = min(timeit.repeat(lambda: regex_lines(lines), number=1, repeat=args.repeat))
+        state_time = min(timeit.repeat(lambda: incremental_lines(lines), number=1, repeat=args.repeat))
+        print("%-34s %14.3f %14.3f %8.1fx" % (name, regex_time * 1000, state_time * 1000, regex_time / state_time))
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Throughput of the analyzer stages on synthetic input, offline:
+#   analyzer  has_java_javadoc_changed() on generated full-context patches, lines/sec
+#   huge      the same on one --unified=100000-sized patch
+#   log       get_commits() and stream_commits() log parsing of a generated repository, commits/sec
+#   classify  classify_commits() end to end on that repository, commits/sec
+# Each stage runs once for timing and once more under tracemalloc for its peak memory.
+#   python benchmarks/run.py [--stages analyzer,huge,log,classify] [--commits 200] ...
+
+import os
+import sys
+import time
+import shutil
+import datetime
+import tempfile
+import argparse
+import tracemalloc
+import contextlib
+import logging
+from typing import Callable, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from commits import get_commits, stream_commits, classify_commits, ENGINES, ENGINE_PATCH
+from javadoc_analyzer import has_java_javadoc_changed
+import synthetic
+
+_stages = ('analyzer', 'huge', 'log', 'classify')
+_commit_date = datetime.datetime(2020, 1, 1)
+
+
+def _no_history(file_name, headers, sha, before):
+    # Keeps the analyzer stages off git: every header was last changed a year before
+    return [before - datetime.timedelta(days=365)] * len(headers)
+
+
+def measure(run: Callable[[], int]) -> Tuple[int, float, int]:
+    # (units processed, seconds, peak traced bytes) of run()
+    start = time.perf_counter()
+    units = run()
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return units, seconds, peak
+
+
+def analyze_corpus(corpus) -> int:
+    lines = 0
+    for file_name, patch in corpus:
+        has_java_javadoc_changed(file_name, patch, _commit_date, '0' * 40, find_before=_no_history)
+        lines += patch.count('\n')
+    return lines
+
+
+@contextlib.contextmanager
+def working_directory(path: str):
+    cwd = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(cwd)
+
+
+@contextlib.contextmanager
+def quiet():
+    # Hides the progress output of the stages
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+        yield
+
+
+def report(stage: str, units: int, unit: str, seconds: float, peak: int):
+    print("%-16s %10d %-8s %9.3f s %14.1f %-10s %10.1f MiB" % (
+        stage, units, unit, seconds, units / seconds if seconds else float('inf'), unit + '/s', peak / 2 ** 20
+    ))
+
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('--stages', type=str, default=','.join(_stages), help=\
+        "Comma-separated stages to run: " + ', '.join(_stages))
+    argparser.add_argument('--files', type=int, default=20, help="Java files in the corpus and the repository")
+    argparser.add_argument('--methods', type=int, default=40, help="Methods per Java file")
+    argparser.add_argument('--density', type=float, default=0.7, help="Share of methods having a JavaDoc")
+    argparser.add_argument('--edits', type=int, default=3, help="Edits per generated patch")
+    argparser.add_argument('--huge-methods', type=int, default=8000, help=\
+        "Methods of the file behind the huge patch (roughly 14 lines each)")
+    argparser.add_argument('--commits', type=int, default=200, help="Commits in the generated repository")
+    argparser.add_argument('--jobs', type=int, default=1, help="Worker processes for the classify stage")
+    argparser.add_argument('--async-git', type=int, default=0, help=\
+        "Git commands run at once in the background by the classify stage, instead of --jobs")
+    argparser.add_argument('--engine', type=str, choices=ENGINES, default=ENGINE_PATCH, help=\
+        "How the classify stage analyses changed files, see rip-rep-logs.py --engine")
+    argparser.add_argument('--seed', type=int, default=1)
+    argparser.add_argument('--keep', type=str, default=None, help=\
+        "Build the repository in this directory and keep it instead of a temporary one")
+    args = argparser.parse_args()
+    stages = args.stages.split(',')
+    logging.getLogger().setLevel(logging.ERROR)
+
+    print("%-16s %10s %-8s %11s %14s %-10s %14s" % ("Stage", "Processed", "", "Time", "Throughput", "", "Peak memory"))
+    if 'analyzer' in stages:
+        corpus = synthetic.patch_corpus(args.files, args.methods, args.density, args.edits, args.seed)
+        units, seconds, peak = measure(lambda: analyze_corpus(corpus))
+        report('analyzer', units, 'lines', seconds, peak)
+    if 'huge' in stages:
+        corpus = synthetic.patch_corpus(1, args.huge_methods, args.density, args.edits * 10, args.seed)
+        units, seconds, peak = measure(lambda: analyze_corpus(corpus))
+        report('huge patch', units, 'lines', seconds, peak)
+
+    if 'log' in stages or 'classify' in stages:
+        repo = args.keep or tempfile.mkdtemp(prefix='rip-rep-bench-')
+        try:
+            start = time.perf_counter()
+            synthetic.make_repository(repo, args.commits, args.files, args.methods, args.density, args.seed)
+            print("(repository of %d commits built in %.1f s at %s)" % (args.commits, time.perf_counter() - start, repo))
+            with working_directory(repo):
+                if 'log' in stages:
+                    with quiet():
+                        units, seconds, peak = measure(lambda: len(get_commits()))
+                    report('log (get)', units, 'commits', seconds, peak)
+                    with quiet():
+                        units, seconds, peak = measure(lambda: sum(1 for _ in stream_commits()))
+                    report('log (stream)', units, 'commits', seconds, peak)
+                if 'classify' in stages:
+                    with quiet():
+                        commits_list = get_commits()
+                        units, seconds, peak = measure(
+                            lambda: sum(1 for _ in classify_commits(commits_list, args.jobs, git_concurrency=args.async_git, engine=args.engine))
+                        )
+                    report('classify', units, 'commits', seconds, peak)
+        finally:
+            if not args.keep:
+                shutil.rmtree(repo, ignore_errors=True)
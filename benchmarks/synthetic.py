@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+# Synthetic Java sources, full-context patches and git histories for the benchmarks
+
+import os
+import random
+import datetime
+import subprocess
+from typing import List, Tuple, Dict
+
+_words = 'value item index count name list map key result source target buffer'.split()
+_tags = ('@param', '@return', '@throws')
+
+
+def java_method(n: int, rnd: random.Random, javadoc_density: float) -> List[str]:
+    params = ['p%d' % k for k in range(rnd.randint(0, 4))]
+    lines = []
+    if rnd.random() < javadoc_density:
+        lines += ['    /**', '     * Computes the %s of %s.' % (rnd.choice(_words), rnd.choice(_words)), '     *']
+        for p in params:
+            lines.append('     * @param %s the %s' % (p, rnd.choice(_words)))
+        lines.append('     * @return the %s' % rnd.choice(_words))
+        if rnd.random() < 0.3:
+            lines.append('     * @throws IllegalStateException if the %s is missing' % rnd.choice(_words))
+        lines.append('     */')
+    args = ', '.join('java.util.List<T> %s' % p for p in params)
+    if len(params) > 2:
+        lines.append('    public <T extends Comparable<T>> java.util.Map<String, java.util.List<T>> m%d(' % n)
+        lines.append('            %s)' % args)
+        lines.append('            throws IllegalStateException {')
+    else:
+        lines.append('    public <T> int m%d(%s) {' % (n, args))
+    for k in range(rnd.randint(1, 6)):
+        lines.append('        int v%d = %d * %d;' % (k, n, k))
+    lines += ['        return %d;' % n, '    }', '']
+    return lines
+
+
+def java_file(class_name: str, methods: int, rnd: random.Random, javadoc_density: float) -> List[str]:
+    lines = ['package bench;', '', 'public class %s {' % class_name, '']
+    for n in range(methods):
+        lines += java_method(n, rnd, javadoc_density)
+    lines.append('}')
+    return lines
+
+
+def mutate(lines: List[str], rnd: random.Random, tag_edits: float = 0.5) -> List[str]:
+    # A copy of the file with either a JavaDoc tag or a line of code changed
+    res = list(lines)
+    tag_lines = [i for i, l in enumerate(res) if any(t in l for t in _tags)]
+    code_lines = [i for i, l in enumerate(res) if l.strip().startswith('int v')]
+    if tag_lines and (rnd.random() < tag_edits or not code_lines):
+        i = rnd.choice(tag_lines)
+        res[i] = res[i] + ' ' + rnd.choice(_words)
+    elif code_lines:
+        i = rnd.choice(code_lines)
+        res[i] = res[i].replace(';', ' + 1;')
+    return res
+
+
+def full_context_patch(file_name: str, old: List[str], new: List[str]) -> str:
+    # What "git show --unified=100000" prints for a file whose changes keep its line count
+    assert len(old) == len(new)
+    res = [
+        'diff --git a/%s b/%s' % (file_name, file_name),
+        'index 1111111..2222222 100644',
+        '--- a/%s' % file_name,
+        '+++ b/%s' % file_name,
+        '@@ -1,%d +1,%d @@' % (len(old), len(new)),
+    ]
+    for o, n in zip(old, new):
+        if o == n:
+            res.append(' ' + o)
+        else:
+            res += ['-' + o, '+' + n]
+    return '\n'.join(res) + '\n'
+
+
+def patch_corpus(files: int, methods: int, javadoc_density: float, edits: int, seed: int = 1) \
+        -> List[Tuple[str, str]]:
+    rnd = random.Random(seed)
+    corpus = []
+    for f in range(files):
+        file_name = 'src/bench/C%d.java' % f
+        old = java_file('C%d' % f, methods, rnd, javadoc_density)
+        new = old
+        for _ in range(edits):
+            new = mutate(new, rnd)
+        corpus.append((file_name, full_context_patch(file_name, old, new)))
+    return corpus
+
+
+def make_repository(path: str, commits: int, files: int, methods: int, javadoc_density: float,
+                    seed: int = 1, branches: int = 2) -> int:
+    # A git repository at path with a scripted history. Returns the number of commits made.
+    rnd = random.Random(seed)
+    env = dict(os.environ)
+    env.update({
+        'GIT_AUTHOR_NAME': 'bench', 'GIT_AUTHOR_EMAIL': 'bench@example.com',
+        'GIT_COMMITTER_NAME': 'bench', 'GIT_COMMITTER_EMAIL': 'bench@example.com',
+    })
+
+    def git(*args):
+        subprocess.check_output(['git'] + list(args), cwd=path, env=env)
+
+    sources: Dict[str, List[str]] = {
+        'src/bench/C%d.java' % f: java_file('C%d' % f, methods, rnd, javadoc_density) for f in range(files)
+    }
+    date = datetime.datetime(2015, 1, 1, 12, 0, 0)
+    made = 0
+
+    def commit(message: str, changed: List[str]):
+        nonlocal date, made
+        for file_name in changed:
+            full_name = os.path.join(path, file_name)
+            os.makedirs(os.path.dirname(full_name), exist_ok=True)
+            with open(full_name, 'w', encoding='utf-8', newline='\n') as f:
+                f.write('\n'.join(sources[file_name]) + '\n')
+        date += datetime.timedelta(hours=rnd.randint(1, 96))
+        env['GIT_AUTHOR_DATE'] = env['GIT_COMMITTER_DATE'] = date.strftime('%Y-%m-%dT%H:%M:%S')
+        git('add', '-A')
+        git('commit', '-q', '-m', message)
+        made += 1
+
+    os.makedirs(path, exist_ok=True)
+    git('init', '-q')
+    commit('Initial import', list(sources))
+    branch_every = max(1, commits // (branches + 1))
+    for n in range(1, commits):
+        if branches and n % branch_every == 0:
+            git('checkout', '-q', '-B', 'branch%d' % (n // branch_every))
+        changed = rnd.sample(list(sources), rnd.randint(1, min(3, len(sources))))
+        for file_name in changed:
+            sources[file_name] = mutate(sources[file_name], rnd)
+        commit('Change %d' % n, changed)
+    return made
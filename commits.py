@@ -2,20 +2,47 @@
 import datetime
 import enum
 import logging
-import chardet
 import tqdm
 import subprocess
 import re
 import sys
+import collections
+import asyncio
+import concurrent.futures
+import time
+import functools
 import dataclasses
-from typing import List, Set, Tuple, Optional, Any
-from modification import Modification
-from javadoc_analyzer import has_java_javadoc_changed
+from typing import List, Set, Tuple, Optional, Any, Iterable, Iterator, Dict
+import profiling
+import metrics
+from decoding import decode_patch
+from git_runner import GitSteps, GitRunner, run_steps, new_event_loop
+from compact import add_slots, intern_path, FileStatuses
+from modification import Modification, ModificationList, find_modifications_before, modifications_before_steps
+from javadoc_analyzer import has_java_javadoc_changed, scan_java_javadoc_changes, may_have_javadoc_tag_changed, \
+    look_up_headers, JAVADOC_MARKER_SUBSTRINGS, PATCH_END
+import javadoc_model
 
 
 _commit_line = re.compile(r'^commit ([0-9a-f]{40})$')
 _date_line = re.compile(r'^Date:\s*([0-9\-]+T[0-9\:]+)')
 _src_line = re.compile(r'^M\t((.+)\.java)$')
+_diff_git_line_prefix = b'diff --git '
+_not_modified_markers = (b'new file mode ', b'deleted file mode ', b'rename from ', b'copy from ')
+_patch_body_markers = (b'--- ', b'@@', b'Binary files ')
+_hunk_header = re.compile(rb'^@@ -[0-9]+(?:,[0-9]+)? \+([0-9]+)(?:,([0-9]+))? @@')
+# Context lines of the patches the analyzer gets, enough for the whole file in most cases
+_full_context = 100000
+_patch_options = [
+    '--no-color', '--no-ext-diff', '--no-textconv',
+    '--src-prefix=a/', '--dst-prefix=b/'
+]
+# Longest list of file names passed to a single git command
+_pathspecs_limit = 200
+# How commits are analysed: from full-context patches, or from zero-context ones with javadoc_model.py
+ENGINE_PATCH = 'patch'
+ENGINE_MODEL = 'model'
+ENGINES = (ENGINE_PATCH, ENGINE_MODEL)
     
 @enum.unique
 class CommitType(enum.Enum):
@@ -25,59 +52,213 @@ class CommitType(enum.Enum):
     ONLY_JAVADOC_TAGS_EVERYWHERE = "Whole commit has only JavaDoc tag changes"
     WITHOUT_JAVADOC_TAGS = "Commit doesn't have JavaDoc tag changes"
 
-_mixed_commits: int = 0
-_only_javadoc_in_some_files_commits: int = 0
-_pure_javadoc_commits: int = 0
-_total_commits: int = 0
-_java_files_commits: int = 0
+@dataclasses.dataclass()
+class CommitStatistics:
+    total_commits: int = 0
+    java_files_commits: int = 0
+    mixed_commits: int = 0
+    only_javadoc_in_some_files_commits: int = 0
+    pure_javadoc_commits: int = 0
+
+    def count(self, commit_type: CommitType):
+        if commit_type == CommitType.ONLY_JAVADOC_TAGS_EVERYWHERE:
+            self.pure_javadoc_commits += 1
+        elif commit_type == CommitType.ONLY_JAVADOC_TAGS_IN_SOME_FILES:
+            self.only_javadoc_in_some_files_commits += 1
+        elif commit_type == CommitType.JAVA_AND_JAVADOC_TAGS_EVERYWHERE:
+            self.mixed_commits += 1
+
+    def add(self, other: 'CommitStatistics'):
+        for field in dataclasses.fields(self):
+            setattr(self, field.name, getattr(self, field.name) + getattr(other, field.name))
+
+    def rows(self) -> List[Tuple[str, int]]:
+        # The rows of the statistics sheet
+        return [
+            ("Commits with Java file changes", self.java_files_commits),
+            ("Commits having JavaDoc tags changed", self.mixed_commits + self.only_javadoc_in_some_files_commits + self.pure_javadoc_commits),
+            ("Commits having Code and JavaDoc tags changed in all files", self.mixed_commits),
+            ("Commits having files with only JavaDoc tag changes", self.only_javadoc_in_some_files_commits),
+            ("Commits exclusively of JavaDoc tag changes", self.pure_javadoc_commits)
+        ]
+
+
+# Counters of each analysed repository, None standing for the current directory
+_statistics: Dict[Optional[str], CommitStatistics] = collections.defaultdict(CommitStatistics)
+
+
+def statistics(repo: Optional[str] = None) -> CommitStatistics:
+    return _statistics[repo]
+
+
+def repositories_statistics() -> Dict[Optional[str], CommitStatistics]:
+    return dict(_statistics)
+
 
+# How many commits per worker may be queued in the process pool at once
+_jobs_backlog = 4
+# Commits per "git log" of fan_out_commits()
+_log_chunk_commits = 1000
+
+@add_slots
 @dataclasses.dataclass()
 class Commit:
     sha1: str
     files: List[Optional[str]] = None
     date: datetime = None
     commit_type: CommitType = CommitType.UNKNOWN
-    file_statuses: List[Tuple[bool, bool, bool]] = None
-    modifications: List[Modification] = None
+    file_statuses: FileStatuses = None
+    modifications: ModificationList = None
+    patches: Optional[List[Tuple[str, bytes]]] = None
+    # Repository the commit belongs to, None for the current directory
+    repo: Optional[str] = None
+    # Encoding of the repository's sources, detected per file if None
+    encoding: Optional[str] = None
+
+    def analyze_patch(self, f: str, patch_bytes: bytes) -> Tuple[bool, bool, bool, List[Modification]]:
+        start = time.perf_counter()
+        metrics.patch_analysed(len(patch_bytes))
+        try:
+            with profiling.stage(profiling.DECODE):
+                patch = decode_patch(patch_bytes, f, f"Commit: {self.sha1}", self.repo, self.encoding) + PATCH_END
+            with profiling.stage(profiling.ANALYSIS):
+                return has_java_javadoc_changed(
+                    f, patch, self.date, self.sha1, find_before=functools.partial(find_modifications_before, repo=self.repo)
+                )
+        except Exception as e:
+            logging.error("Skipping bad patch of commit %s in file %s due to %s" % (self.sha1, f, e))
+            return False, False, False, []
+        finally:
+            profiling.record_file(self.sha1, f, time.perf_counter() - start)
+
+    def analyze_model_patch(self, f: str, patch_bytes: bytes) -> Optional[Tuple[bool, bool, bool, List[Modification]]]:
+        # analyze_patch() of a zero-context --full-index patch, None if the file's full-context patch is needed
+        start = time.perf_counter()
+        metrics.patch_analysed(len(patch_bytes))
+        try:
+            with profiling.stage(profiling.DECODE):
+                patch = decode_patch(patch_bytes, f, f"Commit: {self.sha1}", self.repo, self.encoding)
+            with profiling.stage(profiling.ANALYSIS):
+                changes = javadoc_model.scan_file_changes(
+                    f, patch, f"Commit: {self.sha1}", self.repo, self.encoding, _full_context
+                )
+                if changes is None:
+                    return None
+                return look_up_headers(
+                    changes, f, self.date, self.sha1, find_before=functools.partial(find_modifications_before, repo=self.repo)
+                )
+        except Exception as e:
+            logging.warning("Analysing commit %s file %s from its full-context patch due to %s" % (self.sha1, f, e))
+            return None
+        finally:
+            profiling.record_file(self.sha1, f, time.perf_counter() - start)
 
-    @staticmethod
-    def read_file_in_any_encoding(patch_filename: str, filename: str, comment: str = "") -> str:
-        with open(patch_filename, 'rb') as bf:
-            bts = bf.read()
+    async def analyze_patch_async(self, f: str, patch_bytes: bytes, git: GitRunner) \
+            -> Tuple[bool, bool, bool, List[Modification]]:
+        # analyze_patch() with the history lookups running in the background
+        start = time.perf_counter()
+        metrics.patch_analysed(len(patch_bytes))
         try:
-            return bts.decode('utf-8')
-        except Exception as ude1:
-            logging.warning(f"File: {filename} of {comment} is not in UTF-8: {ude1}")
-            try:
-                return bts.decode(sys.getdefaultencoding())
-            except Exception as ude2:
-                logging.warning(f"File: {filename} of {comment} is not in sys.getdefaultencoding() = {sys.getdefaultencoding()}: {ude2}")
-                # Can't handle more here...
-                enc = chardet.detect(bts)['encoding']
-                logging.warning(f"File: {filename} of {comment} is likely in {enc} encoding")
-                return bts.decode(enc)
-
-    def classify(self, tmpdir):
-        global _mixed_commits, _only_javadoc_in_some_files_commits, _pure_javadoc_commits
+            with profiling.stage(profiling.DECODE):
+                patch = decode_patch(patch_bytes, f, f"Commit: {self.sha1}", self.repo, self.encoding) + PATCH_END
+            with profiling.stage(profiling.ANALYSIS):
+                changes = scan_java_javadoc_changes(f, patch)
+            if changes.pending_headers:
+                modifications_before = await git.run_steps(
+                    modifications_before_steps(f, changes.headers(), self.sha1, self.date, self.repo),
+                    self.repo, profiling.HISTORY_LOOKUP
+                )
+                changes.resolve(self.date, modifications_before)
+            return changes.result()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error("Skipping bad patch of commit %s in file %s due to %s" % (self.sha1, f, e))
+            return False, False, False, []
+        finally:
+            profiling.record_file(self.sha1, f, time.perf_counter() - start)
+
+    def classify(self, prefilter: bool = False, engine: str = ENGINE_PATCH):
+        # With prefilter, only the files that may have JavaDoc tag changes are fetched and analysed in full,
+        # see tag_change_candidates(). The commit type comes out the same.
+        start = time.perf_counter()
+        if self.patches is not None:
+            # Already read from the history stream, see stream_commits()
+            patches, self.patches = self.patches, None
+            self.classify_patches(patches)
+        elif engine == ENGINE_MODEL:
+            results = {}
+            wanted = set(self.files)
+            patches = iter_file_patches(self.sha1, self.repo, context=0, full_index=True)
+            for f, patch_bytes in profiling.timed(patches, profiling.PATCH_FETCH):
+                if f in wanted:
+                    result = self.analyze_model_patch(f, patch_bytes)
+                    if result is not None:
+                        results[f] = result
+            full = [f for f in self.files if f not in results]
+            if full:
+                for f, patch_bytes in profiling.timed(iter_file_patches(self.sha1, self.repo, full), profiling.PATCH_FETCH):
+                    if f in wanted:
+                        results[f] = self.analyze_patch(f, patch_bytes)
+            self.classify_results(results)
+        elif prefilter:
+            with profiling.stage(profiling.PREFILTER):
+                candidates = tag_change_candidates(self.sha1, self.files, self.repo)
+            files = [f for f in self.files if f in candidates]
+            patches = iter_file_patches(self.sha1, self.repo, files) if files else iter(())
+            self.classify_patches(profiling.timed(patches, profiling.PATCH_FETCH), set(self.files) - candidates)
+        else:
+            self.classify_patches(profiling.timed(iter_file_patches(self.sha1, self.repo), profiling.PATCH_FETCH))
+        profiling.record_commit(self.sha1, time.perf_counter() - start)
+
+    async def classify_async(self, git: GitRunner, prefilter: bool = False):
+        # classify() with the git commands run by git, so that other commits are analysed meanwhile
+        start = time.perf_counter()
+        without_tag_changes = set()
+        if self.patches is not None:
+            patches, self.patches = self.patches, None
+        else:
+            files = None
+            if prefilter:
+                candidates = await git.run_steps(
+                    tag_change_candidates_steps(self.sha1, self.files), self.repo, profiling.PREFILTER
+                )
+                files = [f for f in self.files if f in candidates]
+                without_tag_changes = set(self.files) - candidates
+            patches = []
+            if files is None or files:
+                output = await git.output(_file_patches_command(self.sha1, files), self.repo, profiling.PATCH_FETCH)
+                patches = _split_file_patches(output.splitlines(keepends=True))
+        wanted = set(self.files) - without_tag_changes
+        analyses = [(f, self.analyze_patch_async(f, patch_bytes, git)) for f, patch_bytes in patches if f in wanted]
+        results = dict(zip([f for f, _ in analyses], await asyncio.gather(*[a for _, a in analyses])))
+        self.classify_results(results, without_tag_changes)
+        profiling.record_commit(self.sha1, time.perf_counter() - start)
+
+    def classify_patches(self, patches: Iterable[Tuple[str, bytes]], without_tag_changes: Set[str] = frozenset()):
+        # Files in without_tag_changes aren't analysed. Their status is all False, as only
+        # the JavaDoc tag flag matters for files without JavaDoc tag changes.
+        wanted = set(self.files) - without_tag_changes
+        results = {}
+        for f, patch_bytes in patches:
+            if f in wanted:
+                results[f] = self.analyze_patch(f, patch_bytes)
+        self.classify_results(results, without_tag_changes)
 
+    def classify_results(self, results: Dict[str, Tuple[bool, bool, bool, List[Modification]]],
+                         without_tag_changes: Set[str] = frozenset()):
         file_statuses: List[Tuple[bool, bool, bool]] = []
         modifications: List[Modification] = []
 
+        results.update((f, (False, False, False, [])) for f in without_tag_changes)
         for f in self.files:
-            patchname = subprocess.check_output([
-                'git', 'format-patch', '-1', '--numbered-files', '--unified=100000',
-                '-o', tmpdir, self.sha1,
-                '--', f
-            ]).decode(sys.getdefaultencoding()).strip()
-            try:
-                patch = self.read_file_in_any_encoding(patchname, f, f"Commit: {self.sha1}")
-                tuple_ = has_java_javadoc_changed(f, patch, self.date, self.sha1)
-                file_statuses.append((tuple_[0], tuple_[1], tuple_[2]))
-                if tuple_[2] and not tuple_[0] and not  tuple_[1]:
-                    modifications.extend(tuple_[3])
-            except Exception as e:
-                logging.error("Skipping bad patch of commit %s in file %s due to %s" % (self.sha1, f, e))
-                file_statuses.append((False, False, False))
+            tuple_ = results.get(f)
+            if tuple_ is None:
+                logging.error("Skipping commit %s file %s: no patch found" % (self.sha1, f))
+                tuple_ = (False, False, False, [])
+            file_statuses.append((tuple_[0], tuple_[1], tuple_[2]))
+            if tuple_[2] and not tuple_[0] and not  tuple_[1]:
+                modifications.extend(tuple_[3])
 
         pure_javadoc_tag_files_count = sum(
             1 for (j, d, t) in file_statuses if t and not j and not d
@@ -89,18 +270,15 @@ class Commit:
 
         if pure_javadoc_tag_files_count == len(file_statuses):
             self.commit_type = CommitType.ONLY_JAVADOC_TAGS_EVERYWHERE
-            _pure_javadoc_commits += 1
         elif pure_javadoc_tag_files_count > 0:
             self.commit_type = CommitType.ONLY_JAVADOC_TAGS_IN_SOME_FILES
-            _only_javadoc_in_some_files_commits += 1
         elif javadoc_tag_files_count == 0:
             self.commit_type = CommitType.WITHOUT_JAVADOC_TAGS
         else:
             self.commit_type = CommitType.JAVA_AND_JAVADOC_TAGS_EVERYWHERE
-            _mixed_commits += 1
 
-        self.file_statuses = file_statuses
-        self.modifications = modifications
+        self.file_statuses = FileStatuses(file_statuses)
+        self.modifications = ModificationList(modifications)
 
 
     # def get_file_statuses_str(self) -> str:
@@ -119,90 +297,410 @@ class Commit:
         return csv_lines
 
     def csv_line(self, i: int, url_prefix: str) -> List[str]:
+        m = self.modifications[i]
+        days = m.time_offset.days if m.time_offset is not None else ''
         if i < 1:
-            if self.modifications[0].time_offset is None:
-                return [
-                    self.commit_type.value, 
-                    url_prefix + self.sha1, 
-                    self.date, 
-                    self.modifications[0].file_name, 
-                    self.modifications[0].javadoc_modification, 
-                    self.modifications[0].functionheader_modification, 
-                    self.modifications[0].functionheader_date,  
-                    ''
-                    ]
             return [
                 self.commit_type.value, 
                 url_prefix + self.sha1, 
                 self.date, 
-                self.modifications[0].file_name, 
-                self.modifications[0].javadoc_modification, 
-                self.modifications[0].functionheader_modification, 
-                self.modifications[0].functionheader_date, 
-                self.modifications[0].time_offset.days
+                m.file_name, 
+                m.javadoc_modification, 
+                m.functionheader_modification, 
+                m.functionheader_date, 
+                days
                 ]
-        else:
-            if self.modifications[i].time_offset is None:
-                return [
-                    '', 
-                    '', 
-                    '', 
-                    self.modifications[i].file_name, 
-                    self.modifications[i].javadoc_modification, 
-                    self.modifications[i].functionheader_modification, 
-                    self.modifications[i].functionheader_date, 
-                    ''
-                    ]
-            return [
-                '', 
-                '', 
-                '', 
-                self.modifications[i].file_name, 
-                self.modifications[i].javadoc_modification, 
-                self.modifications[i].functionheader_modification, 
-                self.modifications[i].functionheader_date, 
-                self.modifications[i].time_offset.days
-                ]
-        
-        
-def get_commits(single_commit: Optional[str] = None) -> List[Commit]:
-    global _total_commits
+        return ['', '', '', m.file_name, m.javadoc_modification, m.functionheader_modification, m.functionheader_date, days]
 
-    git_cmd = [
-        'git', 'show', '--name-status', '--date=iso-strict', single_commit
-    ] if single_commit else [
-        'git', 'log', '--name-status', '--date=iso-strict', '--all'
-    ]
 
-    log = subprocess.check_output(git_cmd).decode(sys.getdefaultencoding())
-    log = log.replace('\r', '')
-    loglines = log.split('\n')
-    commits = []
+def _patch_file_name(diff_git_line: bytes) -> Optional[str]:
+    # "diff --git a/<path> b/<path>": both halves are equal for modified files,
+    # which keeps paths with spaces unambiguous. Paths git quotes, e.g. non-ASCII ones, give None:
+    # like _src_line does in the log, their patches are skipped rather than glued to the previous file.
+    names = diff_git_line[len(_diff_git_line_prefix):].rstrip(b'\r\n')
+    if not names.startswith(b'a/'):
+        return None
+    names = names[2:]
+    half = (len(names) - 3) // 2
+    if names[half:half + 3] != b' b/' or names[:half] != names[half + 3:]:
+        return None
+    return names[:half].decode(sys.getdefaultencoding())
+
+
+def _file_patches_command(sha1: str, files: Optional[List[str]] = None, context: int = _full_context,
+                          full_index: bool = False) -> List[str]:
+    # One "git show" for the whole commit, or only the given files of it
+    options = _patch_options + [f'--unified={context}'] + (['--full-index'] if full_index else [])
+    if files is not None and len(files) <= _pathspecs_limit:
+        return ['git', '--literal-pathspecs', 'show', '--format='] + options + [sha1, '--'] + files
+    return ['git', 'show', '--format='] + options + [sha1, '--', '*.java']
+
+
+def _split_file_patches(lines: Iterable[bytes]) -> Iterator[Tuple[str, bytes]]:
+    # The lines of a "git show" output as per-file patches
+    file_name = None
+    chunks = []
+    for line in lines:
+        if line.startswith(_diff_git_line_prefix):
+            if file_name is not None:
+                yield file_name, b''.join(chunks)
+            file_name = _patch_file_name(line)
+            chunks = []
+        if file_name is not None:
+            chunks.append(line)
+    if file_name is not None:
+        yield file_name, b''.join(chunks)
+
+
+def iter_file_patches(sha1: str, repo: Optional[str] = None, files: Optional[List[str]] = None,
+                      context: int = _full_context, full_index: bool = False) -> Iterator[Tuple[str, bytes]]:
+    # The patches of _file_patches_command(), split on the fly
+    git_cmd = _file_patches_command(sha1, files, context, full_index)
+    profiling.subprocess_started()
+    proc = subprocess.Popen(git_cmd, stdout=subprocess.PIPE, cwd=repo)
+    try:
+        yield from _split_file_patches(proc.stdout)
+    finally:
+        proc.stdout.close()
+        proc.wait()
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, git_cmd)
+
+
+def _changed_blocks(patch: bytes) -> List[Tuple[int, int, List[bytes]]]:
+    # (number of the new line the block comes before, number of added lines, its -/+ lines)
+    # of every change block of a zero-context patch
+    blocks = []
+    for line in patch.split(b'\n'):
+        hhm = _hunk_header.match(line)
+        if hhm:
+            start = int(hhm.group(1))
+            count = int(hhm.group(2)) if hhm.group(2) is not None else 1
+            blocks.append((start if count else start + 1, count, []))
+        elif blocks and line[:1] in (b'+', b'-'):
+            blocks[-1][2].append(line)
+    return blocks
+
+
+def _grep_markers_steps(sha1: str, files: List[str]) -> GitSteps:
+    # (file name, line number, line) of the lines of the files at the commit containing a JavaDoc marker
+    git_cmd = ['git', '--literal-pathspecs', '-c', 'grep.column=false', 'grep', '--no-color', '-a', '-z', '-n', '-F']
+    for marker in JAVADOC_MARKER_SUBSTRINGS:
+        git_cmd += ['-e', marker]
+    git_cmd += [sha1, '--'] + files
+    try:
+        output = yield git_cmd
+    except subprocess.CalledProcessError as e:
+        # 1 means nothing found
+        if e.returncode != 1:
+            raise
+        output = b''
+    res = []
+    prefix_length = len(sha1) + 1
+    for line in output.split(b'\n'):
+        if line:
+            name, number, text = line.split(b'\0', 2)
+            res.append((name[prefix_length:].decode(sys.getdefaultencoding()), int(number), text))
+    return res
+
+
+def _may_have_tag_changes(blocks: List[Tuple[int, int, List[bytes]]], markers: List[Tuple[int, bytes]]) -> bool:
+    # Lines out of reach of the full context, whose patch would have several hunks, are left to the full analysis
+    if any(pos + count > _full_context for pos, count, _ in blocks) or any(n > _full_context for n, _ in markers):
+        return True
+    added = set()
+    for pos, count, _ in blocks:
+        added.update(range(pos, pos + count))
+    # The full-context patch reduced to the lines may_have_javadoc_tag_changed() needs, in the same order
+    parts = [(pos, 0, lines) for pos, _, lines in blocks] + \
+        [(n, 1, [b' ' + text]) for n, text in markers if n not in added]
+    parts.sort(key=lambda part: part[:2])
+    patchlines = [b'@@'] + [l for _, _, lines in parts for l in lines]
+    # The analyzer decodes the whole file, which only surely leaves ASCII lines as they are
+    if not all(l.isascii() for l in patchlines):
+        return True
+    return may_have_javadoc_tag_changed(l.replace(b'\r', b'').decode('ascii') for l in patchlines)
+
+
+def tag_change_candidates(sha1: str, files: List[str], repo: Optional[str] = None) -> Set[str]:
+    # The files of the commit that may have JavaDoc tag changes, found from a zero-context diff and a
+    # "git grep" for the JavaDoc markers instead of full-context patches. The analysis of the other
+    # files surely reports no JavaDoc tag change.
+    return run_steps(tag_change_candidates_steps(sha1, files), repo)
+
+
+def tag_change_candidates_steps(sha1: str, files: List[str]) -> GitSteps:
+    output = yield _file_patches_command(sha1, files, context=0)
+    blocks = {f: _changed_blocks(patch) for f, patch in _split_file_patches(output.splitlines(keepends=True))}
+    # Files without a patch are left to classify_patches() to report
+    candidates = {f for f in files if f not in blocks}
+    changed = [f for f in files if blocks.get(f)]
+    markers = collections.defaultdict(list)
+    for i in range(0, len(changed), _pathspecs_limit):
+        for f, number, text in (yield from _grep_markers_steps(sha1, changed[i:i + _pathspecs_limit])):
+            markers[f].append((number, text))
+    candidates.update(f for f in changed if _may_have_tag_changes(blocks[f], markers[f]))
+    return candidates
+
+
+def _start_worker():
+    # Forked workers start with a copy of what the main process has recorded so far, drop it
+    profiling.take()
+    metrics.take()
+
+
+def _classify_in_worker(commit: Commit, profile: bool, count: bool, prefilter: bool, engine: str) \
+        -> Tuple[Commit, Optional[dict], Optional[dict]]:
+    profiling.enabled = profile
+    metrics.enabled = count
+    commit.classify(prefilter, engine)
+    return commit, profiling.take() if profile else None, metrics.take() if count else None
+
+
+def _classify_concurrently(commits: Iterable[Commit], concurrency: int, cache=None, prefilter: bool = False) \
+        -> Iterator[Tuple[Commit, bool]]:
+    # Classifies commits as tasks of one event loop, up to concurrency git commands running while
+    # the analysis of other commits goes on. Yields (commit, whether it was cached) in the original order.
+    loop = new_event_loop()
+    asyncio.set_event_loop(loop)
+    pending = collections.deque()
+    try:
+        git = GitRunner(concurrency)
+        for c in commits:
+            if cache is not None and cache.load(c):
+                pending.append((c, None))
+            else:
+                metrics.started(c.repo, c.sha1)
+                pending.append((c, loop.create_task(c.classify_async(git, prefilter))))
+            if len(pending) >= concurrency * _jobs_backlog:
+                c, task = pending.popleft()
+                if task is not None:
+                    loop.run_until_complete(task)
+                yield c, task is None
+        while pending:
+            c, task = pending.popleft()
+            if task is not None:
+                loop.run_until_complete(task)
+            yield c, task is None
+    finally:
+        tasks = [task for _, task in pending if task is not None]
+        for task in tasks:
+            task.cancel()
+        loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+def classify_commits(commits: Iterable[Commit], jobs: int = 1, cache=None, prefilter: bool = False,
+                     git_concurrency: int = 0, engine: str = ENGINE_PATCH) -> Iterator[Commit]:
+    # Classified commits are yielded in the original order, and the counters of their repositories
+    # are only updated here, in the main process, never inside the pool workers. Commits of
+    # several repositories may share the pool. Commits found in the cache
+    # (see result_cache.ResultCache and journal.Journal) are not classified again.
+    def finish(commit: Commit, profile: Optional[dict], counted: Optional[dict], cached: bool) -> Commit:
+        if profile is not None:
+            profiling.merge(profile)
+        if counted is not None:
+            metrics.merge(counted)
+        if cache is not None and not cached:
+            cache.store(commit)
+        statistics(commit.repo).count(commit.commit_type)
+        metrics.finished(commit.repo, commit.sha1, commit.commit_type.name, cached)
+        return commit
+
+    if git_concurrency > 0:
+        # A single process, with git commands and the analysis overlapping instead
+        for c, cached in _classify_concurrently(commits, git_concurrency, cache, prefilter):
+            yield finish(c, None, None, cached)
+        return
+
+    if jobs <= 1:
+        for c in commits:
+            cached = cache is not None and cache.load(c)
+            if not cached:
+                metrics.started(c.repo, c.sha1)
+                c.classify(prefilter, engine)
+            yield finish(c, None, None, cached)
+        return
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs, initializer=_start_worker) as pool:
+        pending = collections.deque()
+        for c in commits:
+            if cache is not None and cache.load(c):
+                done = concurrent.futures.Future()
+                done.set_result((c, None, None))
+                pending.append((done, True))
+            else:
+                metrics.started(c.repo, c.sha1)
+                pending.append((
+                    pool.submit(_classify_in_worker, c, profiling.enabled, metrics.enabled, prefilter, engine), False
+                ))
+            if len(pending) >= jobs * _jobs_backlog:
+                future, cached = pending.popleft()
+                yield finish(*future.result(), cached)
+        while pending:
+            future, cached = pending.popleft()
+            yield finish(*future.result(), cached)
+
+
+def _parse_log(loglines: Iterable[str], stats: CommitStatistics, repo: Optional[str] = None,
+               encoding: Optional[str] = None) -> Iterator[Commit]:
+    # The commits of a "git log --name-status --date=iso-strict" output that change Java files
     cur_commit = None
     cur_date = None
     cur_files = []
 
-    def release():
-        global _java_files_commits
+    def release() -> Optional[Commit]:
+        if cur_commit:
+            metrics.log_commit(bool(cur_files))
         if cur_commit and len(cur_files):
-            _java_files_commits += 1
+            stats.java_files_commits += 1
             cur_realdatetime = datetime.datetime.strptime(cur_date, "%Y-%m-%dT%H:%M:%S")
-            commits.append(Commit(cur_commit, cur_files.copy(), cur_realdatetime))
-
-    print("Analyzing log...")
+            return Commit(cur_commit, cur_files.copy(), cur_realdatetime, repo=repo, encoding=encoding)
+        return None
 
-    for l in tqdm.tqdm(loglines):
+    for l in loglines:
         clm = _commit_line.match(l)
         clf = _src_line   .match(l)
         cld = _date_line.match(l)
         if clm:
-            _total_commits += 1
-            release()
+            stats.total_commits += 1
+            commit = release()
+            if commit:
+                yield commit
             cur_commit = clm.group(1)
             cur_files = []
         elif cld:
             cur_date = cld.group(1)
         elif clf:
-            cur_files.append(clf.group(1))
-    release()
-    return commits
\ No newline at end of file
+            cur_files.append(intern_path(clf.group(1)))
+    commit = release()
+    if commit:
+        yield commit
+
+
+def _log_lines(log: bytes) -> List[str]:
+    return log.decode(sys.getdefaultencoding()).replace('\r', '').split('\n')
+
+
+def get_commits(single_commit: Optional[str] = None, repo: Optional[str] = None,
+                encoding: Optional[str] = None) -> List[Commit]:
+    git_cmd = [
+        'git', 'show', '--name-status', '--date=iso-strict', single_commit
+    ] if single_commit else [
+        'git', 'log', '--name-status', '--date=iso-strict', '--all'
+    ]
+
+    profiling.subprocess_started()
+    loglines = _log_lines(subprocess.check_output(git_cmd, cwd=repo))
+
+    print("Analyzing log...")
+    return list(_parse_log(tqdm.tqdm(loglines), statistics(repo), repo, encoding))
+
+
+def _log_chunk(sha1s: List[str], repo: Optional[str] = None) -> bytes:
+    # "git log --name-status" of the given commits, in the given order
+    return subprocess.run(
+        ['git', 'log', '--no-walk=unsorted', '--stdin', '--name-status', '--date=iso-strict'],
+        input=''.join(sha1 + '\n' for sha1 in sha1s).encode('ascii'),
+        stdout=subprocess.PIPE, check=True, cwd=repo
+    ).stdout
+
+
+def fan_out_commits(repo: Optional[str] = None, encoding: Optional[str] = None, jobs: int = 2) -> Iterator[Commit]:
+    # get_commits() of the whole history, with "git rev-list --all" split into chunks whose logs jobs
+    # git processes fetch at once. The chunks are disjoint and parsed in rev-list order, which is the
+    # order of "git log --all", so commits come out the same, starting as soon as the first chunk is in.
+    stats = statistics(repo)
+    profiling.subprocess_started()
+    sha1s = subprocess.check_output(['git', 'rev-list', '--all'], cwd=repo).decode('ascii').split()
+    metrics.expect_log_commits(len(sha1s))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+        pending = collections.deque()
+        for i in range(0, len(sha1s), _log_chunk_commits):
+            profiling.subprocess_started()
+            pending.append(pool.submit(_log_chunk, sha1s[i:i + _log_chunk_commits], repo))
+            if len(pending) >= jobs * _jobs_backlog:
+                yield from _parse_log(_log_lines(pending.popleft().result()), stats, repo, encoding)
+        while pending:
+            yield from _parse_log(_log_lines(pending.popleft().result()), stats, repo, encoding)
+
+
+def stream_commits(single_commit: Optional[str] = None, repo: Optional[str] = None,
+                   encoding: Optional[str] = None) -> Iterator[Commit]:
+    # A single "git log -p" over the whole history. Each commit is yielded together with
+    # its per-file patches as soon as its diff is complete, so only one commit's diff
+    # is held in memory at a time.
+    stats = statistics(repo)
+
+    if single_commit:
+        count = 1
+        revisions = ['--no-walk', single_commit]
+    else:
+        profiling.subprocess_started()
+        count = int(subprocess.check_output(['git', 'rev-list', '--count', '--all'], cwd=repo))
+        revisions = ['--all']
+    stats.total_commits += count
+    metrics.expect_log_commits(count)
+    git_cmd = ['git', 'log', '-p', '--full-history', '--date=iso-strict'] + _patch_options + \
+        [f'--unified={_full_context}'] + revisions + ['--', '*.java']
+
+    cur_commit = None
+    cur_date = None
+    cur_patches = []  # [file name or None, chunks, modified, in extended header]
+
+    def release() -> Optional[Commit]:
+        patches = [(f, b''.join(chunks)) for f, chunks, modified, _ in cur_patches if f and modified]
+        if cur_commit:
+            metrics.log_commit(bool(patches))
+        if cur_commit and len(patches):
+            stats.java_files_commits += 1
+            cur_realdatetime = datetime.datetime.strptime(cur_date, "%Y-%m-%dT%H:%M:%S")
+            return Commit(
+                cur_commit, [intern_path(f) for f, _ in patches], cur_realdatetime, patches=patches, repo=repo, encoding=encoding
+            )
+        return None
+
+    profiling.subprocess_started()
+    proc = subprocess.Popen(git_cmd, stdout=subprocess.PIPE, cwd=repo)
+    try:
+        for line in proc.stdout:
+            if line.startswith(_diff_git_line_prefix):
+                cur_patches.append([_patch_file_name(line), [line], True, True])
+            elif cur_patches:
+                patch = cur_patches[-1]
+                if line.startswith(b'commit '):
+                    clm = _commit_line.match(line.decode(sys.getdefaultencoding(), 'replace').rstrip('\r\n'))
+                    if clm:
+                        if patch[1][-1] == b'\n':
+                            # The blank line separating the commits, no line of a diff
+                            patch[1].pop()
+                        commit = release()
+                        if commit:
+                            yield commit
+                        cur_commit = clm.group(1)
+                        cur_date = None
+                        cur_patches = []
+                        continue
+                if patch[3]:
+                    if line.startswith(_not_modified_markers):
+                        patch[2] = False
+                    elif line.startswith(_patch_body_markers):
+                        patch[3] = False
+                patch[1].append(line)
+            else:
+                l = line.decode(sys.getdefaultencoding(), 'replace').rstrip('\r\n')
+                clm = _commit_line.match(l)
+                cld = _date_line.match(l)
+                if clm:
+                    cur_commit = clm.group(1)
+                    cur_date = None
+                elif cld:
+                    cur_date = cld.group(1)
+        commit = release()
+        if commit:
+            yield commit
+    finally:
+        proc.stdout.close()
+        proc.wait()
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, git_cmd)
@@ -0,0 +1,61 @@
+import sys
+import dataclasses
+from typing import Iterable, Iterator, Tuple
+
+# Compact storage of what is kept per commit: the log of a whole --all history may hold
+# millions of commits at once
+
+
+def add_slots(cls):
+    # dataclasses.dataclass(slots=True) of Python 3.10: recreates a dataclass with __slots__ of its
+    # fields, so its instances have no __dict__. Defaults stay in the generated __init__.
+    names = tuple(f.name for f in dataclasses.fields(cls))
+    namespace = dict(cls.__dict__)
+    for name in names:
+        namespace.pop(name, None)
+    namespace.pop('__dict__', None)
+    namespace.pop('__weakref__', None)
+    namespace['__slots__'] = names
+    return type(cls)(cls.__name__, cls.__bases__, namespace)
+
+
+def intern_path(path: str) -> str:
+    # The same files change in many commits, share one string per path
+    return sys.intern(path)
+
+
+class FileStatuses:
+    # (Java changed, JavaDoc changed, JavaDoc tag changed) per file of a commit, a byte each
+
+    __slots__ = ('_codes',)
+
+    def __init__(self, statuses: Iterable[Tuple[bool, bool, bool]] = ()):
+        self._codes = bytes(bool(j) | bool(d) << 1 | bool(t) << 2 for j, d, t in statuses)
+
+    def __reduce__(self):
+        return _file_statuses, (self._codes,)
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def __getitem__(self, i: int) -> Tuple[bool, bool, bool]:
+        code = self._codes[i]
+        return bool(code & 1), bool(code & 2), bool(code & 4)
+
+    def __iter__(self) -> Iterator[Tuple[bool, bool, bool]]:
+        for code in self._codes:
+            yield bool(code & 1), bool(code & 2), bool(code & 4)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, FileStatuses):
+            return self._codes == other._codes
+        return list(self) == list(other)
+
+    def __repr__(self) -> str:
+        return 'FileStatuses(%r)' % list(self)
+
+
+def _file_statuses(codes: bytes) -> FileStatuses:
+    statuses = FileStatuses()
+    statuses._codes = codes
+    return statuses
@@ -0,0 +1,64 @@
+import sys
+import codecs
+import logging
+import chardet
+from typing import Dict, Tuple, Optional
+
+# Bytes of the start of a patch chardet gets to detect its encoding
+_detect_sample_limit = 1 << 16
+
+# Encodings detected so far, keyed by (repository, file name). Sources rarely change their
+# encoding, so the one of the file's previous patch is tried before running chardet again.
+_detected: Dict[Tuple[Optional[str], str], str] = {}
+
+
+def check_encoding(encoding: str) -> str:
+    try:
+        return codecs.lookup(encoding).name
+    except LookupError:
+        raise ValueError(f"Unknown encoding {encoding}")
+
+
+def _detection_sample(bts: bytes) -> bytes:
+    # The lines the patch starts with, up to the limit. Its ASCII lines are kept: without them,
+    # chardet takes Latin-1 text such as "äö" for Windows-1251.
+    if len(bts) <= _detect_sample_limit:
+        return bts
+    end = bts.rfind(b'\n', 0, _detect_sample_limit)
+    return bts[:end + 1] if end >= 0 else bts[:_detect_sample_limit]
+
+
+def decode_patch(bts: bytes, file_name: str, comment: str = "", repo: Optional[str] = None,
+                 encoding: Optional[str] = None) -> str:
+    # The patch text in the given encoding of the repository, or else in UTF-8, the encoding the file
+    # had before, or the one chardet finds likely
+    if encoding:
+        try:
+            return bts.decode(encoding)
+        except UnicodeDecodeError as e:
+            logging.warning(f"File: {file_name} of {comment} is not in the given {encoding} encoding: {e}")
+    try:
+        return bts.decode('utf-8')
+    except UnicodeDecodeError as ude1:
+        key = (repo, file_name)
+        enc = _detected.get(key)
+        if enc:
+            try:
+                return bts.decode(enc)
+            except UnicodeDecodeError:
+                pass
+        logging.warning(f"File: {file_name} of {comment} is not in UTF-8: {ude1}")
+        try:
+            return bts.decode(sys.getdefaultencoding())
+        except UnicodeDecodeError as ude2:
+            logging.warning(f"File: {file_name} of {comment} is not in sys.getdefaultencoding() = {sys.getdefaultencoding()}: {ude2}")
+        enc = chardet.detect(_detection_sample(bts))['encoding']
+        try:
+            res = bts.decode(enc)
+        except (UnicodeDecodeError, LookupError, TypeError):
+            # The sample misled chardet, ask it again about everything
+            enc = chardet.detect(bts)['encoding']
+            res = bts.decode(enc)
+        logging.warning(f"File: {file_name} of {comment} is likely in {enc} encoding")
+        _detected[key] = enc
+        return res
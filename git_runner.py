@@ -0,0 +1,72 @@
+import sys
+import time
+import asyncio
+import subprocess
+from typing import List, Optional, Generator, Any
+import profiling
+import metrics
+
+# Work needing several git commands is written as a generator of "steps": it yields each git
+# command line, gets the command's output sent back, or has the exception running it raised
+# thrown in, and returns its result. run_steps() runs them blocking, GitRunner.run_steps()
+# concurrently with other work.
+GitSteps = Generator[List[str], bytes, Any]
+
+
+def run_steps(steps: GitSteps, cwd: Optional[str] = None) -> Any:
+    try:
+        git_cmd = next(steps)
+        while True:
+            try:
+                profiling.subprocess_started()
+                output = subprocess.check_output(git_cmd, cwd=cwd)
+            except Exception as e:
+                git_cmd = steps.throw(e)
+            else:
+                git_cmd = steps.send(output)
+    except StopIteration as stop:
+        return stop.value
+
+
+def new_event_loop() -> asyncio.AbstractEventLoop:
+    # Before Python 3.8 only the proactor loop runs subprocesses on Windows
+    if sys.platform == 'win32':
+        return asyncio.ProactorEventLoop()
+    return asyncio.new_event_loop()
+
+
+class GitRunner:
+    # Runs git commands as asyncio subprocesses, at most concurrency of them at once.
+    # Must be created with its event loop set as the current one.
+
+    def __init__(self, concurrency: int):
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+    async def output(self, git_cmd: List[str], cwd: Optional[str] = None, stage: Optional[str] = None) -> bytes:
+        # The stdout of the command, like subprocess.check_output(). The time it runs is added to the
+        # given profiling stage, although it overlaps with other stages.
+        async with self.semaphore:
+            start = time.perf_counter()
+            metrics.subprocess_started()
+            proc = await asyncio.create_subprocess_exec(*git_cmd, stdout=subprocess.PIPE, cwd=cwd)
+            output, _ = await proc.communicate()
+            if stage:
+                profiling.record(stage, time.perf_counter() - start, 1)
+        if proc.returncode:
+            raise subprocess.CalledProcessError(proc.returncode, git_cmd, output)
+        return output
+
+    async def run_steps(self, steps: GitSteps, cwd: Optional[str] = None, stage: Optional[str] = None) -> Any:
+        try:
+            git_cmd = next(steps)
+            while True:
+                try:
+                    output = await self.output(git_cmd, cwd, stage)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    git_cmd = steps.throw(e)
+                else:
+                    git_cmd = steps.send(output)
+        except StopIteration as stop:
+            return stop.value
@@ -1,9 +1,17 @@
-from typing import List, Set, Tuple, Optional, Any
+from typing import List, Set, Tuple, Optional, Any, FrozenSet, Iterable, Iterator
 import re
 import logging
 import datetime
 import itertools
-from modification import Modification, find_modification_before
+import hashlib
+import collections
+import dataclasses
+import modification
+import profiling
+from modification import Modification, find_modifications_before
+
+# Bump whenever the analysis changes in a way the regular expressions below don't show
+ANALYZER_VERSION = 3
 
 
 _javadoc_start_marker = re.compile(r'^((\+|\-)( |\t))?\s*/\*\*\s*')
@@ -15,45 +23,355 @@ _patch_plus_prefix = re.compile(r'^\+( |\t)')
 _patch_minus_prefix = re.compile(r'^\-( |\t)')
 _patch_plus_minus_prefix = re.compile(r'^(\+|\-)( |\t)?')
 _patch_plus_minus_asterisk_prefix = re.compile(r'^(\+|\-)( |\t)*\*\s*$')
+# Reference definition of a function header. has_java_javadoc_changed() recognizes it
+# incrementally with function_header_feed() below instead of re-running it on every line.
 _function_headers = re.compile(r'^\s*(@\w+)*\s*(\w|\s|\[|\]|<|>|\?|,|\.|(\/\*\w+\*\/))+\((\w|\s|,|\.|\[|\]|<|>|\?|(\/\*\w+\*\/))*\)(\w|\s|,)*(\{|\;)')
 whitespaces = re.compile(r'(\s)+')
 _empty_line = re.compile(r'^(\+|\-)?( |\t)*\s*$')
+# Every line the JavaDoc markers above match contains one of these
+JAVADOC_MARKER_SUBSTRINGS = ('/**', '*/', '@')
+# Patches are split into lines about this many characters at a time, see patch_lines()
+_lines_chunk = 1 << 16
+# The lines "git format-patch" ends a patch with: its signature, the version of git, and blank lines.
+# The analysis was made on such patches, and a header it doesn't find by its tag change runs on into them,
+# so patches fetched otherwise get them as well, see PATCH_END.
+PATCH_END_LINES = ['-- ', '2.39.5', '', '']
+# The text of PATCH_END_LINES following the end of a patch's last line
+PATCH_END = '\n'.join(PATCH_END_LINES[:-1]) + '\n'
+
+# _function_headers as a state machine. The states are sets of positions in the pattern:
+_H_LEAD = 0           # ^\s*
+_H_ANNOTATION = 1     # (@\w+)*: expecting @
+_H_ANNOTATION_0 = 2   # (@\w+)*: after @
+_H_ANNOTATION_1 = 3   # (@\w+)*: in the name
+_H_LEAD_2 = 4         # \s*
+_H_NAME_0 = 5         # (...)+ before the arguments: none yet
+_H_NAME = 6           # (...)+ before the arguments: at least one
+_H_ARGS = 7           # (...)* in the parentheses
+_H_TAIL = 8           # (\w|\s|,)* after the parentheses
+_H_MATCHED = 9        # (\{|\;) seen
+# /\*\w+\*/ comments, before and in the parentheses, return to _H_NAME and _H_ARGS respectively
+_H_NAME_COMMENT = (10, 11, 12, 13)
+_H_ARGS_COMMENT = (14, 15, 16, 17)
+
+_h_list_chars = ('W', 'S', ',', 'P')  # \w \s , [ ] < > ? .
+_h_transitions = {
+    _H_LEAD: [(('S',), _H_LEAD)],
+    _H_ANNOTATION: [(('@',), _H_ANNOTATION_0)],
+    _H_ANNOTATION_0: [(('W',), _H_ANNOTATION_1)],
+    _H_ANNOTATION_1: [(('W',), _H_ANNOTATION_1)],
+    _H_LEAD_2: [(('S',), _H_LEAD_2)],
+    _H_NAME_0: [(_h_list_chars, _H_NAME), (('/',), _H_NAME_COMMENT[0])],
+    _H_NAME: [(_h_list_chars, _H_NAME), (('/',), _H_NAME_COMMENT[0]), (('(',), _H_ARGS)],
+    _H_ARGS: [(_h_list_chars, _H_ARGS), (('/',), _H_ARGS_COMMENT[0]), ((')',), _H_TAIL)],
+    _H_TAIL: [(('W', 'S', ','), _H_TAIL), (('{', ';'), _H_MATCHED)],
+    _H_MATCHED: [],
+}
+for comment, back in ((_H_NAME_COMMENT, _H_NAME), (_H_ARGS_COMMENT, _H_ARGS)):
+    _h_transitions[comment[0]] = [(('*',), comment[1])]
+    _h_transitions[comment[1]] = [(('W',), comment[2])]
+    _h_transitions[comment[2]] = [(('W',), comment[2]), (('*',), comment[3])]
+    _h_transitions[comment[3]] = [(('/',), back)]
+_h_epsilon = {
+    _H_LEAD: (_H_ANNOTATION, _H_LEAD_2),
+    _H_ANNOTATION_1: (_H_ANNOTATION, _H_LEAD_2),
+    _H_LEAD_2: (_H_NAME_0,),
+}
+_h_char_class_re = {
+    'W': r'\w', 'S': r'\s', ',': ',', 'P': r'\[\]<>?.', '@': '@', '/': '/', '*': r'\*',
+    '(': r'\(', ')': r'\)', '{': r'\{', ';': ';'
+}
+_h_char_class_cache = {}
+_h_steps = {}
+_h_skips = {}
+
+
+def _h_closure(states) -> FrozenSet[int]:
+    res = set()
+    todo = list(states)
+    while todo:
+        state = todo.pop()
+        if state not in res:
+            res.add(state)
+            todo.extend(_h_epsilon.get(state, ()))
+    return frozenset(res)
+
+
+def _h_char_class(c: str) -> str:
+    cls = _h_char_class_cache.get(c)
+    if cls is None:
+        cls = next((k for k, v in _h_char_class_re.items() if re.match('[' + v + ']', c)), 'X')
+        _h_char_class_cache[c] = cls
+    return cls
+
+
+def _h_step(state: FrozenSet[int], c: str) -> FrozenSet[int]:
+    # Transitions are cached per character, _h_step_class() per character class
+    key = (state, c)
+    res = _h_steps.get(key)
+    if res is None:
+        res = _h_step_class(state, _h_char_class(c))
+        _h_steps[key] = res
+    return res
+
+
+def _h_step_class(state: FrozenSet[int], cls: str) -> FrozenSet[int]:
+    return _h_closure(t for s in state for classes, t in _h_transitions[s] if cls in classes)
+
+
+def _h_skip(state: FrozenSet[int]):
+    # Characters that leave a state unchanged are skipped at regex speed
+    res = _h_skips.get(state)
+    if res is None:
+        loop = [cls for cls in _h_char_class_re if _h_step_class(state, cls) == state]
+        res = re.compile('[' + ''.join(_h_char_class_re[cls] for cls in loop) + ']*') if loop else None
+        _h_skips[state] = res
+    return res
+
+
+FUNCTION_HEADER_START = _h_closure([_H_LEAD])
+FUNCTION_HEADER_FAILED = frozenset()
+
+
+def function_header_feed(state: FrozenSet[int], line: str) -> FrozenSet[int]:
+    # Feeds the next line of a candidate function header. The header has been found once
+    # function_header_matched() is true for the returned state, and never will be if it is
+    # FUNCTION_HEADER_FAILED. Runs in linear time on the total length of the lines fed.
+    pos = 0
+    end = len(line)
+    while pos < end and state and _H_MATCHED not in state:
+        skip = _h_skips[state] if state in _h_skips else _h_skip(state)
+        if skip is not None:
+            pos = skip.match(line, pos).end()
+            if pos == end:
+                break
+        c = line[pos]
+        state = _h_steps.get((state, c)) or _h_step(state, c)
+        pos += 1
+    return state
+
+
+def function_header_matched(state: FrozenSet[int]) -> bool:
+    return _H_MATCHED in state
+
+
+def analyzer_rules_version() -> str:
+    # Identifies the rules results were produced with: cached results of other rules are stale
+    rules = hashlib.sha1(str(ANALYZER_VERSION).encode())
+    for module_globals in (globals(), vars(modification)):
+        for name, value in sorted(module_globals.items()):
+            if isinstance(value, type(_empty_line)):
+                rules.update(f"{name}={value.pattern}/{value.flags}\n".encode())
+    return rules.hexdigest()
 
 def only_whitespaces(deleted: str, added: str) -> bool:
     deleted_without_whitspaces = whitespaces.sub('', deleted)
     added_without_whitespaces = whitespaces.sub('', added)
     return deleted_without_whitspaces == added_without_whitespaces
 
+
+class TextComparison:
+    # only_whitespaces() of two texts given piece by piece. The pieces are compared without whitespace as
+    # they come, so only the part of one text the other hasn't caught up with yet is kept.
+    __slots__ = ('differs', 'length_difference', '_ahead', '_ahead_before', '_offset')
+
+    def __init__(self):
+        self.differs = False
+        # Length of the text before minus that of the text after, without whitespace
+        self.length_difference = 0
+        # Pieces of the text that is ahead, the first one compared up to _offset
+        self._ahead = collections.deque()
+        self._ahead_before = False
+        self._offset = 0
+
+    def add_before(self, text: str):
+        self._add(text, True)
+
+    def add_after(self, text: str):
+        self._add(text, False)
+
+    def add_both(self, text: str):
+        # Text added to both sides changes nothing unless one side is ahead
+        if self._ahead and not self.differs:
+            self._add(text, True)
+            self._add(text, False)
+
+    def same(self) -> bool:
+        return not self.differs and not self._ahead
+
+    def _add(self, text: str, before: bool):
+        text = whitespaces.sub('', text)
+        if not text:
+            return
+        self.length_difference += len(text) if before else -len(text)
+        if self.differs:
+            return
+        ahead = self._ahead
+        if not ahead or self._ahead_before == before:
+            ahead.append(text)
+            self._ahead_before = before
+            return
+        pos = 0
+        while pos < len(text):
+            if not ahead:
+                ahead.append(text[pos:])
+                self._ahead_before = before
+                return
+            piece = ahead[0]
+            n = min(len(piece) - self._offset, len(text) - pos)
+            if not text.startswith(piece[self._offset:self._offset + n], pos):
+                self.differs = True
+                ahead.clear()
+                self._offset = 0
+                return
+            pos += n
+            self._offset += n
+            if self._offset == len(piece):
+                ahead.popleft()
+                self._offset = 0
+
+
+def patch_lines(patch: str) -> Iterator[str]:
+    # patch.replace('\r', '').split('\n') without copying the whole patch at once: the lines are split
+    # off a chunk of about _lines_chunk characters ending at a line break at a time
+    pos = 0
+    while True:
+        cut = patch.find('\n', pos + _lines_chunk)
+        chunk = patch[pos:cut] if cut >= 0 else patch[pos:]
+        if '\r' in chunk:
+            chunk = chunk.replace('\r', '')
+        yield from chunk.split('\n')
+        if cut < 0:
+            return
+        pos = cut + 1
+
+
+@dataclasses.dataclass()
+class JavadocChanges:
+    # What has_java_javadoc_changed() finds in a patch before it looks up the history of function headers
+    has_java_changed: bool
+    has_javadoc_changed: bool
+    has_javadoc_tag_changed: bool
+    modifications: List[Modification]
+    # (index in modifications, first header line, header line count), resolved together by resolve()
+    pending_headers: List[Tuple[int, str, int]]
+
+    def headers(self) -> List[Tuple[str, int]]:
+        return [(h, n) for _, h, n in self.pending_headers]
+
+    def resolve(self, commit_date: datetime, modifications_before: List[Optional[datetime.datetime]]):
+        for (i, _, _), modification_before in zip(self.pending_headers, modifications_before):
+            offset = commit_date-modification_before
+            self.modifications[i].functionheader_date = modification_before
+            self.modifications[i].time_offset = offset
+        self.pending_headers = []
+
+    def result(self) -> Tuple[bool, bool, bool, List[Modification]]:
+        return self.has_java_changed, self.has_javadoc_changed, self.has_javadoc_tag_changed, self.modifications
+
+
+def has_java_javadoc_changed(file_name: str, patch: str, commit_date: datetime, sha: str, linecontext: int = 3,
+                             find_before=find_modifications_before) -> Tuple[bool, bool, bool, List[Modification]]:
+    return look_up_headers(scan_java_javadoc_changes(file_name, patch), file_name, commit_date, sha, find_before)
+
+
+def look_up_headers(changes: JavadocChanges, file_name: str, commit_date: datetime, sha: str,
+                    find_before=find_modifications_before) -> Tuple[bool, bool, bool, List[Modification]]:
+    if changes.pending_headers:
+        with profiling.stage(profiling.HISTORY_LOOKUP):
+            modifications_before = find_before(file_name, changes.headers(), sha, commit_date)
+        changes.resolve(commit_date, modifications_before)
+    return changes.result()
+
+
+@dataclasses.dataclass()
+class ScanState:
+    # Everything scan_lines() carries from one line to the next, so that a scan can stop after any line
+    # and go on later, see javadoc_model.py
+    going: bool = False
+    in_javadoc: bool = False
+    in_javadoc_tag_section: bool = False
+    lookfor_code: bool = False
+    lookfor_first_codeline: bool = False
+    lookfor_endtag: bool = False
+    linecode_list: List[str] = dataclasses.field(default_factory=list)
+    header_state: FrozenSet[int] = None
+    linedoc_list: List[str] = dataclasses.field(default_factory=list)
+    # The kind of the tag the current line belongs to, and those of the lines in linedoc_list
+    javadoc_tag: Optional[str] = None
+    linedoc_tags: List[str] = dataclasses.field(default_factory=list)
+    start_header: str = ''
+    has_javadoc_tag_changed: bool = False
+    has_javadoc_changed: bool = False
+    has_java_changed: bool = False
+    # The text of the JavaDoc and of its tag sections before and after the change
+    javadoc_text: TextComparison = dataclasses.field(default_factory=TextComparison)
+    tag_text: TextComparison = dataclasses.field(default_factory=TextComparison)
+    modifications: List[Modification] = dataclasses.field(default_factory=list)
+    # (index in modifications, first header line, header line count), see JavadocChanges
+    pending_headers: List[Tuple[int, str, int]] = dataclasses.field(default_factory=list)
+
+    def idle(self) -> bool:
+        # Whether the following context lines can only move the JavaDoc state and add to the compared text
+        return not (self.lookfor_code or self.lookfor_first_codeline or self.lookfor_endtag
+                    or self.linecode_list or self.linedoc_list)
+
+
 # @numba.jit()
-def has_java_javadoc_changed(file_name: str, patch: str, commit_date: datetime, sha: str, linecontext: int = 3) -> Tuple[bool, bool, bool, List[Modification]]:
-    patchlines = patch.replace('\r', '').split('\n')
+def scan_java_javadoc_changes(file_name: str, patch: str) -> JavadocChanges:
+    state = ScanState()
+    scan_lines(file_name, patch_lines(patch), state)
+
+    has_javadoc_changed = state.has_javadoc_changed
+    has_javadoc_tag_changed = state.has_javadoc_tag_changed
+    if state.javadoc_text.same():
+        has_javadoc_changed = False
+    if state.tag_text.same():
+        has_javadoc_tag_changed = False
+        
+    #if has_javadoc_tag_changed and not has_java_changed:
+    #    brief = '\n'.join(
+    #        l for l, n in zip(patchlines, interesting_line_indices) if n
+    #    )
+    #else:
+    #    brief = ""
+    
+    return JavadocChanges(
+        state.has_java_changed, has_javadoc_changed, has_javadoc_tag_changed, state.modifications,
+        state.pending_headers
+    )
+
 
-    has_javadoc_tag_changed = False
-    has_javadoc_changed = False
-    has_java_changed = False
+def scan_lines(file_name: str, patchlines: Iterable[str], state: ScanState):
+    # The line by line part of scan_java_javadoc_changes(), going on from state and leaving it as of after
+    # the last line. The state lives in local variables while the lines are scanned.
+    going = state.going
+    in_javadoc = state.in_javadoc
+    in_javadoc_tag_section = state.in_javadoc_tag_section
+    lookfor_code = state.lookfor_code
+    lookfor_first_codeline = state.lookfor_first_codeline
+    lookfor_endtag = state.lookfor_endtag
+    linecode_list = state.linecode_list
+    header_state = state.header_state if state.header_state is not None else FUNCTION_HEADER_START
+    linedoc_list = state.linedoc_list
+    javadoc_tag = state.javadoc_tag
+    linedoc_tags = state.linedoc_tags
+    start_header = state.start_header
 
-    javadoc_lines_before = ''
-    javadoc_lines_after = ''
-    tag_lines_before = ''
-    tag_lines_after = ''
+    has_javadoc_tag_changed = state.has_javadoc_tag_changed
+    has_javadoc_changed = state.has_javadoc_changed
+    has_java_changed = state.has_java_changed
+
+    javadoc_text = state.javadoc_text
+    tag_text = state.tag_text
 
     #interesting_line_indices: List[bool] = [False] * len(patchlines)
 
-    modifications_in_file: List[Modification] = []
+    modifications_in_file: List[Modification] = state.modifications
+    pending_headers: List[Tuple[int, str, int]] = state.pending_headers
     javadoc_mod = ''
     functionheader_mod = ''
 
-    going = False
-    in_javadoc = False
-    in_javadoc_tag_section = False
-    in_javadoc_end = False
-    tag_line = False
-    lookfor_code = False
-    lookfor_first_codeline = False
-    lookfor_endtag = False
-    linecode_list = []
-    linedoc_list = []
-    start_header = ''
     for l, ln in zip(patchlines, itertools.count()):
         in_javadoc_end = False
         tag_line = False
@@ -63,41 +381,56 @@ def has_java_javadoc_changed(file_name: str, patch: str, commit_date: datetime,
                 lookfor_first_codeline = False
                 lookfor_code = True
             linecode_list.append(l)  
-            lines_ = "".join(linecode_list)
-            match = _function_headers.search(lines_)
-            if match:
+            # linecode_list is only ever appended to or emptied: a single line means a new header
+            header_state = function_header_feed(FUNCTION_HEADER_START if len(linecode_list) == 1 else header_state, l)
+            if function_header_matched(header_state):
                 lookfor_code = False
                 lookfor_first_codeline = False
                 number_of_lines = len(linecode_list)
                 functionheader_mod = '\n'.join(k for k in linecode_list)
                 javadoc_mod = '\n'.join(k for k in linedoc_list)
+                javadoc_tags = ' '.join(linedoc_tags)
                 linecode_list = []
                 linedoc_list = []
-                modification_before = find_modification_before(file_name, start_header, number_of_lines, sha,  commit_date)
-                offset = commit_date-modification_before
-                modifications_in_file.append(Modification(file_name, javadoc_mod, functionheader_mod, modification_before, offset))
+                linedoc_tags = []
+                pending_headers.append((len(modifications_in_file), start_header, number_of_lines))
+                modifications_in_file.append(
+                    Modification(file_name, javadoc_mod, functionheader_mod, None, None, javadoc_tags)
+                )
             elif len(linecode_list) > 9:
                 lookfor_code = False
                 lookfor_first_codeline = False
                 javadoc_mod = '\n'.join(k for k in linedoc_list)
+                javadoc_tags = ' '.join(linedoc_tags)
                 linecode_list = []
                 linedoc_list = []
-                modifications_in_file.append(Modification(file_name, javadoc_mod, None, None, None))
+                linedoc_tags = []
+                modifications_in_file.append(Modification(file_name, javadoc_mod, None, None, None, javadoc_tags))
         if l.startswith('@@'):
             going = True
         elif l.startswith('--'):
             going = False
         elif going and not in_javadoc and _javadoc_start_marker.match(l):
             in_javadoc = True
-        if going and in_javadoc and not in_javadoc_tag_section and _javadoc_section_marker.match(l):
-            tag_line = True
-            in_javadoc_tag_section = True
-            lookfor_code = False
-            lookfor_endtag = False
-            linecode_list = []
-            linedoc_list = []
-        elif going and in_javadoc_tag_section and _javadoc_uninteresting_tags.match(l):
-            in_javadoc_tag_section = False
+        if going and in_javadoc and not in_javadoc_tag_section:
+            section = _javadoc_section_marker.match(l)
+            if section:
+                javadoc_tag = section.group(5)
+                tag_line = True
+                in_javadoc_tag_section = True
+                lookfor_code = False
+                lookfor_endtag = False
+                linecode_list = []
+                linedoc_list = []
+                linedoc_tags = []
+        elif going and in_javadoc_tag_section:
+            if _javadoc_uninteresting_tags.match(l):
+                in_javadoc_tag_section = False
+            else:
+                # Lines without a tag continue the one before
+                section = _javadoc_section_marker.match(l)
+                if section:
+                    javadoc_tag = section.group(5)
         if going and in_javadoc and _javadoc_end_marker.match(l):
             in_javadoc = False
             in_javadoc_tag_section = False
@@ -114,12 +447,14 @@ def has_java_javadoc_changed(file_name: str, patch: str, commit_date: datetime,
                     has_javadoc_tag_changed = True
                     # interesting_line_indices[ln] = True
                     linedoc_list.append(l)
+                    if javadoc_tag is not None and javadoc_tag not in linedoc_tags:
+                        linedoc_tags.append(javadoc_tag)
                     #for zi in range(max(0, ln - linecontext), min(len(patchlines), ln + linecontext) + 1):
                     #    interesting_line_indices[zi] = True
                 if _patch_minus_prefix.match(l):
-                    tag_lines_before = tag_lines_before + l[2:]
+                    tag_text.add_before(l[2:])
                 elif _patch_plus_prefix.match(l):
-                    tag_lines_after = tag_lines_after + l[2:]
+                    tag_text.add_after(l[2:])
                 if in_javadoc_tag_section:
                     lookfor_endtag = True
                 elif tag_line:
@@ -128,33 +463,94 @@ def has_java_javadoc_changed(file_name: str, patch: str, commit_date: datetime,
             elif in_javadoc:
                 has_javadoc_changed = True
                 if _patch_minus_prefix.match(l):
-                    javadoc_lines_before = javadoc_lines_before + l[2:]
+                    javadoc_text.add_before(l[2:])
                 elif _patch_plus_prefix.match(l):
-                    javadoc_lines_after = javadoc_lines_after + l[2:]
+                    javadoc_text.add_after(l[2:])
             else:
                 has_java_changed = True
                 lookfor_code = False
                 lookfor_first_codeline = False
                 linecode_list = []
                 linedoc_list = []
+                linedoc_tags = []
         else:
             if in_javadoc_tag_section:
-                tag_lines_before = tag_lines_before + l[2:]
-                tag_lines_after = tag_lines_after + l[2:]
+                tag_text.add_both(l[2:])
             elif in_javadoc:
-                javadoc_lines_before = javadoc_lines_before + l[2:]
-                javadoc_lines_after = javadoc_lines_after + l[2:]
+                javadoc_text.add_both(l[2:])
 
-    if only_whitespaces(javadoc_lines_before, javadoc_lines_after):
-        has_javadoc_changed = False
-    if only_whitespaces(tag_lines_before, tag_lines_after):
-        has_javadoc_tag_changed = False
-        
-    #if has_javadoc_tag_changed and not has_java_changed:
-    #    brief = '\n'.join(
-    #        l for l, n in zip(patchlines, interesting_line_indices) if n
-    #    )
-    #else:
-    #    brief = ""
-    
-    return has_java_changed, has_javadoc_changed, has_javadoc_tag_changed, modifications_in_file
\ No newline at end of file
+    state.going = going
+    state.in_javadoc = in_javadoc
+    state.in_javadoc_tag_section = in_javadoc_tag_section
+    state.lookfor_code = lookfor_code
+    state.lookfor_first_codeline = lookfor_first_codeline
+    state.lookfor_endtag = lookfor_endtag
+    state.linecode_list = linecode_list
+    state.header_state = header_state
+    state.linedoc_list = linedoc_list
+    state.javadoc_tag = javadoc_tag
+    state.linedoc_tags = linedoc_tags
+    state.start_header = start_header
+    state.has_javadoc_tag_changed = has_javadoc_tag_changed
+    state.has_javadoc_changed = has_javadoc_changed
+    state.has_java_changed = has_java_changed
+
+
+def may_have_javadoc_tag_changed(patchlines: Iterable[str]) -> bool:
+    # The part of has_java_javadoc_changed() that sets has_javadoc_tag_changed. It only needs the
+    # hunk headers, the changed lines and the context lines containing JAVADOC_MARKER_SUBSTRINGS,
+    # as no other line moves it between JavaDoc states. False means has_java_javadoc_changed()
+    # of the whole patch reports no JavaDoc tag change.
+    going = False
+    in_javadoc = False
+    in_javadoc_tag_section = False
+    for l in patchlines:
+        in_javadoc_end = False
+        tag_line = False
+        if l.startswith('@@'):
+            going = True
+        elif l.startswith('--'):
+            going = False
+        elif going and not in_javadoc and _javadoc_start_marker.match(l):
+            in_javadoc = True
+        if going and in_javadoc and not in_javadoc_tag_section and _javadoc_section_marker.match(l):
+            tag_line = True
+            in_javadoc_tag_section = True
+        elif going and in_javadoc_tag_section and _javadoc_uninteresting_tags.match(l):
+            in_javadoc_tag_section = False
+        if going and in_javadoc and _javadoc_end_marker.match(l):
+            in_javadoc = False
+            in_javadoc_tag_section = False
+            in_javadoc_end = True
+        if going and _patch_plus_minus_prefix.match(l) and not _patch_plus_minus_asterisk_prefix.match(l):
+            if in_javadoc_tag_section or in_javadoc_end and tag_line:
+                return True
+    return False
+
+
+# JavaDoc states of a file between its lines, as javadoc_state_feed() tracks them
+JAVADOC_STATE_OUTSIDE = 0
+JAVADOC_STATE_IN_JAVADOC = 1
+JAVADOC_STATE_IN_TAG_SECTION = 2
+
+
+def javadoc_section_tag(l: str) -> Optional[str]:
+    # The kind of the tag a line starts, as scan_lines() tells it
+    section = _javadoc_section_marker.match(l)
+    return section.group(5) if section else None
+
+
+def javadoc_state_feed(state: int, l: str) -> int:
+    # The in_javadoc and in_javadoc_tag_section flags of scan_lines() after a context line l, without
+    # the rest of its state, which only changed lines set
+    in_javadoc = state & JAVADOC_STATE_IN_JAVADOC
+    in_javadoc_tag_section = state & JAVADOC_STATE_IN_TAG_SECTION
+    if not in_javadoc and _javadoc_start_marker.match(l):
+        in_javadoc = JAVADOC_STATE_IN_JAVADOC
+    if in_javadoc and not in_javadoc_tag_section and _javadoc_section_marker.match(l):
+        in_javadoc_tag_section = JAVADOC_STATE_IN_TAG_SECTION
+    elif in_javadoc_tag_section and _javadoc_uninteresting_tags.match(l):
+        in_javadoc_tag_section = 0
+    if in_javadoc and _javadoc_end_marker.match(l):
+        return JAVADOC_STATE_OUTSIDE
+    return in_javadoc | in_javadoc_tag_section
@@ -0,0 +1,321 @@
+import os
+import re
+import atexit
+import collections
+import dataclasses
+import subprocess
+from typing import List, Tuple, Optional, Dict, Iterable
+import profiling
+from decoding import decode_patch
+from javadoc_analyzer import JavadocChanges, ScanState, TextComparison, scan_lines, scan_java_javadoc_changes, \
+    javadoc_state_feed, javadoc_section_tag, JAVADOC_STATE_OUTSIDE, JAVADOC_STATE_IN_JAVADOC, \
+    JAVADOC_STATE_IN_TAG_SECTION, PATCH_END_LINES
+
+# The "model" engine: instead of a full-context patch of every changed file, it gets the zero-context
+# patch and keeps a model of the files, their lines and the JavaDoc state between them (FileModel).
+# The model of one side of a patch is derived from the other by applying its hunks, rescanning only
+# the lines up to where the JavaDoc state meets the old one again. The analyzer then only runs over
+# windows around the hunks, as scan_lines() resumes from the state the model has for any line.
+# Anything it can't show to come out as the full-context analysis goes back to it, see scan_file_changes().
+
+_hunk_header = re.compile(r'^@@ -([0-9]+)(?:,([0-9]+))? \+([0-9]+)(?:,([0-9]+))? @@')
+_index_line = re.compile(r'^index ([0-9a-f]+)\.\.([0-9a-f]+)')
+
+# Models of blobs with up to this many lines in all are kept, most recently used last
+_models_lines_limit = 1 << 20
+_models: 'collections.OrderedDict[str, FileModel]' = collections.OrderedDict()
+_models_lines = 0
+
+# Context lines scanned after a hunk before looking whether its window can be closed, doubled each time it can't
+_context_batch = 16
+
+# "git cat-file --batch" of each repository, with the process that started it
+_cat_files: Dict[Optional[str], Tuple[int, subprocess.Popen]] = {}
+
+
+@dataclasses.dataclass()
+class Hunk:
+    # A change block of a zero-context patch. Starts are line indexes from 0, where the
+    # lines are removed or, with none removed, before which the new ones go.
+    old_start: int
+    old_lines: List[str]
+    new_start: int
+    new_lines: List[str]
+
+
+class FileModel:
+    # The lines of a file version and the JavaDoc state before each of them and after the last one
+
+    __slots__ = ('lines', 'states')
+
+    def __init__(self, lines: List[str], states: bytearray):
+        self.lines = lines
+        self.states = states
+
+    @staticmethod
+    def scan(lines: List[str]) -> 'FileModel':
+        states = bytearray(len(lines) + 1)
+        state = JAVADOC_STATE_OUTSIDE
+        for i, l in enumerate(lines):
+            state = javadoc_state_feed(state, ' ' + l)
+            states[i + 1] = state
+        return FileModel(lines, states)
+
+    def derive(self, hunks: Iterable[Tuple[int, int, List[str]]]) -> 'FileModel':
+        # The model after replacing (start, count, lines) blocks, ordered by start. States are copied
+        # wherever they are the same as before.
+        lines: List[str] = []
+        states = bytearray()
+        state = JAVADOC_STATE_OUTSIDE
+        synced = True
+        pos = 0
+
+        def copy(until: int):
+            nonlocal state, synced, pos
+            while pos < until and not synced:
+                states.append(state)
+                state = javadoc_state_feed(state, ' ' + self.lines[pos])
+                lines.append(self.lines[pos])
+                pos += 1
+                synced = state == self.states[pos]
+            if pos < until:
+                lines.extend(self.lines[pos:until])
+                states.extend(self.states[pos:until])
+                state = self.states[until]
+                pos = until
+
+        for start, count, replacement in hunks:
+            copy(start)
+            for l in replacement:
+                states.append(state)
+                state = javadoc_state_feed(state, ' ' + l)
+                lines.append(l)
+            pos = start + count
+            synced = state == self.states[pos]
+        copy(len(self.lines))
+        states.append(state)
+        return FileModel(lines, states)
+
+
+def _model_lines(text: str) -> Optional[List[str]]:
+    # None for a file without a newline at its end, as its patches have a marker line for it
+    lines = text.replace('\r', '').split('\n')
+    if lines[-1]:
+        return None
+    lines.pop()
+    return lines
+
+
+def _parse_patch(patch: str) -> Optional[Tuple[str, str, List[Hunk]]]:
+    # The blob IDs and hunks of a zero-context --full-index patch of one file, None if it has
+    # "\ No newline at end of file" lines or other than text hunks
+    lines = patch.replace('\r', '').split('\n')
+    ids = None
+    hunks = []
+    i = 0
+    while i < len(lines):
+        l = lines[i]
+        i += 1
+        if ids is None:
+            iml = _index_line.match(l)
+            if iml:
+                ids = (iml.group(1), iml.group(2))
+            continue
+        hhm = _hunk_header.match(l)
+        if not hhm:
+            if l.startswith('\\'):
+                return None
+            continue
+        old_start, new_start = int(hhm.group(1)), int(hhm.group(3))
+        old_count = int(hhm.group(2)) if hhm.group(2) is not None else 1
+        new_count = int(hhm.group(4)) if hhm.group(4) is not None else 1
+        old_lines = [l[1:] for l in lines[i:i + old_count]]
+        new_lines = [l[1:] for l in lines[i + old_count:i + old_count + new_count]]
+        i += old_count + new_count
+        if len(old_lines) != old_count or len(new_lines) != new_count:
+            return None
+        if i < len(lines) and lines[i].startswith('\\'):
+            return None
+        hunks.append(Hunk(old_start - 1 if old_count else old_start, old_lines,
+                          new_start - 1 if new_count else new_start, new_lines))
+    if ids is None:
+        return None
+    return ids[0], ids[1], hunks
+
+
+def _close_cat_files():
+    for pid, proc in _cat_files.values():
+        if pid == os.getpid():
+            proc.stdin.close()
+            proc.wait()
+
+
+atexit.register(_close_cat_files)
+
+
+def _cat_file(blob_id: str, repo: Optional[str] = None) -> bytes:
+    # One long-running "git cat-file --batch" per repository and process, forked ones start their own
+    entry = _cat_files.get(repo)
+    if entry is None or entry[0] != os.getpid():
+        profiling.subprocess_started()
+        entry = _cat_files[repo] = (
+            os.getpid(), subprocess.Popen(['git', 'cat-file', '--batch'], stdin=subprocess.PIPE, stdout=subprocess.PIPE, cwd=repo)
+        )
+    proc = entry[1]
+    proc.stdin.write(blob_id.encode('ascii') + b'\n')
+    proc.stdin.flush()
+    header = proc.stdout.readline().split()
+    if len(header) != 3 or header[1] != b'blob':
+        raise ValueError("No blob %s in %s" % (blob_id, repo or "the current directory"))
+    content = proc.stdout.read(int(header[2]))
+    proc.stdout.read(1)
+    return content
+
+
+def _remember(blob_id: str, model: FileModel):
+    global _models_lines
+    previous = _models.pop(blob_id, None)
+    if previous is not None:
+        _models_lines -= len(previous.lines)
+    _models[blob_id] = model
+    _models_lines += len(model.lines)
+    while _models_lines > _models_lines_limit and len(_models) > 2:
+        _, evicted = _models.popitem(last=False)
+        _models_lines -= len(evicted.lines)
+
+
+def _file_models(file_name: str, old_id: str, new_id: str, hunks: List[Hunk], comment: str,
+                 repo: Optional[str], encoding: Optional[str]) -> Optional[Tuple[FileModel, FileModel]]:
+    old = _models.get(old_id)
+    new = _models.get(new_id)
+    if old is None and new is None:
+        with profiling.stage(profiling.PATCH_FETCH):
+            content = _cat_file(old_id, repo)
+        with profiling.stage(profiling.DECODE):
+            lines = _model_lines(decode_patch(content, file_name, comment, repo, encoding))
+        if lines is None:
+            return None
+        old = FileModel.scan(lines)
+    if old is None:
+        old = new.derive((h.new_start, len(h.new_lines), h.old_lines) for h in hunks)
+    if new is None:
+        new = old.derive((h.old_start, len(h.old_lines), h.new_lines) for h in hunks)
+    _remember(old_id, old)
+    _remember(new_id, new)
+    return old, new
+
+
+def _state_code(state: ScanState) -> int:
+    return (JAVADOC_STATE_IN_JAVADOC if state.in_javadoc else 0) | \
+        (JAVADOC_STATE_IN_TAG_SECTION if state.in_javadoc_tag_section else 0)
+
+
+def _section_tag(model: FileModel, pos: int) -> Optional[str]:
+    # The kind of the tag line pos continues, if the line is in a tag section
+    while pos > 0 and model.states[pos] & JAVADOC_STATE_IN_TAG_SECTION:
+        pos -= 1
+        tag = javadoc_section_tag(' ' + model.lines[pos])
+        if tag is not None:
+            return tag
+    return None
+
+
+def _changed(windows: List[TextComparison]) -> Optional[bool]:
+    # Whether the text before and after all the windows differs beyond whitespace, given the text each
+    # window compares. The context between windows is the same on both sides, so with at most one window
+    # differing that window decides; otherwise None unless the lengths tell.
+    differing = [w for w in windows if not w.same()]
+    if len(differing) <= 1:
+        return bool(differing)
+    if sum(w.length_difference for w in differing):
+        return True
+    return None
+
+
+def _scan_windows(file_name: str, old: FileModel, new: FileModel, hunks: List[Hunk]) -> Optional[JavadocChanges]:
+    state = ScanState(going=True)
+    javadoc_windows: List[TextComparison] = []
+    tag_windows: List[TextComparison] = []
+    k = 0
+    while k < len(hunks) and state.going:
+        pos = hunks[k].old_start
+        state.in_javadoc = bool(old.states[pos] & JAVADOC_STATE_IN_JAVADOC)
+        state.in_javadoc_tag_section = bool(old.states[pos] & JAVADOC_STATE_IN_TAG_SECTION)
+        state.javadoc_tag = _section_tag(old, pos)
+        closed = False
+        while not closed and k < len(hunks):
+            hunk = hunks[k]
+            k += 1
+            scan_lines(file_name, ['-' + l for l in hunk.old_lines] + ['+' + l for l in hunk.new_lines], state)
+            pos = hunk.old_start + len(hunk.old_lines)
+            until = hunks[k].old_start if k < len(hunks) else len(old.lines)
+            batch = _context_batch
+            while pos < until:
+                end = min(until, pos + batch)
+                scan_lines(file_name, [' ' + l for l in old.lines[pos:end]], state)
+                pos = end
+                if state.idle() and (not state.going or _state_code(state) == old.states[pos]):
+                    closed = True
+                    break
+                batch *= 2
+        if not closed:
+            # The patch ends as "git format-patch" ends it
+            scan_lines(file_name, PATCH_END_LINES, state)
+        javadoc_windows.append(state.javadoc_text)
+        tag_windows.append(state.tag_text)
+        state.javadoc_text = TextComparison()
+        state.tag_text = TextComparison()
+
+    has_javadoc_changed = _changed(javadoc_windows)
+    has_javadoc_tag_changed = _changed(tag_windows)
+    if has_javadoc_changed is None or has_javadoc_tag_changed is None:
+        return None
+    return JavadocChanges(
+        state.has_java_changed, state.has_javadoc_changed and has_javadoc_changed,
+        state.has_javadoc_tag_changed and has_javadoc_tag_changed, state.modifications, state.pending_headers
+    )
+
+
+def _full_patch(old: FileModel, hunks: List[Hunk]) -> str:
+    # The full-context patch of the file, as far as the analyzer reads it
+    patchlines = ['@@']
+    pos = 0
+    for hunk in hunks:
+        patchlines.extend(' ' + l for l in old.lines[pos:hunk.old_start])
+        patchlines.extend('-' + l for l in hunk.old_lines)
+        patchlines.extend('+' + l for l in hunk.new_lines)
+        pos = hunk.old_start + len(hunk.old_lines)
+    patchlines.extend(' ' + l for l in old.lines[pos:])
+    patchlines.extend(PATCH_END_LINES)
+    return '\n'.join(patchlines)
+
+
+def scan_file_changes(file_name: str, patch: str, comment: str = "", repo: Optional[str] = None,
+                      encoding: Optional[str] = None, max_lines: Optional[int] = None) -> Optional[JavadocChanges]:
+    # scan_java_javadoc_changes() of the full-context patch of a file, given its zero-context --full-index
+    # patch. None if the file needs the full-context patch: without a newline at its end, longer than
+    # max_lines, or when the windows can't tell whether the JavaDoc text changed.
+    parsed = _parse_patch(patch)
+    if parsed is None:
+        return None
+    old_id, new_id, hunks = parsed
+    if not old_id.strip('0') or not new_id.strip('0'):
+        # An added or deleted file
+        return None
+    if not hunks:
+        return JavadocChanges(False, False, False, [], [])
+    models = _file_models(file_name, old_id, new_id, hunks, comment, repo, encoding)
+    if models is None:
+        return None
+    old, new = models
+    if max_lines is not None and max(len(old.lines), len(new.lines)) > max_lines:
+        return None
+    for hunk in hunks:
+        if old.lines[hunk.old_start:hunk.old_start + len(hunk.old_lines)] != hunk.old_lines or \
+                new.lines[hunk.new_start:hunk.new_start + len(hunk.new_lines)] != hunk.new_lines:
+            # Decoded otherwise than the patch
+            return None
+    changes = _scan_windows(file_name, old, new, hunks)
+    if changes is None:
+        changes = scan_java_javadoc_changes(file_name, _full_patch(old, hunks))
+    return changes
@@ -0,0 +1,157 @@
+import os
+import json
+import time
+import datetime
+import logging
+import dataclasses
+from typing import Dict, Tuple, Optional, Any
+from modification import Modification, ModificationList
+from compact import FileStatuses
+from javadoc_analyzer import analyzer_rules_version
+from commits import CommitType, repositories_statistics
+
+DEFAULT_JOURNAL_FILE = '__rip-rep-journal.jsonl'
+
+# How often the journal is synced to disk together with the counters
+_checkpoint_seconds = 30.0
+
+
+def _commit_record(commit) -> Dict[str, Any]:
+    return {
+        'repo': commit.repo,
+        'sha1': commit.sha1,
+        'files': commit.files,
+        'type': commit.commit_type.name,
+        'statuses': [[int(j), int(d), int(t)] for j, d, t in commit.file_statuses],
+        'modifications': [
+            [
+                m.file_name, m.javadoc_modification, m.functionheader_modification,
+                m.functionheader_date.isoformat() if m.functionheader_date is not None else None,
+                [m.time_offset.days, m.time_offset.seconds, m.time_offset.microseconds]
+                if m.time_offset is not None else None,
+                m.javadoc_tags
+            ]
+            for m in commit.modifications
+        ],
+    }
+
+
+def _restore_commit(commit, record: Dict[str, Any]):
+    commit.commit_type = CommitType[record['type']]
+    commit.file_statuses = FileStatuses(record['statuses'])
+    commit.modifications = ModificationList([
+        Modification(
+            file_name, javadoc_mod, functionheader_mod,
+            datetime.datetime.fromisoformat(functionheader_date) if functionheader_date is not None else None,
+            datetime.timedelta(*time_offset) if time_offset is not None else None,
+            javadoc_tags
+        )
+        for file_name, javadoc_mod, functionheader_mod, functionheader_date, time_offset, javadoc_tags
+        in record['modifications']
+    ])
+    commit.patches = None
+
+
+class Journal:
+    # Classified commits of a run, appended as they come out of classify_commits() and synced to disk
+    # with the counters every _checkpoint_seconds. With resume, the commits an interrupted run has
+    # journaled are taken from its journal instead of classified again, and the run goes on appending
+    # to it. Commits missing from the journal are looked up in cache, see result_cache.ResultCache.
+
+    def __init__(self, path: str = DEFAULT_JOURNAL_FILE, resume: bool = False, cache=None):
+        self.path = path
+        self.cache = cache
+        self.rules = analyzer_rules_version()
+        self.hits = 0
+        self.misses = 0
+        self.journaled = 0
+        # File offsets of the journaled commits, keyed by (repository, SHA)
+        self._offsets: Dict[Tuple[Optional[str], str], int] = {}
+        self._reader = None
+        end = self._scan() if resume and os.path.exists(path) else 0
+        if end:
+            self._reader = open(path, 'rb')
+            self.file = open(path, 'r+b')
+            # Drops what an interrupted write left after the last complete record
+            self.file.truncate(end)
+            self.file.seek(end)
+        else:
+            self.file = open(path, 'wb')
+            self._write({'journal': 1, 'rules': self.rules})
+        self._last_checkpoint = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _scan(self) -> int:
+        # Indexes the commits of an existing journal. Returns the end of its last complete record, or 0
+        # if it can't be resumed.
+        with open(self.path, 'rb') as f:
+            offset = 0
+            for line in f:
+                try:
+                    record = json.loads(line) if line.endswith(b'\n') else None
+                except ValueError:
+                    record = None
+                if record is None:
+                    break
+                if offset == 0 and record.get('rules') != self.rules:
+                    logging.warning("Journal %s was written by other analyzer rules, starting over" % self.path)
+                    return 0
+                if 'sha1' in record:
+                    self._offsets[(record['repo'], record['sha1'])] = offset
+                offset += len(line)
+        self.journaled = len(self._offsets)
+        return offset
+
+    def _write(self, record: Dict[str, Any]):
+        self.file.write(json.dumps(record).encode('ascii'))
+        self.file.write(b'\n')
+
+    def _append(self, commit):
+        self._write(_commit_record(commit))
+        self.journaled += 1
+        if time.monotonic() - self._last_checkpoint >= _checkpoint_seconds:
+            self.checkpoint()
+
+    def load(self, commit) -> bool:
+        offset = self._offsets.get((commit.repo, commit.sha1))
+        if offset is not None:
+            self._reader.seek(offset)
+            record = json.loads(self._reader.readline())
+            if record['files'] == list(commit.files):
+                _restore_commit(commit, record)
+                self.hits += 1
+                return True
+            logging.warning("Journaled files of commit %s differ from the log, classifying it again" % commit.sha1)
+        if self.cache is not None and self.cache.load(commit):
+            self._append(commit)
+            return True
+        self.misses += 1
+        return False
+
+    def store(self, commit):
+        self._append(commit)
+        if self.cache is not None:
+            self.cache.store(commit)
+
+    def checkpoint(self):
+        self._write({
+            'checkpoint': time.time(),
+            'commits': self.journaled,
+            'statistics': {
+                repo or '': dataclasses.asdict(stats) for repo, stats in repositories_statistics().items()
+            },
+        })
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self._last_checkpoint = time.monotonic()
+
+    def close(self):
+        self.checkpoint()
+        self.file.close()
+        if self._reader is not None:
+            self._reader.close()
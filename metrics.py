@@ -0,0 +1,261 @@
+import os
+import json
+import time
+import datetime
+import threading
+import collections
+import dataclasses
+from typing import Dict, Tuple, Optional, Iterable, Iterator, Any
+
+# Live counters of a run, rewritten to a JSON status file every few seconds by StatusWriter, so that
+# unattended runs can be watched and a commit stalling the analysis is seen while it runs. The main
+# thread updates the counters and the writer thread only reads them.
+
+DEFAULT_STATUS_FILE = '__rip-rep-status.json'
+DEFAULT_INTERVAL = 5.0
+
+enabled: bool = False
+
+
+@dataclasses.dataclass()
+class Counters:
+    # Counted wherever the work is done, in pool workers too, see take() and merge()
+    git_subprocesses: int = 0
+    patches: int = 0
+    patch_bytes: int = 0
+    # Function headers looked up in the history, and those of them answered from memory
+    history_lookups: int = 0
+    history_lookup_hits: int = 0
+
+
+counters = Counters()
+# Commits of the log parsed, of them those changing Java files, and how many commits the logs
+# parsed so far have, if known before parsing them
+log_commits = 0
+listed_commits = 0
+expected_log_commits: Optional[int] = None
+log_complete = False
+classified_commits = 0
+cached_commits = 0
+commit_types: Dict[str, int] = collections.Counter()
+# (repo, sha1) -> when its classification started, oldest first
+_in_flight: 'collections.OrderedDict[Tuple[Optional[str], str], float]' = collections.OrderedDict()
+_start = time.time()
+_first_started: Optional[float] = None
+
+
+def subprocess_started():
+    if enabled:
+        counters.git_subprocesses += 1
+
+
+def patch_analysed(size: int):
+    if enabled:
+        counters.patches += 1
+        counters.patch_bytes += size
+
+
+def history_looked_up(headers: int, known: int):
+    if enabled:
+        counters.history_lookups += headers
+        counters.history_lookup_hits += known
+
+
+def log_commit(java_files: bool):
+    global log_commits, listed_commits
+    if enabled:
+        log_commits += 1
+        if java_files:
+            listed_commits += 1
+
+
+def expect_log_commits(count: int):
+    # The number of commits the next log to parse has
+    global expected_log_commits
+    if enabled:
+        expected_log_commits = (expected_log_commits or log_commits) + count
+
+
+def listing(commits: Iterable[Any]) -> Iterator[Any]:
+    # Iterates over the commits to classify, noting when they are all listed. A list is from the start.
+    global log_complete
+    if isinstance(commits, list):
+        log_complete = True
+    yield from commits
+    log_complete = True
+
+
+def started(repo: Optional[str], sha1: str):
+    global _first_started
+    if enabled:
+        now = time.time()
+        _in_flight[(repo, sha1)] = now
+        if _first_started is None:
+            _first_started = now
+
+
+def finished(repo: Optional[str], sha1: str, commit_type: str, cached: bool):
+    global classified_commits, cached_commits, _first_started
+    if enabled:
+        if _in_flight.pop((repo, sha1), None) is None and _first_started is None:
+            _first_started = time.time()
+        if cached:
+            cached_commits += 1
+        else:
+            classified_commits += 1
+        commit_types[commit_type] += 1
+
+
+def take() -> dict:
+    # Hands over the counters so far, e.g. from a pool worker to the main process, see merge()
+    global counters
+    res = dataclasses.asdict(counters)
+    counters = Counters()
+    return res
+
+
+def merge(taken: dict):
+    for name, value in taken.items():
+        setattr(counters, name, getattr(counters, name) + value)
+
+
+def reset():
+    global counters, log_commits, listed_commits, expected_log_commits, log_complete, classified_commits, \
+        cached_commits, commit_types, _in_flight, _start, _first_started
+    counters = Counters()
+    log_commits = listed_commits = classified_commits = cached_commits = 0
+    expected_log_commits = None
+    log_complete = False
+    commit_types = collections.Counter()
+    _in_flight = collections.OrderedDict()
+    _start = time.time()
+    _first_started = None
+
+
+def _rate(count: float, seconds: float) -> Optional[float]:
+    return round(count / seconds, 3) if seconds > 0 else None
+
+
+def _ratio(part: int, whole: int) -> Optional[float]:
+    return round(part / whole, 4) if whole else None
+
+
+def status(previous: Optional[dict] = None) -> dict:
+    # The status file contents. Rates over the time since the previous status, if given, are "recent".
+    now = time.time()
+    elapsed = now - _start
+    done = classified_commits + cached_commits
+    in_flight = list(_in_flight.items())
+
+    remaining_log = None
+    if expected_log_commits is not None and not log_complete:
+        remaining_log = max(expected_log_commits - log_commits, 0)
+    # Commits still to classify, extrapolating those of the log not parsed yet
+    remaining = listed_commits - done
+    if remaining_log and log_commits:
+        remaining += remaining_log * listed_commits / log_commits
+    classifying = now - _first_started if _first_started is not None else 0.0
+    commits_rate = _rate(done, classifying)
+
+    res = {
+        'updated': datetime.datetime.now().isoformat(timespec='seconds'),
+        'elapsed_seconds': round(elapsed, 3),
+        'finished': False,
+        # The exception the run stopped with, if any
+        'error': None,
+        'log': {
+            'commits': log_commits,
+            'java_commits': listed_commits,
+            'expected_commits': expected_log_commits,
+            'complete': log_complete,
+            'eta_seconds': round(remaining_log * elapsed / log_commits, 3)
+            if remaining_log is not None and log_commits else (0.0 if log_complete else None),
+        },
+        'commits': {
+            'done': done,
+            'classified': classified_commits,
+            'cached': cached_commits,
+            'in_flight': len(in_flight),
+            'per_second': commits_rate,
+            # Unknown while commits keep being listed from a log of unknown length
+            'eta_seconds': round(remaining / commits_rate, 3)
+            if commits_rate and (log_complete or remaining_log is not None) else None,
+        },
+        'oldest_in_flight': {
+            'repo': in_flight[0][0][0],
+            'sha1': in_flight[0][0][1],
+            'seconds': round(now - in_flight[0][1], 3),
+        } if in_flight else None,
+        'git_subprocesses': {
+            'total': counters.git_subprocesses,
+            'per_second': _rate(counters.git_subprocesses, elapsed),
+        },
+        'patches': {
+            'files': counters.patches,
+            'bytes': counters.patch_bytes,
+            'bytes_per_second': _rate(counters.patch_bytes, elapsed),
+        },
+        'cache': {
+            'commit_hit_rate': _ratio(cached_commits, done),
+            'history_lookups': counters.history_lookups,
+            'history_lookup_hit_rate': _ratio(counters.history_lookup_hits, counters.history_lookups),
+        },
+        'commit_types': dict(commit_types),
+    }
+    if previous is not None:
+        seconds = elapsed - previous['elapsed_seconds']
+        res['commits']['recent_per_second'] = _rate(done - previous['commits']['done'], seconds)
+        res['git_subprocesses']['recent_per_second'] = _rate(
+            counters.git_subprocesses - previous['git_subprocesses']['total'], seconds
+        )
+        res['patches']['recent_bytes_per_second'] = _rate(counters.patch_bytes - previous['patches']['bytes'], seconds)
+    return res
+
+
+def write_status(path: str, contents: dict):
+    # Replaces the file at once, so that readers never see it half written
+    temporary = path + '.tmp'
+    with open(temporary, 'w', encoding='utf-8') as f:
+        json.dump(contents, f, indent=2)
+    os.replace(temporary, path)
+
+
+class StatusWriter:
+    # Enables the counters and rewrites the status file every interval seconds from a background thread,
+    # and once more on close() with "finished" set, and "error" too if the run failed
+
+    def __init__(self, path: str = DEFAULT_STATUS_FILE, interval: float = DEFAULT_INTERVAL):
+        global enabled
+        self.path = path
+        self.interval = interval
+        self._previous = None
+        self._stop = threading.Event()
+        reset()
+        enabled = True
+        self._write()
+        self._thread = threading.Thread(target=self._run, name='status writer', daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        self.close(exc_type.__name__ if exc_type is not None else None)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._write()
+
+    def _write(self, finished: bool = False, error: Optional[str] = None):
+        contents = status(self._previous)
+        contents['finished'] = finished
+        contents['error'] = error
+        write_status(self.path, contents)
+        self._previous = contents
+
+    def close(self, error: Optional[str] = None):
+        global enabled
+        self._stop.set()
+        self._thread.join()
+        self._write(True, error)
+        enabled = False
@@ -1,13 +1,37 @@
 import dataclasses
 import datetime
-from typing import List, Set, Tuple, Optional, Any
-import subprocess
+import collections
+import array
+from typing import List, Set, Tuple, Optional, Any, Iterable, Iterator, Dict
 import re
 import sys
 import logging
+import metrics
+from git_runner import GitSteps, run_steps
+from compact import add_slots, intern_path
 
 _date_line = re.compile(r'^Date:\s*([0-9\-]+T[0-9\:]+)')
+_walk_date = re.compile(r'^([0-9\-]+T[0-9\:]+)')
+_walk_hunk = re.compile(rb'^@@ -([0-9]+)(?:,([0-9]+))? \+([0-9]+)(?:,([0-9]+))? @@', re.MULTILINE)
+_walk_new_file = re.compile(rb'^new file mode ', re.MULTILINE)
+# Diff options giving the line diff "git log -L" computes for itself: a plain Myers diff of the raw file
+# contents without context, whatever the repository's configuration says
+_walk_diff_options = [
+    '--text', '--no-renames', '--no-ext-diff', '--no-textconv', '--no-color', '--diff-algorithm=myers',
+    '--no-indent-heuristic', '--unified=0', '--inter-hunk-context=0'
+]
 
+# File histories, keyed by (repository, file name), most recent last, and the number of commits all
+# of them may hold together
+_walks: 'collections.OrderedDict[Tuple[Optional[str], str], FileWalk]' = collections.OrderedDict()
+_walks_limit = 1000000
+# Whether the author and message of a commit as "git log" prints them are valid UTF-8, by (repository, sha1)
+_valid_messages: 'collections.OrderedDict[Tuple[Optional[str], str], bool]' = collections.OrderedDict()
+_valid_messages_limit = 100000
+# Most commits passed to a single git command
+_shas_limit = 500
+
+@add_slots
 @dataclasses.dataclass()
 class Modification:
     file_name: str
@@ -15,6 +39,78 @@ class Modification:
     functionheader_modification: str
     functionheader_date: datetime
     time_offset: datetime
+    # Kinds of the tags the changed JavaDoc lines belong to, e.g. "param throws", in order of appearance
+    javadoc_tags: str = ''
+
+
+class ModificationList:
+    # The modifications of a commit, their texts kept in one shared string as (start, end) offsets,
+    # -1 standing for a missing header. Indexing and iterating give Modification views.
+
+    __slots__ = ('_file_names', '_text', '_offsets', '_dates', '_time_offsets', '_tags')
+
+    def __init__(self, modifications: Iterable[Modification] = ()):
+        self._file_names = []
+        self._dates = []
+        self._time_offsets = []
+        self._tags = []
+        self._offsets = array.array('l')
+        texts = []
+        end = 0
+        for m in modifications:
+            self._file_names.append(intern_path(m.file_name))
+            self._dates.append(m.functionheader_date)
+            self._time_offsets.append(m.time_offset)
+            self._tags.append(sys.intern(m.javadoc_tags))
+            for text in (m.javadoc_modification, m.functionheader_modification):
+                if text is None:
+                    self._offsets.extend((-1, -1))
+                else:
+                    texts.append(text)
+                    self._offsets.extend((end, end + len(text)))
+                    end += len(text)
+        self._text = ''.join(texts)
+
+    def __reduce__(self):
+        return _modification_list, (
+            self._file_names, self._text, self._offsets, self._dates, self._time_offsets, self._tags
+        )
+
+    def _slice(self, k: int) -> Optional[str]:
+        start = self._offsets[k]
+        return None if start < 0 else self._text[start:self._offsets[k + 1]]
+
+    def __len__(self) -> int:
+        return len(self._file_names)
+
+    def __getitem__(self, i: int) -> Modification:
+        if i < 0:
+            i += len(self)
+        return Modification(
+            self._file_names[i], self._slice(4 * i), self._slice(4 * i + 2), self._dates[i], self._time_offsets[i],
+            self._tags[i]
+        )
+
+    def __iter__(self) -> Iterator[Modification]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def __eq__(self, other) -> bool:
+        return list(self) == list(other)
+
+    def __repr__(self) -> str:
+        return 'ModificationList(%r)' % list(self)
+
+
+def _modification_list(file_names, text, offsets, dates, time_offsets, tags) -> ModificationList:
+    modifications = ModificationList()
+    modifications._file_names = file_names
+    modifications._text = text
+    modifications._offsets = offsets
+    modifications._dates = dates
+    modifications._time_offsets = time_offsets
+    modifications._tags = tags
+    return modifications
 
 def escape(l: str):
     new_l=l.replace('[', '\[')
@@ -23,13 +119,19 @@ def escape(l: str):
     new_l=new_l.replace('*', '\*')
     return new_l
 
-def find_modification_before(file_name: str, pattern : str, lines_numbers: int, sha: str, before: datetime) -> datetime:
+def find_modification_before(file_name: str, pattern : str, lines_numbers: int, sha: str, before: datetime,
+                             repo: Optional[str] = None) -> datetime:
+    return run_steps(_modification_before_steps(file_name, pattern, lines_numbers, sha, before), repo)
+
+
+def _modification_before_steps(file_name: str, pattern : str, lines_numbers: int, sha: str, before: datetime) \
+        -> GitSteps:
     str_lines = '-L/' + escape(pattern)+'/,+' + str(lines_numbers) +':' + file_name
     try:
         git_cmd = [
             'git', 'log', sha, '--date=iso-strict', str_lines
             ]
-        log = subprocess.check_output(git_cmd).decode(sys.getdefaultencoding())
+        log = (yield git_cmd).decode(sys.getdefaultencoding())
         log = log.replace('\r', '')
         loglines = log.split('\n')
         cur_date = None
@@ -46,3 +148,328 @@ def find_modification_before(file_name: str, pattern : str, lines_numbers: int,
         logging.warning(str(e))
         cur_realdatetime = None
     return cur_realdatetime
+
+
+
+def _git_pattern_to_re(pattern: str) -> Optional[str]:
+    # The escape()d pattern is a POSIX basic regular expression for git. Returns its Python
+    # equivalent, or None if the pattern uses anything besides literals and '.'.
+    if not pattern.isascii():
+        return None
+    res = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == '\\':
+            if i + 1 < len(pattern) and pattern[i + 1] in '[]/*':
+                res.append(re.escape(pattern[i + 1]))
+                i += 2
+                continue
+            return None
+        if c == '.':
+            res.append('.')
+        elif c == '^' and i == 0:
+            res.append('^')
+        elif c == '$' and i == len(pattern) - 1:
+            res.append('$')
+        else:
+            res.append(re.escape(c))
+        i += 1
+    return ''.join(res)
+
+
+
+
+def find_modifications_before(file_name: str, headers: List[Tuple[str, int]], sha: str, before: datetime,
+                              repo: Optional[str] = None) -> List[Optional[datetime.datetime]]:
+    # find_modification_before() for all (pattern, number of lines) function headers of a file at once.
+    # Instead of a "git log -L" per header, the history of the file is walked once, see FileWalk, and
+    # the line ranges of all the headers are followed through it the way "git log -L" follows them.
+    return run_steps(modifications_before_steps(file_name, headers, sha, before, repo), repo)
+
+
+@add_slots
+@dataclasses.dataclass()
+class FileDiff:
+    # The zero-context diff of a file from one commit to another as "git log -L" sees it, and whether the
+    # file is new. Its hunks are the 0-based (parent start, parent end, start, end) line ranges they replace,
+    # and whether the lines they delete are valid UTF-8.
+    hunks: List[Tuple[int, int, int, int, bool]]
+    new: bool
+
+
+@add_slots
+@dataclasses.dataclass()
+class FileWalk:
+    # The history of a file: the date, parents and FileDiff to the first parent of every commit walked,
+    # the FileDiff None where the file didn't change. Walked from a commit, it holds all its ancestors.
+    # The diffs to other parents of merges and whether a commit deletes files of a parent are read when
+    # needed, keyed by (parent, commit).
+    commits: Dict[str, Tuple[datetime.datetime, Tuple[str, ...], Optional[FileDiff]]]
+    other_diffs: Dict[Tuple[str, str], Optional[FileDiff]] = dataclasses.field(default_factory=dict)
+    deletions: Dict[Tuple[str, str], bool] = dataclasses.field(default_factory=dict)
+
+
+def _file_diff(output: bytes) -> Optional[FileDiff]:
+    # The FileDiff of a zero-context patch of a single file, None for no patch
+    if not output.strip():
+        return None
+    hunks = []
+    matches = list(_walk_hunk.finditer(output))
+    for hm, next_hm in zip(matches, matches[1:] + [None]):
+        parent_count = int(hm.group(2)) if hm.group(2) is not None else 1
+        count = int(hm.group(4)) if hm.group(4) is not None else 1
+        # A hunk without lines on one side gives the line before it there
+        parent_start = int(hm.group(1)) - (1 if parent_count else 0)
+        start = int(hm.group(3)) - (1 if count else 0)
+        body = output[hm.end():next_hm.start() if next_hm is not None else len(output)]
+        try:
+            b'\n'.join(l for l in body.split(b'\n') if l.startswith(b'-')).decode(sys.getdefaultencoding())
+            valid = True
+        except UnicodeDecodeError:
+            valid = False
+        hunks.append((parent_start, parent_start + parent_count, start, start + count, valid))
+    return FileDiff(hunks, _walk_new_file.search(output) is not None)
+
+
+def _walk_commits(output: bytes) -> Dict[str, Tuple[datetime.datetime, Tuple[str, ...], Optional[FileDiff]]]:
+    # The commits of a "git log" output in the format _file_walk_command() asks for
+    res = {}
+    for chunk in output.split(b'\0')[1:]:
+        line, _, patch = chunk.partition(b'\n')
+        fields = line.decode('ascii').split()
+        date = datetime.datetime.strptime(_walk_date.match(fields[1]).group(1), "%Y-%m-%dT%H:%M:%S")
+        res[fields[0]] = (date, tuple(fields[2:]), _file_diff(patch))
+    return res
+
+
+def _file_walk_command(file_name: str, sha: str) -> List[str]:
+    # Every ancestor of sha with its real parents, and its diff of the file to the first parent
+    return ['git', '--literal-pathspecs', 'log', '--full-history', '--sparse', '--no-show-signature',
+            '--diff-merges=first-parent', '-p', '--format=%x00%H %ad %P', '--date=iso-strict'] + \
+        _walk_diff_options + [sha, '--', file_name]
+
+
+def _walk_order(commits: Dict[str, Tuple[datetime.datetime, Tuple[str, ...], Optional[FileDiff]]],
+                sha: str) -> Iterator[str]:
+    # sha and its ancestors in the order "git log" walks them for "-L": a commit comes after all its
+    # children, and of the commits ready, the one made ready last comes first
+    children = {sha: 0}
+    stack = [sha]
+    while stack:
+        for parent in commits[stack.pop()][1]:
+            if parent in children:
+                children[parent] += 1
+            elif parent in commits:
+                children[parent] = 1
+                stack.append(parent)
+    stack = [sha]
+    while stack:
+        commit = stack.pop()
+        yield commit
+        for parent in commits[commit][1]:
+            if parent in children:
+                children[parent] -= 1
+                if not children[parent]:
+                    stack.append(parent)
+
+
+def _union(a: List[Tuple[int, int]], b: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    # The sorted line ranges covering both, without empty ones, touching ones joined
+    res = []
+    for start, end in sorted(a + b):
+        if start == end:
+            continue
+        if res and res[-1][1] >= start:
+            if res[-1][1] < end:
+                res[-1] = (res[-1][0], end)
+        else:
+            res.append((start, end))
+    return res
+
+
+def _map_across_diff(ranges: List[Tuple[int, int]], hunks: List[Tuple[int, int, int, int, bool]]) \
+        -> Tuple[List[Tuple[int, int]], List[Tuple[int, int, int, int, bool]]]:
+    # The line ranges in the parent the ranges of a file come from, and the hunks of the diff changing them.
+    # Follows range_set_map_across_diff() of git's line-log.c, quirks included: a hunk is checked only
+    # against the first range not ending before it.
+    touched = []
+    j = 0
+    for hunk in hunks:
+        while j < len(ranges) and hunk[2] > ranges[j][1]:
+            j += 1
+        if j == len(ranges):
+            break
+        if not (hunk[3] <= ranges[j][0] or ranges[j][1] <= hunk[2]):
+            touched.append(hunk)
+    # The ranges without the changed lines, split where lines were deleted
+    untouched = []
+    j = 0
+    for start, end in ranges:
+        while start < end:
+            while j < len(touched) and start >= touched[j][3]:
+                j += 1
+            if j == len(touched) or end <= touched[j][2]:
+                untouched.append((start, end))
+                break
+            if start < touched[j][2]:
+                untouched.append((start, touched[j][2]))
+            start = touched[j][3]
+    # Moved to where they are in the parent
+    shifted = []
+    j = 0
+    offset = 0
+    for start, end in untouched:
+        while j < len(hunks) and start >= hunks[j][2]:
+            offset += (hunks[j][1] - hunks[j][0]) - (hunks[j][3] - hunks[j][2])
+            j += 1
+        shifted.append((start + offset, end + offset))
+    return _union(shifted, [(hunk[0], hunk[1]) for hunk in touched]), touched
+
+
+def _header_range(content: bytes, pattern: str, lines_numbers: int) -> Tuple[bool, Optional[Tuple[int, int]]]:
+    # Whether the lines "git log -L/<pattern>/,+<lines_numbers>" starts from in the file are known for
+    # sure, and their 0-based range, None if no line matches and git fails. git sees the pattern as a
+    # POSIX basic regular expression, whose "." may match a non-ASCII character differently.
+    regex = _git_pattern_to_re(escape(pattern))
+    if regex is None or b'\0' in content or ('.' in pattern and not content.isascii()):
+        return False, None
+    match = re.search(regex.encode('ascii'), content, re.MULTILINE)
+    if match is None:
+        return True, None
+    start = content.count(b'\n', 0, match.start())
+    lines = content.count(b'\n') + (0 if content.endswith(b'\n') else 1)
+    end = min(start + lines_numbers, lines)
+    # The lines are printed with the entries of the header, which must decode
+    try:
+        b'\n'.join(content.split(b'\n')[start:end]).decode(sys.getdefaultencoding())
+    except UnicodeDecodeError:
+        return False, None
+    return True, (start, end)
+
+
+def _may_be_renamed_steps(walk: FileWalk, parent: str, sha: str) -> GitSteps:
+    # Whether git may take a file new at sha for a renamed one, which "git log -L" would follow: it looks
+    # for the file among those sha deletes, by their similarity
+    key = (parent, sha)
+    if key not in walk.deletions:
+        walk.deletions[key] = bool((yield ['git', 'diff-tree', '-r', '--no-renames', '--diff-filter=D', '--name-only',
+                                         parent, sha]).strip())
+    return walk.deletions[key]
+
+
+def _parent_diff_steps(walk: FileWalk, file_name: str, parent: str, sha: str) -> GitSteps:
+    # The FileDiff of the file from a parent of sha other than the first
+    key = (parent, sha)
+    if key not in walk.other_diffs:
+        walk.other_diffs[key] = _file_diff((yield ['git', '--literal-pathspecs', 'diff-tree', '-p'] +
+                                            _walk_diff_options + [parent, sha, '--', file_name]))
+    return walk.other_diffs[key]
+
+
+def _valid_messages_steps(shas: Iterable[str], repo: Optional[str]) -> GitSteps:
+    # Learns for _valid_messages whether the authors and messages of the commits are valid UTF-8
+    unknown = sorted({sha for sha in shas if (repo, sha) not in _valid_messages})
+    for i in range(0, len(unknown), _shas_limit):
+        output = yield ['git', 'show', '-s', '--format=%x00%H%n%an <%ae>%n%aN <%aE>%n%B%n%N'] + unknown[i:i + _shas_limit]
+        for record in output.split(b'\0')[1:]:
+            try:
+                record.decode(sys.getdefaultencoding())
+                valid = True
+            except UnicodeDecodeError:
+                valid = False
+            _valid_messages[(repo, record[:40].decode('ascii'))] = valid
+    while len(_valid_messages) > _valid_messages_limit:
+        _valid_messages.popitem(last=False)
+
+
+def modifications_before_steps(file_name: str, headers: List[Tuple[str, int]], sha: str, before: datetime,
+                               repo: Optional[str] = None) -> GitSteps:
+    # The git commands of find_modifications_before(), to be run in repo, see git_runner. Headers the
+    # walk can't follow exactly as "git log -L" does are looked up with it: when the file may have been
+    # renamed, when the pattern may match otherwise than in git, or when git's output of the header
+    # would not decode, as that makes find_modification_before() fail.
+    res: List[Optional[datetime.datetime]] = [None] * len(headers)
+    ranges = {}
+    try:
+        content = yield ['git', 'cat-file', 'blob', f'{sha}:{file_name}']
+        for k, (pattern, lines_numbers) in enumerate(headers):
+            known, header_range = _header_range(content, pattern, lines_numbers)
+            if not known:
+                ranges[k] = None
+            elif header_range is not None:
+                ranges[k] = [header_range]
+    except Exception as e:
+        logging.warning(str(e))
+        ranges = dict.fromkeys(range(len(headers)))
+    walked = {k for k, header_ranges in ranges.items() if header_ranges is not None}
+    entries = {k: [] for k in walked}
+
+    if walked:
+        key = (repo, file_name)
+        walk = _walks.get(key)
+        known = walk is not None and sha in walk.commits
+        try:
+            if not known:
+                commits = _walk_commits((yield _file_walk_command(file_name, sha)))
+                if walk is None:
+                    walk = _walks[key] = FileWalk(commits)
+                else:
+                    walk.commits.update(commits)
+            _walks.move_to_end(key)
+            while len(_walks) > 1 and sum(len(w.commits) for w in _walks.values()) > _walks_limit:
+                _walks.popitem(last=False)
+
+            # The line ranges of the headers each commit still has to be checked for, see
+            # line_log_process_ranges_arbitrary_commit() in git's line-log.c
+            pending = {sha: {k: ranges[k] for k in walked}}
+            for commit in _walk_order(walk.commits, sha):
+                for k, header_ranges in pending.pop(commit, {}).items():
+                    if k not in walked:
+                        continue
+                    _, parents, diff = walk.commits[commit]
+                    # The parents the ranges go on to, with their ranges there and the hunks changing them
+                    candidates = []
+                    for n, parent in enumerate(parents):
+                        if n:
+                            diff = yield from _parent_diff_steps(walk, file_name, parent, commit)
+                        if diff is None:
+                            parent_ranges, touched = header_ranges, []
+                        elif diff.new and (yield from _may_be_renamed_steps(walk, parent, commit)):
+                            candidates = None
+                            break
+                        else:
+                            parent_ranges, touched = _map_across_diff(header_ranges, diff.hunks)
+                        if not touched:
+                            # The parent takes all the ranges, and the commit didn't change them
+                            candidates = [(parent, parent_ranges, touched)]
+                            break
+                        candidates.append((parent, parent_ranges, touched))
+                    else:
+                        entries[k].append(commit)
+                    # Lines deleted from the ranges are printed with the entries
+                    if candidates is None or not all(hunk[4] for _, _, touched in candidates for hunk in touched):
+                        walked.discard(k)
+                        continue
+                    for parent, parent_ranges, _ in candidates:
+                        if parent_ranges:
+                            parent_pending = pending.setdefault(parent, {})
+                            parent_pending[k] = _union(parent_pending.get(k, []), parent_ranges)
+                if not pending:
+                    break
+            yield from _valid_messages_steps((commit for k in walked for commit in entries[k]), repo)
+        except Exception as e:
+            logging.warning(str(e))
+            walked = set()
+        metrics.history_looked_up(len(headers), len(walked) if known else 0)
+    else:
+        metrics.history_looked_up(len(headers), 0)
+
+    for k, (pattern, lines_numbers) in enumerate(headers):
+        if k in walked:
+            if all(_valid_messages.get((repo, commit), False) for commit in entries[k]):
+                dates = [walk.commits[commit][0] for commit in entries[k]]
+                res[k] = next((date for date in dates if date < before), dates[-1] if dates else None)
+        elif k in ranges:
+            res[k] = yield from _modification_before_steps(file_name, pattern, lines_numbers, sha, before)
+    return res
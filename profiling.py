@@ -0,0 +1,156 @@
+import csv
+import json
+import time
+import heapq
+import contextlib
+import dataclasses
+from typing import List, Tuple, Dict, Any
+import metrics
+
+# Stages timed with stage(), in report order
+LOG_PARSING = 'log parsing'
+PREFILTER = 'prefilter'
+PATCH_FETCH = 'patch fetch'
+DECODE = 'decode'
+ANALYSIS = 'analysis'
+HISTORY_LOOKUP = 'history lookup'
+REPORT_WRITING = 'report writing'
+STAGES = (LOG_PARSING, PREFILTER, PATCH_FETCH, DECODE, ANALYSIS, HISTORY_LOOKUP, REPORT_WRITING)
+
+enabled: bool = False
+
+# How many of the slowest commits and files are reported
+_slowest_limit = 20
+
+
+@dataclasses.dataclass()
+class StageStats:
+    calls: int = 0
+    seconds: float = 0.0
+    subprocesses: int = 0
+
+
+_stages: Dict[str, StageStats] = {}
+# [stage name, start time, seconds spent in nested stages] of the stages being timed
+_active: List[List[Any]] = []
+_slowest_commits: List[Tuple[float, str]] = []
+_slowest_files: List[Tuple[float, str, str]] = []
+
+
+@contextlib.contextmanager
+def stage(name: str):
+    # Times the block as the given stage. Time spent in nested stages is only counted for them.
+    if not enabled:
+        yield
+        return
+    _active.append([name, time.perf_counter(), 0.0])
+    try:
+        yield
+    finally:
+        name, start, nested = _active.pop()
+        elapsed = time.perf_counter() - start
+        stats = _stages.setdefault(name, StageStats())
+        stats.calls += 1
+        stats.seconds += elapsed - nested
+        if _active:
+            _active[-1][2] += elapsed
+
+
+def timed(iterable, name: str):
+    # Iterates over iterable, timing the production of every item as the given stage
+    it = iter(iterable)
+    while True:
+        with stage(name):
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+        yield item
+
+
+def record(name: str, seconds: float, subprocesses: int = 0):
+    # Adds time spent outside of stage(), e.g. waiting for git concurrently with other stages
+    if enabled:
+        stats = _stages.setdefault(name, StageStats())
+        stats.calls += 1
+        stats.seconds += seconds
+        stats.subprocesses += subprocesses
+
+
+def subprocess_started():
+    # Counts a git child process for the innermost stage being timed, and for the live metrics
+    metrics.subprocess_started()
+    if enabled and _active:
+        _stages.setdefault(_active[-1][0], StageStats()).subprocesses += 1
+
+
+def _keep_slowest(heap: list, item: tuple):
+    if len(heap) < _slowest_limit:
+        heapq.heappush(heap, item)
+    elif item > heap[0]:
+        heapq.heapreplace(heap, item)
+
+
+def record_commit(sha1: str, seconds: float):
+    if enabled:
+        _keep_slowest(_slowest_commits, (seconds, sha1))
+
+
+def record_file(sha1: str, file_name: str, seconds: float):
+    if enabled:
+        _keep_slowest(_slowest_files, (seconds, sha1, file_name))
+
+
+def take() -> dict:
+    # Hands over what was recorded so far, e.g. from a pool worker to the main process, see merge()
+    global _stages, _slowest_commits, _slowest_files
+    res = {
+        'stages': {name: dataclasses.astuple(stats) for name, stats in _stages.items()},
+        'slowest_commits': _slowest_commits,
+        'slowest_files': _slowest_files,
+    }
+    _stages = {}
+    _slowest_commits = []
+    _slowest_files = []
+    return res
+
+
+def merge(taken: dict):
+    for name, (calls, seconds, subprocesses) in taken['stages'].items():
+        stats = _stages.setdefault(name, StageStats())
+        stats.calls += calls
+        stats.seconds += seconds
+        stats.subprocesses += subprocesses
+    for item in taken['slowest_commits']:
+        _keep_slowest(_slowest_commits, tuple(item))
+    for item in taken['slowest_files']:
+        _keep_slowest(_slowest_files, tuple(item))
+
+
+def write_summary(json_file: str, csv_file: str, wall_seconds: float):
+    names = [name for name in STAGES if name in _stages] + sorted(set(_stages) - set(STAGES))
+    slowest_commits = sorted(_slowest_commits, reverse=True)
+    slowest_files = sorted(_slowest_files, reverse=True)
+
+    with open(json_file, 'w', encoding='utf-8') as f:
+        json.dump({
+            'wall_seconds': wall_seconds,
+            'stages': {name: dataclasses.asdict(_stages[name]) for name in names},
+            'slowest_commits': [{'sha1': sha1, 'seconds': seconds} for seconds, sha1 in slowest_commits],
+            'slowest_files': [
+                {'sha1': sha1, 'file_name': file_name, 'seconds': seconds}
+                for seconds, sha1, file_name in slowest_files
+            ],
+        }, f, indent=2)
+
+    with open(csv_file, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['kind', 'name', 'file_name', 'calls', 'seconds', 'subprocesses'])
+        writer.writerow(['total', '', '', '', wall_seconds, ''])
+        for name in names:
+            stats = _stages[name]
+            writer.writerow(['stage', name, '', stats.calls, stats.seconds, stats.subprocesses])
+        for seconds, sha1 in slowest_commits:
+            writer.writerow(['commit', sha1, '', '', seconds, ''])
+        for seconds, sha1, file_name in slowest_files:
+            writer.writerow(['file', sha1, file_name, '', seconds, ''])
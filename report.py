@@ -0,0 +1,138 @@
+import csv
+import json
+import datetime
+from typing import List, Any, Tuple
+import openpyxl
+from openpyxl.chart import DoughnutChart, Reference
+
+OUTPUT_FORMATS = ('xlsx', 'csv', 'jsonl')
+
+# Columns of the rows returned by Commit.get_csv_lines()
+COLUMNS = [
+    'commit_type', 'commit', 'date', 'file_name', 'javadoc_modification',
+    'functionheader_modification', 'functionheader_date', 'days_since_functionheader'
+]
+
+
+def _json_value(value: Any) -> Any:
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+
+class CommitsReport:
+    # Rows of the commits report, appended to the output file as soon as commits are classified.
+    # Subclasses write one format each, see open_commits_report(). Every format has the same rows
+    # of all the COLUMNS, headed by their names, empty cells being None.
+
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+        self.rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, rows: List[List[Any]]):
+        for row in rows:
+            # Commits without modifications have their first columns only
+            self.write_row([None if value == '' else value for value in row] + [None] * (len(COLUMNS) - len(row)))
+            self.rows += 1
+
+    def write_row(self, row: List[Any]):
+        raise NotImplementedError()
+
+    def close(self):
+        pass
+
+
+class CsvCommitsReport(CommitsReport):
+
+    def __init__(self, file_name: str):
+        super().__init__(file_name)
+        self.file = open(file_name, 'w', encoding='utf-8', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(COLUMNS)
+
+    def write_row(self, row: List[Any]):
+        self.writer.writerow(row)
+
+    def close(self):
+        self.file.close()
+
+
+class JsonlCommitsReport(CommitsReport):
+
+    def __init__(self, file_name: str):
+        super().__init__(file_name)
+        self.file = open(file_name, 'w', encoding='utf-8')
+
+    def write_row(self, row: List[Any]):
+        self.file.write(json.dumps(
+            {column: _json_value(value) for column, value in zip(COLUMNS, row)}, ensure_ascii=False
+        ))
+        self.file.write('\n')
+
+    def close(self):
+        self.file.close()
+
+
+class XlsxCommitsReport(CommitsReport):
+    # The workbook is in write-only mode, so rows are flushed to a temporary file instead of kept in memory
+
+    def __init__(self, file_name: str):
+        super().__init__(file_name)
+        self.workbook = openpyxl.Workbook(write_only=True)
+        self.worksheet = self.workbook.create_sheet('Commits')
+        self.worksheet.append(COLUMNS)
+
+    def write_row(self, row: List[Any]):
+        self.worksheet.append(row)
+
+    def close(self):
+        self.workbook.save(self.file_name)
+
+
+def open_commits_report(output_format: str, base_name: str = '__commits') -> CommitsReport:
+    file_name = base_name + '.' + output_format
+    if output_format == 'csv':
+        return CsvCommitsReport(file_name)
+    if output_format == 'jsonl':
+        return JsonlCommitsReport(file_name)
+    if output_format == 'xlsx':
+        return XlsxCommitsReport(file_name)
+    raise ValueError("Unknown output format %s, expected one of %s" % (output_format, ', '.join(OUTPUT_FORMATS)))
+
+
+def statistics_to_excel(statistics: List[Tuple[str, int]], file_name: str = '__statistics.xlsx'):
+    # The statistics sheet and its chart of rows 3 to 5, written in one pass
+    workbook = openpyxl.Workbook(write_only=True)
+    worksheet = workbook.create_sheet('Statistics')
+    max_length = max(len(label) for label, _ in statistics)
+    worksheet.column_dimensions['A'].width = (max_length + 2) * 1.2
+    for row in statistics:
+        worksheet.append(list(row))
+
+    chart = DoughnutChart()
+    chart.type = "filled"
+    labels = Reference(worksheet, min_col = 1, min_row = 3, max_row = 5)
+    data = Reference(worksheet, min_col = 2, min_row = 3, max_row = 5)
+    chart.add_data(data, titles_from_data = False)
+    chart.set_categories(labels)
+    chart.title = "Commits Chart"
+    chart.style = 26
+    worksheet.add_chart(chart, "C7")
+
+    workbook.save(file_name)
+
+
+def summary_to_excel(header: List[str], rows: List[List[Any]], file_name: str):
+    workbook = openpyxl.Workbook(write_only=True)
+    worksheet = workbook.create_sheet('Summary')
+    worksheet.column_dimensions['A'].width = (max(len(str(row[0])) for row in [header] + rows) + 2) * 1.2
+    worksheet.append(header)
+    for row in rows:
+        worksheet.append(row)
+    workbook.save(file_name)
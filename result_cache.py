@@ -0,0 +1,146 @@
+import datetime
+import sqlite3
+import logging
+from typing import List, Tuple, Optional
+from modification import Modification, ModificationList
+from compact import FileStatuses
+from javadoc_analyzer import analyzer_rules_version
+from commits import CommitType
+
+DEFAULT_CACHE_FILE = '__rip-rep-cache.sqlite'
+
+# Results are committed to disk in batches of this many commits
+_commit_batch = 100
+
+_schema = [
+    '''CREATE TABLE IF NOT EXISTS commits (
+        sha1 TEXT NOT NULL,
+        rules TEXT NOT NULL,
+        commit_type TEXT NOT NULL,
+        PRIMARY KEY (sha1, rules)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS files (
+        sha1 TEXT NOT NULL,
+        rules TEXT NOT NULL,
+        file_name TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        java INTEGER NOT NULL,
+        javadoc INTEGER NOT NULL,
+        tag INTEGER NOT NULL,
+        PRIMARY KEY (sha1, rules, file_name)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS modifications (
+        sha1 TEXT NOT NULL,
+        rules TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        file_name TEXT NOT NULL,
+        javadoc_modification TEXT,
+        functionheader_modification TEXT,
+        functionheader_date TEXT,
+        time_offset REAL,
+        javadoc_tags TEXT NOT NULL DEFAULT '',
+        PRIMARY KEY (sha1, rules, position)
+    )''',
+]
+# Columns added to the tables of older cache files, whose rows are of other rules anyway
+_added_columns = [
+    ('modifications', 'javadoc_tags', "TEXT NOT NULL DEFAULT ''"),
+]
+
+
+class ResultCache:
+    # Classification results of commits, keyed by commit SHA and file path, that survive
+    # between runs. Entries of other analyzer rules are ignored, see analyzer_rules_version().
+
+    def __init__(self, path: str = DEFAULT_CACHE_FILE):
+        self.path = path
+        self.rules = analyzer_rules_version()
+        self.hits = 0
+        self.misses = 0
+        self._unsaved = 0
+        self.connection = sqlite3.connect(path)
+        for statement in _schema:
+            self.connection.execute(statement)
+        for table, column, definition in _added_columns:
+            if column not in [row[1] for row in self.connection.execute(f'PRAGMA table_info({table})')]:
+                self.connection.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+        self.connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def load(self, commit) -> bool:
+        # Fills in a commit's classification if it is cached, otherwise returns False
+        row = self.connection.execute(
+            'SELECT commit_type FROM commits WHERE sha1 = ? AND rules = ?', (commit.sha1, self.rules)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return False
+        files = self.connection.execute(
+            'SELECT file_name, java, javadoc, tag FROM files WHERE sha1 = ? AND rules = ? ORDER BY position',
+            (commit.sha1, self.rules)
+        ).fetchall()
+        if [f for f, _, _, _ in files] != list(commit.files):
+            logging.warning("Cached files of commit %s differ from the log, classifying it again" % commit.sha1)
+            self.misses += 1
+            return False
+        modifications = self.connection.execute(
+            'SELECT file_name, javadoc_modification, functionheader_modification, functionheader_date, time_offset, '
+            'javadoc_tags FROM modifications WHERE sha1 = ? AND rules = ? ORDER BY position',
+            (commit.sha1, self.rules)
+        ).fetchall()
+
+        commit.commit_type = CommitType[row[0]]
+        commit.file_statuses = FileStatuses((j, d, t) for _, j, d, t in files)
+        commit.modifications = ModificationList([
+            Modification(
+                file_name, javadoc_mod, functionheader_mod,
+                datetime.datetime.fromisoformat(functionheader_date) if functionheader_date is not None else None,
+                datetime.timedelta(seconds=time_offset) if time_offset is not None else None,
+                javadoc_tags
+            )
+            for file_name, javadoc_mod, functionheader_mod, functionheader_date, time_offset, javadoc_tags in modifications
+        ])
+        commit.patches = None
+        self.hits += 1
+        return True
+
+    def store(self, commit):
+        key = (commit.sha1, self.rules)
+        self.connection.execute('DELETE FROM files WHERE sha1 = ? AND rules = ?', key)
+        self.connection.execute('DELETE FROM modifications WHERE sha1 = ? AND rules = ?', key)
+        self.connection.executemany(
+            'INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [
+                key + (f, i, j, d, t)
+                for i, (f, (j, d, t)) in enumerate(zip(commit.files, commit.file_statuses))
+            ]
+        )
+        self.connection.executemany(
+            'INSERT INTO modifications VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            [
+                key + (
+                    i, m.file_name, m.javadoc_modification, m.functionheader_modification,
+                    m.functionheader_date.isoformat() if m.functionheader_date is not None else None,
+                    m.time_offset.total_seconds() if m.time_offset is not None else None,
+                    m.javadoc_tags
+                )
+                for i, m in enumerate(commit.modifications)
+            ]
+        )
+        self.connection.execute('INSERT OR REPLACE INTO commits VALUES (?, ?, ?)', key + (commit.commit_type.name,))
+        self._unsaved += 1
+        if self._unsaved >= _commit_batch:
+            self.save()
+
+    def save(self):
+        self.connection.commit()
+        self._unsaved = 0
+
+    def close(self):
+        self.save()
+        self.connection.close()
@@ -1,94 +1,186 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import shutil
 import os
-from typing import List, Set, Tuple, Optional, Any
+import time
+import contextlib
+from typing import List, Set, Tuple, Optional, Any, Iterable, Iterator
 import dataclasses
-import pandas as pd
-import openpyxl
-from openpyxl.chart import DoughnutChart, Reference
 import logging
 import tqdm
-import tempfile
 import argparse
 import csv
 import commits
-from commits import Commit, CommitType, get_commits
+import profiling
+import metrics
+from batch import Repository, read_manifest
+from decoding import check_encoding
+from report import OUTPUT_FORMATS, open_commits_report, statistics_to_excel, summary_to_excel
+from result_cache import ResultCache, DEFAULT_CACHE_FILE
+from journal import Journal, DEFAULT_JOURNAL_FILE
+from tag_index import TagIndex, DEFAULT_TAG_INDEX_FILE
+from commits import Commit, CommitType, CommitStatistics, ENGINES, ENGINE_PATCH, get_commits, stream_commits, fan_out_commits, \
+    classify_commits
 
 # git log --name-status --all
-# git format-patch -1 --numbered-files --unified=100000 8aad90891ea4ab5762420c7424db7b01ec50c107 -- "bundles/org.eclipse.swt/Eclipse SWT PI/common_j2se/org/eclipse/swt/internal/Library.java"
-
-
-def statistics_to_excel():
-    df = pd.DataFrame([
-        ["Commits with Java file changes", commits._java_files_commits],
-        ["Commits having JavaDoc tags changed", commits._mixed_commits + commits._only_javadoc_in_some_files_commits + commits._pure_javadoc_commits],
-        ["Commits having Code and JavaDoc tags changed in all files", commits._mixed_commits],
-        ["Commits having files with only JavaDoc tag changes", commits._only_javadoc_in_some_files_commits],
-        ["Commits exclusively of JavaDoc tag changes", commits._pure_javadoc_commits]
-    ])
-    with pd.ExcelWriter('__statistics.xlsx', engine='openpyxl') as writer:
-        df.to_excel(writer, 'Statistics', index_label=False, index=False, header=False)
-    wb = openpyxl.load_workbook('__statistics.xlsx')        
-    worksheet = wb.active
-    col = worksheet['A']
-    max_length = 0
-    for cell in col:
-        try:
-            if len(str(cell.value)) > max_length:
-                max_length = len(cell.value)
-        except Exception as e:
-            logging.warning(str(e))
-            continue
-    adjusted_width = (max_length + 2) * 1.2
-    worksheet.column_dimensions['A'].width = adjusted_width
-
-    chart = DoughnutChart()
-    chart.type = "filled"
-    labels = Reference(worksheet, min_col = 1, min_row = 3, max_row = 5)
-    data = Reference(worksheet, min_col = 2, min_row = 3, max_row = 5)
-    chart.add_data(data, titles_from_data = False)
-    chart.set_categories(labels)
-    chart.title = "Commits Chart"
-    chart.style = 26
-    worksheet.add_chart(chart, "C7")
-    
-    wb.save('__statistics.xlsx')
+# git show --format= --unified=100000 8aad90891ea4ab5762420c7424db7b01ec50c107 -- "*.java"
 
 
-def calc_stats(args: argparse.Namespace):
-    commits_list = get_commits(
-        args.only_commit if 'only_commit' in args else None
-    )
-
-    print("Analyzing commits...")
-
+def classify(args: argparse.Namespace, commits_iter: Iterable[Commit], total: Optional[int] = None,
+             journal_file: str = DEFAULT_JOURNAL_FILE) -> Iterator[Commit]:
+    cache = ResultCache(args.cache) if args.cache else None
+    # Only runs asked to be resumable keep a journal, so that a plain run never replaces one
+    journal = Journal(args.journal or journal_file, args.resume, cache) if args.resume or args.journal else None
+    if args.resume:
+        print(f"Resuming with {journal.journaled} commits classified before")
+    index = TagIndex(args.tag_index) if args.tag_index else None
     try:
-        tmpdir = tempfile.mkdtemp()
-        for c in tqdm.tqdm(commits_list):
-            c.classify(tmpdir)
+        for c in tqdm.tqdm(
+            classify_commits(
+                metrics.listing(commits_iter), args.jobs, journal if journal is not None else cache, args.prefilter,
+                args.async_git, args.engine
+            ),
+            total=total
+        ):
+            if index is not None:
+                with profiling.stage(profiling.REPORT_WRITING):
+                    index.add(c)
+            yield c
     finally:
-        shutil.rmtree(tmpdir, ignore_errors=True)
+        if index is not None:
+            index.close()
+        if journal is not None:
+            journal.close()
+        if args.resume:
+            print(f"Journaled results reused for {journal.hits} commits")
+        if cache is not None:
+            cache.close()
+            print(f"Cached results reused for {cache.hits} commits, {cache.misses} commits classified")
 
-    commit_lines = []
-    for c in commits_list:
-        if c.commit_type in {CommitType.ONLY_JAVADOC_TAGS_EVERYWHERE, CommitType.ONLY_JAVADOC_TAGS_IN_SOME_FILES}:
-            commit_lines.extend(c.get_csv_lines(args.commit_prefix))
 
-    df = pd.DataFrame(commit_lines)
-    with pd.ExcelWriter('__commits.xlsx', engine='openpyxl') as writer:
-        df.to_excel(writer, 'Commits', index_label=False, index=False, header=False)
+def is_reported(c: Commit) -> bool:
+    return c.commit_type in {CommitType.ONLY_JAVADOC_TAGS_EVERYWHERE, CommitType.ONLY_JAVADOC_TAGS_IN_SOME_FILES}
 
-    statistics_to_excel()
 
+def print_report(stats: CommitStatistics):
     print("Report")
     print("======")
-    print("Total commits:", commits._total_commits)
-    print("Commits with Java file changes:", commits._java_files_commits)
-    print("Commits having Code and JavaDoc tags changed in all files: ", commits._mixed_commits)
-    print("Commits having files with only JavaDoc tag changes:", commits._only_javadoc_in_some_files_commits)
-    print("Commits exclusively of JavaDoc tag changes:", commits._pure_javadoc_commits)
+    print("Total commits:", stats.total_commits)
+    print("Commits with Java file changes:", stats.java_files_commits)
+    print("Commits having Code and JavaDoc tags changed in all files: ", stats.mixed_commits)
+    print("Commits having files with only JavaDoc tag changes:", stats.only_javadoc_in_some_files_commits)
+    print("Commits exclusively of JavaDoc tag changes:", stats.pure_javadoc_commits)
+
+
+def calc_stats(args: argparse.Namespace):
+    start = time.perf_counter()
+    only_commit = args.only_commit if 'only_commit' in args else None
+    if args.stream:
+        print("Analyzing commits while streaming the log...")
+        commits_iter = profiling.timed(stream_commits(only_commit, None, args.encoding), profiling.LOG_PARSING)
+        total = None
+    elif args.log_jobs > 1 and not only_commit:
+        print("Analyzing commits while fetching the log...")
+        commits_iter = profiling.timed(fan_out_commits(None, args.encoding, args.log_jobs), profiling.LOG_PARSING)
+        total = None
+    else:
+        with profiling.stage(profiling.LOG_PARSING):
+            commits_iter = get_commits(only_commit, None, args.encoding)
+        total = len(commits_iter)
+        print("Analyzing commits...")
+
+    report = open_commits_report(args.output_format)
+    try:
+        for c in classify(args, commits_iter, total):
+            if is_reported(c):
+                with profiling.stage(profiling.REPORT_WRITING):
+                    report.write(c.get_csv_lines(args.commit_prefix))
+    finally:
+        with profiling.stage(profiling.REPORT_WRITING):
+            report.close()
+
+    stats = commits.statistics()
+    with profiling.stage(profiling.REPORT_WRITING):
+        statistics_to_excel(stats.rows())
+
+    if profiling.enabled:
+        profiling.write_summary('__profile.json', '__profile.csv', time.perf_counter() - start)
+
+    print_report(stats)
+
+
+def calc_batch_stats(args: argparse.Namespace):
+    # All repositories of the manifest share one pool: the commits of the next repository are
+    # classified while the last ones of the previous repository are still in the workers
+    start = time.perf_counter()
+    repos = read_manifest(args.batch)
+    repo_indexes = {r.path: i for i, r in enumerate(repos)}
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    def output_file(repo: Repository, suffix: str) -> str:
+        return os.path.join(args.output_dir, repo.name + suffix)
+
+    def all_commits() -> Iterator[Commit]:
+        for r in repos:
+            if args.stream:
+                yield from profiling.timed(stream_commits(None, r.path, r.encoding), profiling.LOG_PARSING)
+            elif args.log_jobs > 1:
+                yield from profiling.timed(fan_out_commits(r.path, r.encoding, args.log_jobs), profiling.LOG_PARSING)
+            else:
+                with profiling.stage(profiling.LOG_PARSING):
+                    repo_commits = get_commits(None, r.path, r.encoding)
+                yield from repo_commits
+
+    # Commits come out of the pool in order, so the outputs of all repositories before
+    # the current one are complete
+    done = 0
+    report = None
+
+    def finish_repos(until: int):
+        nonlocal done, report
+        while done < until:
+            r = repos[done]
+            with profiling.stage(profiling.REPORT_WRITING):
+                if report is None:
+                    report = open_commits_report(args.output_format, output_file(r, '__commits'))
+                report.close()
+                report = None
+                statistics_to_excel(commits.statistics(r.path).rows(), output_file(r, '__statistics.xlsx'))
+            done += 1
+
+    print(f"Analyzing commits of {len(repos)} repositories...")
+    try:
+        for c in classify(args, all_commits(), journal_file=os.path.join(args.output_dir, DEFAULT_JOURNAL_FILE)):
+            i = repo_indexes[c.repo]
+            finish_repos(i)
+            if is_reported(c):
+                with profiling.stage(profiling.REPORT_WRITING):
+                    if report is None:
+                        report = open_commits_report(args.output_format, output_file(repos[i], '__commits'))
+                    report.write(c.get_csv_lines(repos[i].commit_prefix))
+        finish_repos(len(repos))
+    finally:
+        if report is not None:
+            report.close()
+
+    total = CommitStatistics()
+    summary = []
+    for r in repos:
+        stats = commits.statistics(r.path)
+        total.add(stats)
+        summary.append([r.name, r.path, stats.total_commits] + [value for _, value in stats.rows()])
+    summary.append(["Total", '', total.total_commits] + [value for _, value in total.rows()])
+    with profiling.stage(profiling.REPORT_WRITING):
+        summary_to_excel(
+            ["Repository", "Path", "Total commits"] + [label for label, _ in total.rows()],
+            summary, os.path.join(args.output_dir, '__summary.xlsx')
+        )
+        statistics_to_excel(total.rows(), os.path.join(args.output_dir, '__statistics.xlsx'))
+
+    if profiling.enabled:
+        profiling.write_summary('__profile.json', '__profile.csv', time.perf_counter() - start)
+
+    print_report(total)
 
 
 if __name__ == '__main__':
@@ -100,5 +192,61 @@ if __name__ == '__main__':
     #argparser.add_argument('-cl', '--context-lines', type=int, default=3)
     argparser.add_argument('-oc', '--only-commit', type=str, required=False, help=\
         "For debug purposes. Only analyse given commit, e.g. 7051049221c9d3b99ff179f167fa09a6e02138ee")
+    argparser.add_argument('-j', '--jobs', type=int, default=1, help=\
+        "Number of worker processes classifying commits in parallel")
+    argparser.add_argument('-ag', '--async-git', type=int, default=0, metavar='N', help=\
+        "Classify commits in a single process running up to N git commands at once in the background, " \
+        "analysing the output of finished ones meanwhile. Replaces --jobs")
+    argparser.add_argument('-eg', '--engine', type=str, choices=ENGINES, default=ENGINE_PATCH, help=\
+        "How changed files are analysed: from full-context patches, or from zero-context ones replayed " \
+        "over a model of each file's JavaDoc kept between commits, which gives the same results")
+    argparser.add_argument('-st', '--stream', action='store_true', help=\
+        "Read the whole history through a single 'git log -p' pipe and classify commits as they arrive")
+    argparser.add_argument('-lj', '--log-jobs', type=int, default=1, metavar='N', help=\
+        "Fetch the log in chunks of 'git rev-list --all' with N git processes at once and classify commits " \
+        "as soon as the first chunk is parsed")
+    argparser.add_argument('-ca', '--cache', type=str, nargs='?', const=DEFAULT_CACHE_FILE, help=\
+        f"Keep classification results in the given SQLite file (default {DEFAULT_CACHE_FILE}) " \
+        "and only classify commits missing from it on later runs")
+    argparser.add_argument('-jo', '--journal', type=str, required=False, help=\
+        "Checkpoint the classified commits to the given journal file while the analysis runs, so that the run " \
+        f"can be resumed. Without it runs keep no journal, except --resume using {DEFAULT_JOURNAL_FILE} " \
+        "(in --output-dir for --batch)")
+    argparser.add_argument('-re', '--resume', action='store_true', help=\
+        "Continue an interrupted run from its journal, classifying only the commits missing from it, " \
+        "or start a journal if there is none; the reports come out the same as those of an uninterrupted run")
+    argparser.add_argument('-ti', '--tag-index', type=str, nargs='?', const=DEFAULT_TAG_INDEX_FILE, help=\
+        f"Also write the JavaDoc tag changes per function to the given SQLite file (default {DEFAULT_TAG_INDEX_FILE}), " \
+        "see tag_index.py for querying it")
+    argparser.add_argument('-f', '--output-format', type=str, choices=OUTPUT_FORMATS, default='xlsx', help=\
+        "Format of the commits report, written to __commits.<format> while commits are classified")
+    argparser.add_argument('-pf', '--prefilter', action='store_true', help=\
+        "Fetch full-context patches only of the files whose zero-context diff may touch JavaDoc tags; " \
+        "the reported counts stay the same")
+    argparser.add_argument('-pr', '--profile', action='store_true', help=\
+        "Time the stages of the analysis and write them to __profile.json and __profile.csv")
+    argparser.add_argument('-ms', '--metrics', type=str, nargs='?', const=metrics.DEFAULT_STATUS_FILE, help=\
+        f"Rewrite the given JSON status file (default {metrics.DEFAULT_STATUS_FILE}) while the analysis runs with " \
+        "commits/s, git processes/s, patch bytes, cache hit rates, counts per commit type, ETA and the oldest " \
+        "commit being classified")
+    argparser.add_argument('-mi', '--metrics-interval', type=float, default=metrics.DEFAULT_INTERVAL, metavar='SECONDS', help=\
+        "How often the --metrics status file is rewritten")
+    argparser.add_argument('-ba', '--batch', type=str, required=False, help=\
+        "Analyse all repositories listed in the given manifest file, one '<repository path> <commit URL prefix>' " \
+        "per line, in a shared pool instead of the current directory")
+    argparser.add_argument('-od', '--output-dir', type=str, default='.', help=\
+        "Directory of the per-repository reports and the combined __summary.xlsx of --batch")
+    argparser.add_argument('-en', '--encoding', type=check_encoding, required=False, help=\
+        "Encoding of the repository's sources, e.g. cp1251, instead of detecting it per file. " \
+        "In --batch mode it is given per repository in the manifest")
     args = argparser.parse_args()
-    calc_stats(args)
+    if args.async_git and args.jobs > 1:
+        argparser.error("--async-git and --jobs can't be combined")
+    if args.engine != ENGINE_PATCH and (args.async_git or args.stream or args.prefilter):
+        argparser.error("--engine %s can't be combined with --async-git, --stream or --prefilter" % args.engine)
+    profiling.enabled = args.profile
+    with metrics.StatusWriter(args.metrics, args.metrics_interval) if args.metrics else contextlib.nullcontext():
+        if args.batch:
+            calc_batch_stats(args)
+        else:
+            calc_stats(args)
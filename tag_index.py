@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import re
+import sys
+import csv
+import sqlite3
+import datetime
+import argparse
+import dataclasses
+from typing import List, Tuple, Optional, Any, Iterator
+from modification import Modification
+
+DEFAULT_TAG_INDEX_FILE = '__rip-rep-tags.sqlite'
+
+# Rows are committed to disk in batches of this many commits
+_commit_batch = 100
+
+_header_prefix = re.compile(r'^(\+|\-| )')
+_header_end = re.compile(r'\s*(\{|;)\s*$')
+
+_schema = [
+    '''CREATE TABLE IF NOT EXISTS tag_changes (
+        repo TEXT NOT NULL,
+        sha1 TEXT NOT NULL,
+        commit_type TEXT NOT NULL,
+        commit_date TEXT NOT NULL,
+        file_name TEXT NOT NULL,
+        signature TEXT,
+        tag TEXT,
+        header_date TEXT,
+        days INTEGER
+    )''',
+    'CREATE INDEX IF NOT EXISTS tag_changes_commit ON tag_changes (repo, sha1)',
+    'CREATE INDEX IF NOT EXISTS tag_changes_tag ON tag_changes (tag, commit_date)',
+    'CREATE INDEX IF NOT EXISTS tag_changes_file ON tag_changes (file_name, commit_date)',
+    'CREATE INDEX IF NOT EXISTS tag_changes_signature ON tag_changes (signature)',
+]
+
+_columns = ['repo', 'sha1', 'commit_type', 'commit_date', 'file_name', 'signature', 'tag', 'header_date', 'days']
+
+
+@dataclasses.dataclass()
+class TagChange:
+    # A JavaDoc tag changed in a file without other changes, '' standing for the current directory in repo
+    repo: str
+    sha1: str
+    commit_type: str
+    commit_date: datetime.datetime
+    file_name: str
+    # The function header after the JavaDoc on one line, None if no header was found
+    signature: Optional[str]
+    # param, return, exception, throw or throws, the tag a changed continuation line belongs to included,
+    # None if not known
+    tag: Optional[str]
+    # When the header was last changed before, and the days since then
+    header_date: Optional[datetime.datetime]
+    days: Optional[int]
+
+
+def signature(functionheader_modification: Optional[str]) -> Optional[str]:
+    # The header lines of a Modification as "<modifiers> <type> <name>(<arguments>)"
+    if functionheader_modification is None:
+        return None
+    header = ' '.join(_header_prefix.sub('', l, 1).strip() for l in functionheader_modification.split('\n'))
+    return ' '.join(_header_end.sub('', header).split())
+
+
+def changed_tags(modification: Modification) -> List[Optional[str]]:
+    # Kinds of the tags the changed lines of a Modification belong to, in order of appearance
+    return modification.javadoc_tags.split() or [None]
+
+
+def _date(value: Optional[str]) -> Optional[datetime.datetime]:
+    return datetime.datetime.fromisoformat(value) if value is not None else None
+
+
+class TagIndex:
+    # The JavaDoc tag changes of analysed commits, one row per modification and tag kind, queried
+    # without running git. Adding a commit again replaces its rows.
+
+    def __init__(self, path: str = DEFAULT_TAG_INDEX_FILE):
+        self.path = path
+        self._unsaved = 0
+        self.connection = sqlite3.connect(path)
+        for statement in _schema:
+            self.connection.execute(statement)
+        self.connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, commit):
+        key = (commit.repo or '', commit.sha1)
+        self.connection.execute('DELETE FROM tag_changes WHERE repo = ? AND sha1 = ?', key)
+        self.connection.executemany(
+            'INSERT INTO tag_changes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            [
+                key + (
+                    commit.commit_type.name, commit.date.isoformat(), m.file_name,
+                    signature(m.functionheader_modification), tag,
+                    m.functionheader_date.isoformat() if m.functionheader_date is not None else None,
+                    m.time_offset.days if m.time_offset is not None else None
+                )
+                for m in commit.modifications or ()
+                for tag in changed_tags(m)
+            ]
+        )
+        self._unsaved += 1
+        if self._unsaved >= _commit_batch:
+            self.save()
+
+    def query(self, tag: Optional[str] = None, file_name: Optional[str] = None, signature: Optional[str] = None,
+              since: Optional[str] = None, until: Optional[str] = None, min_days: Optional[int] = None,
+              max_days: Optional[int] = None, repo: Optional[str] = None) -> Iterator[TagChange]:
+        # Tag changes, oldest first. file_name is a GLOB pattern, signature a substring, since and until
+        # are ISO dates of the commits, min_days and max_days bound the days since the header changed.
+        conditions: List[str] = []
+        parameters: List[Any] = []
+        for condition, value in (
+                ('tag = ?', tag), ('file_name GLOB ?', file_name), ('instr(signature, ?) > 0', signature),
+                ('commit_date >= ?', since), ('commit_date < ?', until),
+                ('days >= ?', min_days), ('days <= ?', max_days), ('repo = ?', repo)):
+            if value is not None:
+                conditions.append(condition)
+                parameters.append(value)
+        sql = 'SELECT %s FROM tag_changes' % ', '.join(_columns)
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY commit_date, rowid'
+        for r in self.connection.execute(sql, parameters):
+            yield TagChange(r[0], r[1], r[2], _date(r[3]), r[4], r[5], r[6], _date(r[7]), r[8])
+
+    def save(self):
+        self.connection.commit()
+        self._unsaved = 0
+
+    def close(self):
+        self.save()
+        self.connection.close()
+
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser(description="Query the JavaDoc tag changes indexed by rip-rep-logs.py --tag-index")
+    argparser.add_argument('-db', '--database', type=str, default=DEFAULT_TAG_INDEX_FILE)
+    argparser.add_argument('-t', '--tag', type=str, required=False, help="param, return, exception, throw or throws")
+    argparser.add_argument('-fi', '--file', type=str, required=False, help="Files matching a GLOB pattern, e.g. 'src/*/Foo.java'")
+    argparser.add_argument('-si', '--signature', type=str, required=False, help="Function headers containing the text")
+    argparser.add_argument('-sn', '--since', type=str, required=False, help="Commits from the ISO date on, e.g. 2023-01-31")
+    argparser.add_argument('-un', '--until', type=str, required=False, help="Commits before the ISO date")
+    argparser.add_argument('-mi', '--min-days', type=int, required=False, help="At least so many days since the header changed")
+    argparser.add_argument('-ma', '--max-days', type=int, required=False, help="At most so many days since the header changed")
+    argparser.add_argument('-re', '--repo', type=str, required=False, help="Repository path as given to --batch, '' for a single one")
+    args = argparser.parse_args()
+    with TagIndex(args.database) as index:
+        writer = csv.writer(sys.stdout)
+        writer.writerow(_columns)
+        for change in index.query(args.tag, args.file, args.signature, args.since, args.until,
+                                  args.min_days, args.max_days, args.repo):
+            writer.writerow([
+                value.isoformat() if isinstance(value, datetime.datetime) else value
+                for value in dataclasses.astuple(change)
+            ])
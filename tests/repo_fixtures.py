@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+
+# Small git repositories with scripted histories, and running rip-rep-logs.py on them
+
+import os
+import re
+import io
+import sys
+import csv
+import datetime
+import subprocess
+import chardet
+from typing import List, Tuple, Dict
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+_commit_line = re.compile(r'^commit ([0-9a-f]{40})$')
+_date_line = re.compile(r'^Date:\s*([0-9\-]+T[0-9\:]+)')
+_src_line = re.compile(r'^M\t((.+)\.java)$')
+
+_outputs = (
+    '__commits.csv', '__statistics.xlsx', '__rip-rep-logs.log', '__rip-rep-journal.jsonl',
+    '__rip-rep-cache.sqlite', '__rip-rep-tags.sqlite', '__rip-rep-status.json'
+)
+
+
+class FixtureRepository:
+    # A git repository at path whose commits are made with the given dates, e.g. '2020-01-01'
+
+    def __init__(self, path: str):
+        self.path = path
+        self.env = dict(os.environ)
+        self.env.update({
+            'GIT_AUTHOR_NAME': 'test', 'GIT_AUTHOR_EMAIL': 'test@example.com',
+            'GIT_COMMITTER_NAME': 'test', 'GIT_COMMITTER_EMAIL': 'test@example.com',
+        })
+        os.makedirs(path, exist_ok=True)
+        self.git('init', '-q')
+
+    def git(self, *args: str) -> str:
+        return subprocess.check_output(['git'] + list(args), cwd=self.path, env=self.env).decode('utf-8')
+
+    def write(self, file_name: str, lines: List[str], encoding: str = 'utf-8', newline: str = '\n'):
+        full_name = os.path.join(self.path, file_name)
+        os.makedirs(os.path.dirname(full_name), exist_ok=True)
+        with open(full_name, 'w', encoding=encoding, newline=newline) as f:
+            f.write('\n'.join(lines) + '\n')
+
+    def commit(self, date: str, message: str) -> str:
+        self.env['GIT_AUTHOR_DATE'] = self.env['GIT_COMMITTER_DATE'] = date + 'T12:00:00+00:00'
+        self.git('add', '-A')
+        self.git('commit', '-q', '-m', message)
+        return self.git('rev-parse', 'HEAD').strip()
+
+
+def run_ripper(repo: str, *args: str, fresh: bool = True) -> Tuple[List[List[str]], List[str]]:
+    # The rows of the CSV commits report and the lines printed by rip-rep-logs.py run in repo, without
+    # the outputs of earlier runs, such as the cache or the journal, if fresh
+    for name in _outputs:
+        if fresh and os.path.exists(os.path.join(repo, name)):
+            os.remove(os.path.join(repo, name))
+    output = subprocess.run(
+        [sys.executable, os.path.join(ROOT, 'rip-rep-logs.py'), '-cp', 'P/', '-f', 'csv'] + list(args),
+        cwd=repo, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True
+    ).stdout.decode('utf-8', 'replace')
+    with open(os.path.join(repo, '__commits.csv'), encoding='utf-8', newline='') as f:
+        rows = list(csv.reader(f))[1:]
+    return rows, [l.strip() for l in output.split('\n') if l.strip()]
+
+
+def report(printed: List[str]) -> List[str]:
+    # The counts printed at the end of a run
+    return printed[printed.index('Report'):]
+
+
+def reference_report(repo: str) -> Tuple[List[List[str]], List[str]]:
+    # run_ripper() rows and report of the analysis as it was before any of the faster modes:
+    # a "git format-patch" of each changed file and a "git log -L" of each function header
+    from commits import Commit, CommitType
+    from javadoc_analyzer import has_java_javadoc_changed
+    from modification import find_modification_before
+    from report import COLUMNS
+
+    def git(*args: str) -> str:
+        return subprocess.check_output(['git'] + list(args), cwd=repo).decode('utf-8')
+
+    def decode(bts: bytes) -> str:
+        # Commit.read_file_in_any_encoding(), sys.getdefaultencoding() being UTF-8 as well
+        try:
+            return bts.decode('utf-8')
+        except UnicodeDecodeError:
+            return bts.decode(chardet.detect(bts)['encoding'])
+
+    def find_before(file_name, headers, sha, before):
+        return [find_modification_before(file_name, h, n, sha, before, repo) for h, n in headers]
+
+    commits = []
+    for l in git('log', '--name-status', '--date=iso-strict', '--all').split('\n'):
+        clm = _commit_line.match(l)
+        cld = _date_line.match(l)
+        clf = _src_line.match(l)
+        if clm:
+            commits.append([clm.group(1), None, []])
+        elif cld:
+            commits[-1][1] = datetime.datetime.strptime(cld.group(1), "%Y-%m-%dT%H:%M:%S")
+        elif clf:
+            commits[-1][2].append(clf.group(1))
+
+    counts = {t: 0 for t in CommitType}
+    out = io.StringIO()
+    writer = csv.writer(out)
+    for sha, date, files in commits:
+        if not files:
+            continue
+        statuses = []
+        modifications = []
+        for f in files:
+            try:
+                patch = decode(subprocess.check_output(
+                    ['git', 'format-patch', '-1', '--stdout', '--unified=100000', sha, '--', f], cwd=repo
+                ))
+                j, d, t, m = has_java_javadoc_changed(f, patch, date, sha, find_before=find_before)
+            except Exception:
+                # A bad patch
+                j, d, t, m = False, False, False, []
+            statuses.append((j, d, t))
+            if t and not j and not d:
+                modifications.extend(m)
+        pure = sum(1 for j, d, t in statuses if t and not j and not d)
+        if pure == len(statuses):
+            commit_type = CommitType.ONLY_JAVADOC_TAGS_EVERYWHERE
+        elif pure:
+            commit_type = CommitType.ONLY_JAVADOC_TAGS_IN_SOME_FILES
+        elif not any(t for _, _, t in statuses):
+            commit_type = CommitType.WITHOUT_JAVADOC_TAGS
+        else:
+            commit_type = CommitType.JAVA_AND_JAVADOC_TAGS_EVERYWHERE
+        counts[commit_type] += 1
+        if pure:
+            writer.writerows(Commit(sha, files, date, commit_type, modifications=modifications).get_csv_lines('P/'))
+    out.seek(0)
+    # Rows of commits without modifications have their first columns only, the report pads them
+    return [row + [''] * (len(COLUMNS) - len(row)) for row in csv.reader(out)], [
+        'Report', '======',
+        'Total commits: %d' % len(commits),
+        'Commits with Java file changes: %d' % sum(1 for _, _, files in commits if files),
+        'Commits having Code and JavaDoc tags changed in all files:  %d'
+        % counts[CommitType.JAVA_AND_JAVADOC_TAGS_EVERYWHERE],
+        'Commits having files with only JavaDoc tag changes: %d' % counts[CommitType.ONLY_JAVADOC_TAGS_IN_SOME_FILES],
+        'Commits exclusively of JavaDoc tag changes: %d' % counts[CommitType.ONLY_JAVADOC_TAGS_EVERYWHERE],
+    ]
+
+
+def rows_by_commit(rows: List[List[str]]) -> Dict[str, List[List[str]]]:
+    # Report rows grouped under the commit URL of the first row of each commit
+    res = {}
+    commit = None
+    for row in rows:
+        if row[1]:
+            commit = row[1]
+        res.setdefault(commit, []).append(row)
+    return res
+
+
+def _method(javadoc: List[str], header: List[str], body: str = 'return 0;') -> List[str]:
+    return ['    /**'] + ['     * ' + l if l else '     *' for l in javadoc] + ['     */'] + \
+        ['    ' + l for l in header] + ['        ' + body, '    }', '']
+
+
+def _class(name: str, methods: List[List[str]]) -> List[str]:
+    return ['package fixture;', '', 'public class %s {' % name, ''] + sum(methods, []) + ['}']
+
+
+def make_review_repository(path: str) -> Dict[str, str]:
+    # A history with the cases faster modes get wrong most easily: a header losing a line before
+    # its JavaDoc is edited, a continuation line of @throws edited, and a non-ASCII file name
+    # changed along with another file. Returns the commit sha1s by message.
+    repo = FixtureRepository(path)
+    shas = {}
+
+    def sources(params: List[str], throws_text: str, y_return: str, u_return: str):
+        repo.write('src/A.java', _class('A', [
+            _method([
+                'Adds the numbers.', '',
+                '@param a ' + params[0],
+                '@throws IllegalArgumentException if',
+                '        ' + throws_text,
+            ], ['public int add(int a,'] + params[1:] + ['        int c) {'], 'return a + c;'),
+            _method(['Negates.', '', '@param a the value'], ['public int neg(int a) {'], 'return -a;'),
+        ]))
+        repo.write('src/Y.java', _class('Y', [
+            _method(['Why.', '', '@return ' + y_return], ['public int y() {']),
+        ]))
+        repo.write('src/Ü.java', _class('Ü', [
+            _method(['Umlaut.', '', '@return ' + u_return], ['public int u() {']),
+        ]))
+
+    sources(['the first', '        int b,'], 'a is negative', 'zero', 'zero')
+    shas['initial'] = repo.commit('2020-01-01', 'initial')
+    sources(['the first'], 'a is negative', 'zero', 'zero')
+    shas['delete header line'] = repo.commit('2020-01-02', 'delete header line')
+    sources(['the first summand'], 'a is negative', 'zero', 'zero')
+    shas['edit param'] = repo.commit('2020-01-03', 'edit param')
+    sources(['the first summand'], 'a is negative', 'nothing', 'nothing')
+    shas['edit quoted'] = repo.commit('2020-01-04', 'edit quoted')
+    sources(['the first summand'], 'a is below zero', 'nothing', 'nothing')
+    shas['edit throws continuation'] = repo.commit('2020-01-05', 'edit throws continuation')
+    return shas
+
+
+def make_latin1_repository(path: str) -> Dict[str, str]:
+    # A source in Latin-1 having "@param q äö the q" edited to "äöü". Returns the commit sha1s by message.
+    repo = FixtureRepository(path)
+    shas = {}
+
+    def sources(q: str):
+        repo.write('src/D.java', _class('D', [
+            _method(['Berechnet die Größe für den Schlüssel.', '', '@param q ' + q + ' the q',
+                     '@return die Länge, nie größer als q'], ['public int d(int q) {']),
+            _method(['Macht rückgängig, was d() ändert.', '', '@return the ' + q], ['public int undo() {']),
+        ]), 'latin-1')
+
+    sources('äö')
+    shas['initial'] = repo.commit('2020-02-01', 'initial')
+    sources('äöü')
+    shas['edit param'] = repo.commit('2020-02-02', 'edit param')
+    return shas
+
+
+def make_edge_repository(path: str) -> Dict[str, str]:
+    # A history with what the review repository lacks: function headers changed on both sides of a
+    # merge, a renamed file, a file with CRLF line ends, and one in Windows-1251 with a header changed
+    # along with a Cyrillic comment. Returns the commit sha1s by message.
+    repo = FixtureRepository(path)
+    shas = {}
+    state = {'first': 'the first', 'second': 'the second', 'one_header': ['public int one(int a) {'],
+             'two_header': ['public int two(int a) {'], 'renamed': False, 'rest': 'the rest',
+             'crlf': 'the line', 'crlf_header': ['public int crlf(int a) {'], 'cyrillic': 'первый',
+             'comment': '// Считает сумму.', 'sum_header': ['public int sum(int a) {']}
+
+    def sources(**changes):
+        state.update(changes)
+        repo.write('src/M.java', _class('M', [
+            _method(['One.', '', '@param a ' + state['first']], state['one_header']),
+            _method(['Two.', '', '@param a ' + state['second']], state['two_header']),
+        ]))
+        moved = 'src/S.java' if state['renamed'] else 'src/R.java'
+        repo.write(moved, _class('S' if state['renamed'] else 'R', [
+            _method(['Rest.', '', '@param a ' + state['rest'], '@return the rest of a'], ['public int rest(int a) {']),
+            _method(['Other.', '', '@return nothing at all'], ['public int other() {']),
+        ]))
+        repo.write('src/W.java', _class('W', [
+            _method(['Ends lines with CR LF.', '', '@param a ' + state['crlf']], state['crlf_header']),
+        ]), newline='\r\n')
+        sum_method = _method(['Сумма чисел, записанная по-русски.', '', '@param a ' + state['cyrillic'] + ' слагаемое'],
+                             state['sum_header'])
+        sum_method.insert(sum_method.index('     */') + 1, '    ' + state['comment'])
+        repo.write('src/L.java', _class('L', [sum_method]), 'cp1251')
+
+    sources()
+    shas['initial'] = repo.commit('2020-03-01', 'initial')
+    repo.git('checkout', '-q', '-b', 'side')
+    sources(one_header=['public int one(int a,', '        int b) {'], crlf_header=['public int crlf(int a, int b) {'])
+    shas['side headers'] = repo.commit('2020-03-02', 'side headers')
+    sources(first='the first value')
+    shas['side tag'] = repo.commit('2020-03-03', 'side tag')
+    repo.git('checkout', '-q', 'master')
+    sources(first='the first', one_header=['public int one(int a) {'], crlf_header=['public int crlf(int a) {'],
+            two_header=['public int two(int a) throws Exception {'], comment='// Считает сумму двух.',
+            sum_header=['public int sum(int a, int b) {'])
+    shas['master headers'] = repo.commit('2020-03-04', 'master headers')
+    repo.env['GIT_AUTHOR_DATE'] = repo.env['GIT_COMMITTER_DATE'] = '2020-03-05T12:00:00+00:00'
+    repo.git('merge', '-q', '--no-ff', '-m', 'merge side', 'side')
+    shas['merge side'] = repo.git('rev-parse', 'HEAD').strip()
+    # The merged sources
+    sources(one_header=['public int one(int a,', '        int b) {'], crlf_header=['public int crlf(int a, int b) {'],
+            first='the first value')
+    assert not repo.git('status', '--porcelain')
+    sources(first='the first value, or zero', second='the second value', crlf='the only line',
+            cyrillic='второй')
+    shas['tags after merge'] = repo.commit('2020-03-06', 'tags after merge')
+    repo.git('mv', 'src/R.java', 'src/S.java')
+    sources(renamed=True)
+    shas['rename'] = repo.commit('2020-03-07', 'rename')
+    sources(rest='the rest, renamed')
+    shas['tag after rename'] = repo.commit('2020-03-08', 'tag after rename')
+    return shas
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+# A batch writes for each repository the report of analysing it alone, and reports the sums
+
+import os
+import re
+import sys
+import csv
+import subprocess
+import pytest
+from repo_fixtures import ROOT, make_review_repository, reference_report, report
+import synthetic
+import batch
+
+_count = re.compile(r'^(.*:\s*)(\d+)$')
+
+
+def _total(reports):
+    # The report lines of the given reports with their counts summed
+    res = []
+    for lines in zip(*reports):
+        counts = [_count.match(l) for l in lines]
+        if counts[0]:
+            res.append(counts[0].group(1) + str(sum(int(c.group(2)) for c in counts)))
+        else:
+            res.append(lines[0])
+    return res
+
+
+@pytest.mark.parametrize('mode', [[], ['-j', '2'], ['-st']], ids=lambda mode: ' '.join(mode) or 'plain')
+def test_batch_reports_as_reference(tmp_path, mode):
+    base = str(tmp_path)
+    make_review_repository(os.path.join(base, 'review'))
+    synthetic.make_repository(os.path.join(base, 'synthetic'), 20, 2, 4, 0.8, seed=5)
+    references = {name: reference_report(os.path.join(base, name)) for name in ('review', 'synthetic')}
+    with open(os.path.join(base, 'manifest.txt'), 'w', encoding='utf-8') as f:
+        f.write('# fixtures\nreview P/\n\nsynthetic P/\n')
+
+    output = subprocess.run(
+        [sys.executable, os.path.join(ROOT, 'rip-rep-logs.py'), '-f', 'csv', '-ba', 'manifest.txt', '-od', 'out']
+        + mode, cwd=base, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True
+    ).stdout.decode('utf-8', 'replace')
+    for name, (reference_rows, _) in references.items():
+        with open(os.path.join(base, 'out', name + '__commits.csv'), encoding='utf-8', newline='') as f:
+            assert list(csv.reader(f))[1:] == reference_rows
+    printed = [l.strip() for l in output.split('\n') if l.strip()]
+    assert report(printed) == _total([printed for _, printed in references.values()])
+
+
+def test_manifest_rejects_repeated_repository(tmp_path):
+    base = str(tmp_path)
+    for name in ('a', 'b'):
+        os.makedirs(os.path.join(base, name))
+    with open(os.path.join(base, 'manifest.txt'), 'w', encoding='utf-8') as f:
+        f.write('a P/\nb P/ cp1251\n\n./b/../a Q/\n')
+    with pytest.raises(ValueError, match=r'manifest\.txt:4: repository .* is listed on line 1 already'):
+        batch.read_manifest(os.path.join(base, 'manifest.txt'))
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import subprocess
+from repo_fixtures import ROOT
+import synthetic
+
+
+def test_synthetic_repository(tmp_path):
+    path = str(tmp_path)
+    commits = synthetic.make_repository(path, 12, 2, 3, 0.8, seed=4, branches=2)
+    assert len(subprocess.check_output(['git', 'rev-list', '--all'], cwd=path).split()) == commits == 12
+
+
+def test_benchmark_stages_run(tmp_path):
+    # Small sizes only check that every stage runs and reports
+    output = subprocess.run(
+        [sys.executable, os.path.join(ROOT, 'benchmarks', 'run.py'), '--files', '2', '--methods', '4',
+         '--huge-methods', '50', '--commits', '10'],
+        cwd=str(tmp_path), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True
+    ).stdout.decode('utf-8')
+    stages = [l.split('  ')[0] for l in output.split('\n')]
+    for stage in ('analyzer', 'huge patch', 'log (get)', 'log (stream)', 'classify'):
+        assert stage in stages
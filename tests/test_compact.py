@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+import pickle
+import datetime
+import pytest
+import repo_fixtures  # puts the repository on sys.path
+from compact import FileStatuses
+from commits import Commit, CommitType
+from modification import Modification, ModificationList
+
+_modifications = [
+    Modification('src/A.java', '-     * @param a\n+     * @param a the a', '     void f(int a) {',
+                 datetime.datetime(2020, 1, 1), datetime.timedelta(days=2), 'param'),
+    Modification('src/A.java', '+     *     more', None, None, None, 'throws'),
+    Modification('src/Ü.java', '', '', datetime.datetime(2020, 1, 2), datetime.timedelta(0), 'return throws'),
+]
+
+
+def test_modification_list_as_modifications():
+    modifications = ModificationList(_modifications)
+    assert len(modifications) == 3
+    assert list(modifications) == _modifications
+    assert modifications[-1] == _modifications[-1]
+    # An empty text isn't a missing one
+    assert (modifications[2].javadoc_modification, modifications[1].functionheader_modification) == ('', None)
+    assert pickle.loads(pickle.dumps(modifications)) == _modifications
+    assert ModificationList() == []
+
+
+@pytest.mark.parametrize('statuses', [[], [(True, False, True), (False, True, False), (True, True, True)]])
+def test_file_statuses_as_tuples(statuses):
+    file_statuses = FileStatuses(statuses)
+    assert (len(file_statuses), list(file_statuses)) == (len(statuses), statuses)
+    assert [file_statuses[i] for i in range(len(statuses))] == statuses
+    assert pickle.loads(pickle.dumps(file_statuses)) == FileStatuses(statuses)
+
+
+def test_commit_pickles_without_dict():
+    commit = Commit('a' * 40, ['src/A.java', 'src/Ü.java'], datetime.datetime(2020, 1, 3),
+                    CommitType.ONLY_JAVADOC_TAGS_EVERYWHERE, FileStatuses([(False, False, True)] * 2),
+                    ModificationList(_modifications))
+    assert not hasattr(commit, '__dict__')
+    assert not hasattr(commit.modifications[0], '__dict__')
+    loaded = pickle.loads(pickle.dumps(commit))
+    assert (loaded.sha1, loaded.files, loaded.date, loaded.commit_type, list(loaded.file_statuses)) == \
+        (commit.sha1, commit.files, commit.date, commit.commit_type, list(commit.file_statuses))
+    assert loaded.modifications == _modifications
+    assert loaded.get_csv_lines('P/') == commit.get_csv_lines('P/')
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from repo_fixtures import make_latin1_repository, run_ripper, reference_report, report
+import decoding
+from decoding import decode_patch, check_encoding
+
+_patch = '\n'.join([
+    'diff --git a/src/A.java b/src/A.java',
+    '@@ -1,4 +1,4 @@',
+    '     /**',
+    '-     * @param a первое слагаемое',
+    '+     * @param a первое из слагаемых, целое число',
+    '      */',
+    '     public int add(int a) {',
+] * 20) + '\n'
+
+
+@pytest.fixture(autouse=True)
+def no_detected():
+    decoding._detected.clear()
+    yield
+    decoding._detected.clear()
+
+
+def test_given_encoding():
+    assert decode_patch(_patch.encode('cp1251'), 'src/A.java', encoding='cp1251') == _patch
+    # Falls back to UTF-8 for files not in the given encoding
+    assert decode_patch(_patch.encode('utf-8'), 'src/A.java', encoding='ascii') == _patch
+    assert check_encoding('CP1251') == 'cp1251'
+    with pytest.raises(ValueError):
+        check_encoding('no-such-encoding')
+
+
+def test_detected_encoding_is_reused(monkeypatch):
+    detected = decode_patch(_patch.encode('cp1251'), 'src/A.java', repo='r')
+    assert detected == _patch
+    assert check_encoding(decoding._detected[('r', 'src/A.java')]) == 'cp1251'
+
+    def detect(bts):
+        raise AssertionError("chardet run again")
+    monkeypatch.setattr(decoding.chardet, 'detect', detect)
+    assert decode_patch(_patch.replace('целое', 'натуральное').encode('cp1251'), 'src/A.java', repo='r') == \
+        _patch.replace('целое', 'натуральное')
+
+
+def test_latin1_not_taken_for_cp1251(monkeypatch):
+    patch = _patch.replace('первое слагаемое', 'äö the a').replace('первое из слагаемых, целое число', 'äöü the a')
+    assert decode_patch(patch.encode('latin-1'), 'src/A.java', repo='r') == patch
+    # Long patches are sampled by whole lines from their start
+    monkeypatch.setattr(decoding, '_detect_sample_limit', len(patch) // 3)
+    sample = decoding._detection_sample(patch.encode('latin-1'))
+    assert patch.encode('latin-1').startswith(sample) and sample.endswith(b'\n') and \
+        len(patch) // 4 < len(sample) <= len(patch) // 3
+    decoding._detected.clear()
+    assert decode_patch(patch.encode('latin-1'), 'src/A.java', repo='r') == patch
+
+
+@pytest.mark.parametrize('mode', [[], ['-j', '2'], ['-st'], ['-pf']], ids=lambda mode: ' '.join(mode) or 'plain')
+def test_latin1_repository_as_reference(tmp_path, mode):
+    repo = str(tmp_path)
+    make_latin1_repository(repo)
+    reference_rows, reference_printed = reference_report(repo)
+    assert any('äöü' in cell for row in reference_rows for cell in row)
+    rows, printed = run_ripper(repo, *mode)
+    assert (rows, report(printed)) == (reference_rows, reference_printed)
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+# The function header state machine stops at the same line as the regular expression
+# it replaces, run on the lines joined so far
+
+import random
+import pytest
+import repo_fixtures  # puts the repository and benchmarks/ on sys.path
+from javadoc_analyzer import _function_headers, FUNCTION_HEADER_START, function_header_feed, function_header_matched
+from function_headers import SIGNATURES
+
+_bases = [
+    ' public int add(int a, int b) {', '    @Override', ' @Override public void x() throws A, B;',
+    '     public <T extends Comparable<T>> java.util.Map<String, java.util.List<T>> sub(', '             int a,',
+    '             java.util.List<T> b) throws IllegalStateException {', ' int /*c*/ f(/*d*/ int[] a) {',
+    '@A@B x(y) z;', '@Override(', ' void f() {}', ' a(b) c, d {', ' @Deprecated', '  ', '', ' }',
+    ' private static final int X = 1;', ' /**', ' * @param x', ' foo(bar /*baz*/ ) ;',
+]
+_chars = list('ab_ \t@/*(){};,[]<>?.=é٣')
+
+
+def _regex_line(lines):
+    return next((i for i in range(len(lines)) if _function_headers.search(''.join(lines[:i + 1]))), None)
+
+
+def _state_machine_line(lines):
+    state = FUNCTION_HEADER_START
+    for i, l in enumerate(lines):
+        state = function_header_feed(state, l)
+        if function_header_matched(state):
+            return i
+    return None
+
+
+def _mutate(rnd: random.Random, line: str) -> str:
+    chars = list(line)
+    for _ in range(rnd.randint(0, 3)):
+        p = rnd.randint(0, len(chars))
+        op = rnd.random()
+        if op < 0.4:
+            chars.insert(p, rnd.choice(_chars))
+        elif chars and op < 0.8:
+            del chars[min(p, len(chars) - 1)]
+        elif chars:
+            chars[min(p, len(chars) - 1)] = rnd.choice(_chars)
+    return ''.join(chars)
+
+
+@pytest.mark.parametrize('name', sorted(SIGNATURES))
+def test_benchmark_signatures(name):
+    assert _state_machine_line(SIGNATURES[name]) == _regex_line(SIGNATURES[name])
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_mutated_lines(seed):
+    rnd = random.Random(seed)
+    for _ in range(2000):
+        lines = [_mutate(rnd, rnd.choice(_bases)) for _ in range(rnd.randint(1, 6))]
+        assert _state_machine_line(lines) == _regex_line(lines), lines
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import subprocess
+from repo_fixtures import make_review_repository
+from git_runner import GitSteps, GitRunner, run_steps, new_event_loop
+
+
+def _steps(name: str) -> GitSteps:
+    sha = (yield ['git', 'rev-parse', 'HEAD']).decode().strip()
+    try:
+        yield ['git', 'cat-file', '-t', 'no-such-object']
+        missing = False
+    except subprocess.CalledProcessError:
+        missing = True
+    kind = (yield ['git', 'cat-file', '-t', sha + ':' + name]).decode().strip()
+    return sha, missing, kind
+
+
+def test_concurrent_steps_as_blocking(tmp_path):
+    repo = str(tmp_path)
+    make_review_repository(repo)
+    names = ['src', 'src/A.java', 'src/Y.java', 'src/Ü.java']
+    expected = [run_steps(_steps(n), repo) for n in names]
+    assert [kind for _, _, kind in expected] == ['tree', 'blob', 'blob', 'blob']
+    assert all(missing for _, missing, _ in expected)
+
+    loop = new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        git = GitRunner(2)
+        assert loop.run_until_complete(asyncio.gather(*[git.run_steps(_steps(n), repo) for n in names])) == expected
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+
+import os
+from repo_fixtures import make_review_repository, run_ripper, report
+
+_journal = '__rip-rep-journal.jsonl'
+
+
+def test_plain_run_keeps_no_journal(tmp_path):
+    repo = str(tmp_path)
+    make_review_repository(repo)
+    run_ripper(repo)
+    assert not os.path.exists(os.path.join(repo, _journal))
+    run_ripper(repo, '-re')
+    with open(os.path.join(repo, _journal), 'rb') as f:
+        journaled = f.read()
+    run_ripper(repo, fresh=False)
+    with open(os.path.join(repo, _journal), 'rb') as f:
+        assert f.read() == journaled
+
+
+def test_resumed_run_reports_the_same(tmp_path):
+    repo = str(tmp_path)
+    make_review_repository(repo)
+    rows, printed = run_ripper(repo, '-re')
+    # An interrupted run: the header, two commits and half of the third one
+    with open(os.path.join(repo, _journal), 'rb') as f:
+        lines = f.readlines()
+    assert len([l for l in lines if b'"sha1"' in l]) == 4
+    with open(os.path.join(repo, _journal), 'wb') as f:
+        f.writelines(lines[:3] + [lines[3][:len(lines[3]) // 2]])
+    resumed_rows, resumed = run_ripper(repo, '-re', fresh=False)
+    assert 'Resuming with 2 commits classified before' in resumed
+    assert 'Journaled results reused for 2 commits' in resumed
+    assert (resumed_rows, report(resumed)) == (rows, report(printed))
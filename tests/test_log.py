@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+
+# Reading the log in chunks gives the commits and counts of "git log --name-status --all"
+
+import pytest
+import repo_fixtures  # puts the repository and benchmarks/ on sys.path
+import synthetic
+import commits
+from commits import get_commits, fan_out_commits
+
+
+@pytest.fixture(scope='module')
+def repository(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('log'))
+    synthetic.make_repository(path, 30, 3, 4, 0.8, seed=7, branches=3)
+    return path
+
+
+def _read(read, repo):
+    commits._statistics.pop(repo, None)
+    res = [(c.sha1, c.files, c.date) for c in read()]
+    stats = commits.statistics(repo)
+    return res, (stats.total_commits, stats.java_files_commits)
+
+
+@pytest.mark.parametrize('chunk', [1, 7, 1000])
+@pytest.mark.parametrize('jobs', [1, 3])
+def test_fan_out_as_log(repository, monkeypatch, chunk, jobs):
+    expected = _read(lambda: get_commits(None, repository), repository)
+    assert expected[1][0] == 30
+    monkeypatch.setattr(commits, '_log_chunk_commits', chunk)
+    assert _read(lambda: fan_out_commits(repository, None, jobs), repository) == expected
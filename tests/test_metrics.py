@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import pytest
+from repo_fixtures import run_ripper, reference_report
+import synthetic
+import metrics
+
+
+@pytest.fixture(scope='module')
+def repository(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('metrics'))
+    synthetic.make_repository(path, 30, 3, 5, 0.8, seed=9)
+    _, printed = reference_report(path)
+    counts = [int(l.rsplit(':', 1)[1]) for l in printed[2:]]
+    return path, counts
+
+
+def _status(repo: str) -> dict:
+    with open(os.path.join(repo, metrics.DEFAULT_STATUS_FILE), encoding='utf-8') as f:
+        return json.load(f)
+
+
+@pytest.mark.parametrize('mode', [[], ['-j', '2'], ['-st'], ['-lj', '2'], ['-ag', '2']],
+                         ids=lambda mode: ' '.join(mode) or 'plain')
+def test_finished_status(repository, mode):
+    repo, (total, java, mixed, some_files, pure) = repository
+    run_ripper(repo, '-ms', *mode)
+    status = _status(repo)
+    assert (status['finished'], status['error']) == (True, None)
+    assert (status['log']['commits'], status['log']['java_commits'], status['log']['complete']) == (total, java, True)
+    # Logs whose length is counted up front
+    if '-st' in mode or '-lj' in mode:
+        assert status['log']['expected_commits'] == total
+    assert (status['commits']['done'], status['commits']['classified'], status['commits']['in_flight']) == (java, java, 0)
+    assert status['oldest_in_flight'] is None
+    types = status['commit_types']
+    assert sum(types.values()) == java
+    assert (types.get('JAVA_AND_JAVADOC_TAGS_EVERYWHERE', 0), types.get('ONLY_JAVADOC_TAGS_IN_SOME_FILES', 0),
+            types.get('ONLY_JAVADOC_TAGS_EVERYWHERE', 0)) == (mixed, some_files, pure)
+    assert status['git_subprocesses']['total'] > 0 and status['patches']['files'] > 0
+    assert status['cache']['history_lookups'] > 0 and status['cache']['history_lookup_hit_rate'] is not None
+
+
+def test_cached_status(repository):
+    repo, (total, java, _, _, _) = repository
+    run_ripper(repo, '-ca')
+    run_ripper(repo, '-ca', '-ms', fresh=False)
+    status = _status(repo)
+    assert (status['commits']['cached'], status['commits']['classified']) == (java, 0)
+    assert status['cache']['commit_hit_rate'] == 1.0
+
+
+@pytest.fixture()
+def counting():
+    metrics.reset()
+    metrics.enabled = True
+    yield
+    metrics.enabled = False
+    metrics.reset()
+
+
+def test_status_while_running(counting):
+    metrics.expect_log_commits(10)
+    for java_files in (True, True, True, False):
+        metrics.log_commit(java_files)
+    for sha1 in ('a', 'b', 'c'):
+        metrics.started(None, sha1)
+    metrics.finished(None, 'a', 'ONLY_JAVADOC_TAGS_EVERYWHERE', False)
+    metrics.finished(None, 'b', 'WITHOUT_JAVADOC_TAGS', True)
+    metrics.history_looked_up(4, 1)
+    status = metrics.status()
+    assert status['log']['expected_commits'] == 10 and status['log']['eta_seconds'] is not None
+    assert (status['commits']['done'], status['commits']['classified'], status['commits']['cached'],
+            status['commits']['in_flight']) == (2, 1, 1, 1)
+    assert status['oldest_in_flight']['sha1'] == 'c'
+    assert (status['cache']['commit_hit_rate'], status['cache']['history_lookup_hit_rate']) == (0.5, 0.25)
+    assert 'recent_per_second' in metrics.status(status)['commits']
+
+
+def test_counters_handed_over(counting):
+    metrics.subprocess_started()
+    metrics.patch_analysed(100)
+    taken = metrics.take()
+    assert (taken['git_subprocesses'], taken['patch_bytes']) == (1, 100)
+    assert metrics.counters == metrics.Counters()
+    metrics.merge(taken)
+    metrics.merge(taken)
+    assert (metrics.counters.git_subprocesses, metrics.counters.patches, metrics.counters.patch_bytes) == (2, 2, 200)
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+# The JavaDoc model of a file derived from its previous version, and the analysis of zero-context
+# patches replayed over it, are the same as scanning the file and analysing the full-context patch
+
+import random
+import subprocess
+import pytest
+from repo_fixtures import FixtureRepository
+import javadoc_model
+from javadoc_model import FileModel
+from commits import iter_file_patches
+from javadoc_analyzer import scan_java_javadoc_changes
+
+_pieces = [
+    '/**', ' * Summary text.', ' *', ' * @param p the thing', ' * @return value', ' * @throws X when', '   continuation line',
+    ' * @see Other', ' * @since 1', ' */', '*/', '/** one-liner @param x */', 'public int m(int a) {', '  return a;', '}',
+    '--i;', '-x;', 'int y = 1; // @param fake', 'String s = "*/";', '@Override', '  @Deprecated', '', '   ',
+    '\t * @param t tabbed', ' * @exception E', '/* not javadoc @param */', 'void f();', ' **/', ' * */', '+plus',
+    '@@ weird', '- * @param dashed',
+]
+
+
+def _edit(rnd: random.Random, lines):
+    # (start, count, replacement) blocks ordered by start, and the lines after them
+    hunks = []
+    pos = 0
+    while pos <= len(lines) and len(hunks) < 4:
+        start = rnd.randint(pos, min(len(lines), pos + 8))
+        count = rnd.randint(0, min(3, len(lines) - start))
+        replacement = [rnd.choice(_pieces) for _ in range(rnd.randint(0 if count else 1, 3))]
+        hunks.append((start, count, replacement))
+        pos = start + count + 1
+    res = []
+    pos = 0
+    for start, count, replacement in hunks:
+        res.extend(lines[pos:start])
+        res.extend(replacement)
+        pos = start + count
+    res.extend(lines[pos:])
+    return hunks, res
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_derived_model_as_scanned(seed):
+    rnd = random.Random(seed)
+    for _ in range(300):
+        lines = [rnd.choice(_pieces) for _ in range(rnd.randint(0, 30))]
+        hunks, new_lines = _edit(rnd, lines)
+        derived = FileModel.scan(lines).derive(hunks)
+        scanned = FileModel.scan(new_lines)
+        assert (derived.lines, derived.states) == (scanned.lines, scanned.states)
+
+
+def _key(changes):
+    return (changes.has_java_changed, changes.has_javadoc_changed, changes.has_javadoc_tag_changed,
+            changes.modifications, changes.pending_headers)
+
+
+@pytest.fixture(scope='module')
+def fuzzed_repository(tmp_path_factory):
+    rnd = random.Random(1)
+    repo = FixtureRepository(str(tmp_path_factory.mktemp('model')))
+    files = {'src/F%d.java' % k: [rnd.choice(_pieces) for _ in range(rnd.randint(5, 60))] for k in range(3)}
+    for n in range(30):
+        for name in rnd.sample(sorted(files), rnd.randint(1, len(files))):
+            if n:
+                files[name] = _edit(rnd, files[name])[1]
+            repo.write(name, files[name])
+        repo.commit('2020-01-%02d' % (n + 1), 'commit %d' % n)
+    return repo.path
+
+
+@pytest.mark.parametrize('order, limit', [('log', 1 << 20), ('reverse', 1 << 20), ('shuffle', 50)])
+def test_model_changes_as_full_patch(fuzzed_repository, monkeypatch, order, limit):
+    repo = fuzzed_repository
+    sha1s = subprocess.check_output(['git', 'rev-list', '--all'], cwd=repo).decode('ascii').split()
+    if order == 'reverse':
+        sha1s.reverse()
+    elif order == 'shuffle':
+        random.Random(2).shuffle(sha1s)
+    monkeypatch.setattr(javadoc_model, '_models', type(javadoc_model._models)())
+    monkeypatch.setattr(javadoc_model, '_models_lines', 0)
+    monkeypatch.setattr(javadoc_model, '_models_lines_limit', limit)
+    monkeypatch.setattr(javadoc_model, '_cat_files', {})
+    compared = tag_changes = 0
+    try:
+        for sha1 in sha1s:
+            full = dict(iter_file_patches(sha1, repo))
+            for f, patch in iter_file_patches(sha1, repo, context=0, full_index=True):
+                if f not in full:
+                    continue
+                changes = javadoc_model.scan_file_changes(f, patch.decode('utf-8'), repo=repo)
+                if changes is not None:
+                    assert _key(changes) == _key(scan_java_javadoc_changes(f, full[f].decode('utf-8'))), (sha1, f)
+                    compared += 1
+                    tag_changes += changes.has_javadoc_tag_changed
+    finally:
+        javadoc_model._close_cat_files()
+    assert compared > 20 and tag_changes > 5
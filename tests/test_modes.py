@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+# Every way of running the analysis reports what the plain analysis of each file and header does
+
+import pytest
+from repo_fixtures import make_review_repository, make_edge_repository, make_latin1_repository, run_ripper, \
+    reference_report, report
+import synthetic
+
+MODES = [
+    [],
+    ['-j', '2'],
+    ['-st'],
+    ['-st', '-j', '2'],
+    ['-pf'],
+    ['-pf', '-j', '2'],
+    ['-ag', '3'],
+    ['-pf', '-ag', '3'],
+    ['-lj', '3'],
+    ['-lj', '3', '-j', '2'],
+    ['-eg', 'model'],
+    ['-eg', 'model', '-j', '2'],
+]
+
+
+@pytest.fixture(scope='module', params=['review', 'edge', 'latin1', 'synthetic'])
+def repository(request, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp(request.param))
+    if request.param == 'review':
+        make_review_repository(path)
+    elif request.param == 'edge':
+        make_edge_repository(path)
+    elif request.param == 'latin1':
+        make_latin1_repository(path)
+    else:
+        synthetic.make_repository(path, 40, 3, 6, 0.8, seed=3, branches=2)
+    return path, reference_report(path)
+
+
+@pytest.mark.parametrize('mode', MODES, ids=lambda mode: ' '.join(mode) or 'plain')
+def test_mode_reports_as_reference(repository, mode):
+    path, (reference_rows, reference_printed) = repository
+    rows, printed = run_ripper(path, *mode)
+    assert rows == reference_rows
+    assert report(printed) == reference_printed
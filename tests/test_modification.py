@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+import os
+import datetime
+import subprocess
+import pytest
+from repo_fixtures import make_review_repository, make_edge_repository
+import synthetic
+import modification
+from modification import find_modification_before, find_modifications_before, modifications_before_steps
+
+_add_header = [('public int add(int a,', 2)]
+
+
+@pytest.fixture(autouse=True)
+def fresh_walks():
+    modification._walks.clear()
+    modification._valid_messages.clear()
+    yield
+    modification._walks.clear()
+    modification._valid_messages.clear()
+
+
+def _run(steps, repo, commands):
+    # git_runner.run_steps() noting the commands run
+    try:
+        git_cmd = next(steps)
+        while True:
+            commands.append(git_cmd)
+            git_cmd = steps.send(subprocess.check_output(git_cmd, cwd=repo))
+    except StopIteration as stop:
+        return stop.value
+
+
+def _names(commands):
+    # The git commands run, by name
+    return [next(arg for arg in c[1:] if not arg.startswith('-')) for c in commands]
+
+
+def _date(sha, repo):
+    return datetime.datetime.strptime(
+        subprocess.check_output(['git', 'log', '-1', '--format=%ad', '--date=format:%Y-%m-%dT%H:%M:%S', sha], cwd=repo)
+        .decode().strip(), "%Y-%m-%dT%H:%M:%S"
+    )
+
+
+def _headers(repo, sha, file_name):
+    # Every method header of the file at sha, with the line after it
+    content = subprocess.check_output(['git', 'show', f'{sha}:{file_name}'], cwd=repo).decode('utf-8', 'replace')
+    return [(l.strip(), 2) for l in content.split('\n') if l.strip().startswith('public ') and '(' in l]
+
+
+def test_header_line_deleted_before(tmp_path):
+    # Blame doesn't see the commit deleting "int b," from the header, "git log -L" does
+    repo = str(tmp_path)
+    shas = make_review_repository(repo)
+    sha = shas['edit param']
+    before = _date(sha, repo)
+    expected = find_modification_before('src/A.java', _add_header[0][0], 2, sha, before, repo)
+    assert expected == datetime.datetime(2020, 1, 2, 12, 0)
+    assert find_modifications_before('src/A.java', _add_header, sha, before, repo=repo) == [expected]
+
+
+def test_headers_share_one_walk(tmp_path):
+    # Both headers of a file changed on the two sides of a merge are followed through one "git log"
+    repo = str(tmp_path)
+    shas = make_edge_repository(repo)
+    sha = shas['tags after merge']
+    before = _date(sha, repo)
+    headers = _headers(repo, sha, 'src/M.java')
+    commands = []
+    found = _run(modifications_before_steps('src/M.java', headers, sha, before, repo=repo), repo, commands)
+    assert found == [find_modification_before('src/M.java', h, n, sha, before, repo) for h, n in headers]
+    assert len(headers) == 2 and _names(commands).count('log') == 1
+
+
+def test_walk_reused_at_older_commit(tmp_path):
+    repo = str(tmp_path)
+    shas = make_review_repository(repo)
+    commands = []
+    for name in ('edit throws continuation', 'edit param'):
+        sha = shas[name]
+        before = _date(sha, repo)
+        found = _run(modifications_before_steps('src/A.java', _add_header, sha, before, repo=repo), repo, commands)
+        assert found == [find_modification_before('src/A.java', _add_header[0][0], 2, sha, before, repo)]
+    # The second lookup only reads the file, the history of the first holds the older commit
+    assert _names(commands).count('log') == 1 and _names(commands)[-1] == 'cat-file'
+
+
+@pytest.mark.parametrize('make', ['edge', 'synthetic'])
+def test_walk_as_log_l(tmp_path, make):
+    # Every header of every file at every commit, merges, a rename, CRLF and Windows-1251 included
+    repo = str(tmp_path)
+    if make == 'edge':
+        make_edge_repository(repo)
+    else:
+        synthetic.make_repository(repo, 16, 2, 4, 0.8, seed=3, branches=2)
+    for sha in subprocess.check_output(['git', 'rev-list', '--all'], cwd=repo).decode().split():
+        before = _date(sha, repo)
+        for file_name in subprocess.check_output(['git', 'ls-tree', '-r', '--name-only', sha], cwd=repo).decode().split():
+            if os.path.splitext(file_name)[1] != '.java':
+                continue
+            headers = _headers(repo, sha, file_name)
+            assert headers
+            expected = [find_modification_before(file_name, h, n, sha, before, repo) for h, n in headers]
+            assert find_modifications_before(file_name, headers, sha, before, repo=repo) == expected, (sha, file_name)
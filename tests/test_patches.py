@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from repo_fixtures import make_review_repository, make_edge_repository, run_ripper, rows_by_commit
+from commits import _split_file_patches, _patch_file_name, iter_file_patches, stream_commits
+
+_y_patch = [
+    b'diff --git a/src/Y.java b/src/Y.java\n',
+    b'--- a/src/Y.java\n',
+    b'+++ b/src/Y.java\n',
+    b'@@ -1 +1 @@\n',
+    b'-     * @return zero\n',
+    b'+     * @return nothing\n',
+]
+_quoted_patch = [
+    b'diff --git "a/src/\\303\\234.java" "b/src/\\303\\234.java"\n',
+    b'--- "a/src/\\303\\234.java"\n',
+    b'+++ "b/src/\\303\\234.java"\n',
+    b'@@ -1 +1 @@\n',
+    b'-x\n',
+    b'+y\n',
+]
+
+
+def test_patch_file_name():
+    assert _patch_file_name(b'diff --git a/src/A B.java b/src/A B.java\n') == 'src/A B.java'
+    assert _patch_file_name(b'diff --git a/src/A.java b/src/B.java\n') is None
+    assert _patch_file_name(_quoted_patch[0]) is None
+
+
+def test_quoted_patch_is_not_glued_to_previous_file():
+    assert list(_split_file_patches(_y_patch + _quoted_patch + _y_patch)) == [
+        ('src/Y.java', b''.join(_y_patch)), ('src/Y.java', b''.join(_y_patch))
+    ]
+
+
+@pytest.mark.parametrize('mode', [[], ['-st'], ['-eg', 'model'], ['-ag', '2']])
+def test_non_ascii_file_name_changed_along(tmp_path, mode):
+    shas = make_review_repository(str(tmp_path))
+    rows, _ = run_ripper(str(tmp_path), *mode)
+    quoted = rows_by_commit(rows)['P/' + shas['edit quoted']]
+    assert [row[3] for row in quoted] == ['src/Y.java']
+    assert quoted[0][4].count('@return') == 2
+
+
+def test_streamed_patches_as_shown(tmp_path):
+    # The history stream separates commits by blank lines, which no patch keeps
+    make_edge_repository(str(tmp_path))
+    streamed = list(stream_commits(repo=str(tmp_path)))
+    assert len(streamed) == 5
+    for commit in streamed:
+        assert commit.patches == list(iter_file_patches(commit.sha1, str(tmp_path), commit.files))
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+
+# The prefilter only leaves out files whose full analysis reports no JavaDoc tag change
+
+import subprocess
+from repo_fixtures import make_review_repository
+import synthetic
+from commits import get_commits, tag_change_candidates
+from javadoc_analyzer import scan_java_javadoc_changes, may_have_javadoc_tag_changed
+
+
+def _check_candidates(repo: str) -> int:
+    # The number of files the prefilter leaves out
+    left_out = 0
+    for c in get_commits(None, repo):
+        if not c.files:
+            continue
+        candidates = tag_change_candidates(c.sha1, c.files, repo)
+        for f in c.files:
+            patch = subprocess.check_output(
+                ['git', 'format-patch', '-1', '--stdout', '--unified=100000', c.sha1, '--', f], cwd=repo
+            ).decode('utf-8')
+            if scan_java_javadoc_changes(f, patch).has_javadoc_tag_changed:
+                assert f in candidates, (c.sha1, f)
+                assert may_have_javadoc_tag_changed(patch.split('\n')), (c.sha1, f)
+            elif f not in candidates:
+                left_out += 1
+    return left_out
+
+
+def test_review_candidates(tmp_path):
+    make_review_repository(str(tmp_path))
+    _check_candidates(str(tmp_path))
+
+
+def test_synthetic_candidates(tmp_path):
+    synthetic.make_repository(str(tmp_path), 40, 3, 6, 0.5, seed=11)
+    assert _check_candidates(str(tmp_path)) > 0
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import pytest
+from repo_fixtures import make_review_repository, run_ripper, reference_report, report
+import profiling
+
+
+@pytest.mark.parametrize('mode', [[], ['-j', '2'], ['-pf']], ids=lambda mode: ' '.join(mode) or 'plain')
+def test_profiled_run(tmp_path, mode):
+    repo = str(tmp_path)
+    shas = make_review_repository(repo)
+    reference_rows, reference_printed = reference_report(repo)
+    rows, printed = run_ripper(repo, '-pr', *mode)
+    assert (rows, report(printed)) == (reference_rows, reference_printed)
+    with open(os.path.join(repo, '__profile.json'), encoding='utf-8') as f:
+        profile = json.load(f)
+    stages = profile['stages']
+    expected = [profiling.LOG_PARSING, profiling.PATCH_FETCH, profiling.DECODE, profiling.ANALYSIS,
+                profiling.HISTORY_LOOKUP, profiling.REPORT_WRITING]
+    assert set(expected) <= set(stages)
+    assert [name for name in stages if name in profiling.STAGES] == [name for name in profiling.STAGES if name in stages]
+    assert stages[profiling.ANALYSIS]['calls'] > 0 and stages[profiling.PATCH_FETCH]['subprocesses'] > 0
+    assert profile['slowest_commits'] and {c['sha1'] for c in profile['slowest_commits']} <= set(shas.values())
+    assert os.path.exists(os.path.join(repo, '__profile.csv'))
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+# Every format of the commits report has the rows of the CSV one, column by column, and the statistics
+# the counts printed
+
+import os
+import csv
+import json
+import datetime
+import openpyxl
+import pytest
+from repo_fixtures import make_review_repository, run_ripper, reference_report
+from report import COLUMNS, open_commits_report
+
+_date_columns = {'date', 'functionheader_date'}
+
+
+def _csv_rows(file_name: str):
+    with open(file_name, encoding='utf-8', newline='') as f:
+        return list(csv.reader(f))
+
+
+def _xlsx_rows(file_name: str):
+    # Not read-only, which would drop the empty cells ending a row
+    workbook = openpyxl.load_workbook(file_name)
+    try:
+        return [['' if value is None else str(value) for value in row] for row in workbook.active.values]
+    finally:
+        workbook.close()
+
+
+def _jsonl_rows(file_name: str):
+    res = [COLUMNS]
+    with open(file_name, encoding='utf-8') as f:
+        for l in f:
+            record = json.loads(l)
+            assert list(record) == COLUMNS
+            res.append([
+                '' if value is None else value.replace('T', ' ') if column in _date_columns else str(value)
+                for column, value in record.items()
+            ])
+    return res
+
+
+@pytest.fixture(scope='module')
+def repository(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('report'))
+    make_review_repository(path)
+    return path, reference_report(path)
+
+
+_formats = [('csv', _csv_rows), ('xlsx', _xlsx_rows), ('jsonl', _jsonl_rows)]
+
+
+@pytest.mark.parametrize('output_format, read', _formats)
+def test_report_columns(repository, output_format, read):
+    path, (reference_rows, _) = repository
+    run_ripper(path)
+    run_ripper(path, '-f', output_format, fresh=False)
+    rows = read(os.path.join(path, '__commits.' + output_format))
+    assert rows[0] == COLUMNS
+    for i, column in enumerate(COLUMNS):
+        assert [row[i] for row in rows[1:]] == [row[i] for row in reference_rows], column
+
+
+@pytest.mark.parametrize('output_format, read', _formats)
+def test_short_rows_padded(tmp_path, output_format, read):
+    # A commit without modifications has its first columns only
+    date = datetime.datetime(2020, 1, 2, 3, 4, 5)
+    with open_commits_report(output_format, str(tmp_path / '__commits')) as commits_report:
+        commits_report.write([['ONLY_JAVADOC_TAGS_EVERYWHERE', 'P/1', date, '', '']])
+    assert read(str(tmp_path / ('__commits.' + output_format))) == \
+        [COLUMNS, ['ONLY_JAVADOC_TAGS_EVERYWHERE', 'P/1', str(date)] + [''] * (len(COLUMNS) - 3)]
+
+
+def test_statistics(repository):
+    path, (_, reference_printed) = repository
+    run_ripper(path)
+    total, java, mixed, some_files, pure = [int(l.rsplit(':', 1)[1]) for l in reference_printed[2:]]
+    assert _xlsx_rows(os.path.join(path, '__statistics.xlsx')) == [[label, str(count)] for label, count in [
+        ("Commits with Java file changes", java),
+        ("Commits having JavaDoc tags changed", mixed + some_files + pure),
+        ("Commits having Code and JavaDoc tags changed in all files", mixed),
+        ("Commits having files with only JavaDoc tag changes", some_files),
+        ("Commits exclusively of JavaDoc tag changes", pure),
+    ]]
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+import os
+import datetime
+from repo_fixtures import make_review_repository, run_ripper, reference_report, report
+from commits import Commit, CommitType
+from compact import FileStatuses
+from modification import Modification, ModificationList
+from result_cache import ResultCache
+
+
+def _commit() -> Commit:
+    commit = Commit('a' * 40, ['src/A.java', 'src/B.java'], datetime.datetime(2020, 1, 3))
+    commit.commit_type = CommitType.ONLY_JAVADOC_TAGS_IN_SOME_FILES
+    commit.file_statuses = FileStatuses([(False, False, True), (True, False, False)])
+    commit.modifications = ModificationList([
+        Modification('src/A.java', '-     * @param a\n+     * @param a the a', '     void f(int a) {',
+                     datetime.datetime(2020, 1, 1), datetime.timedelta(days=2), 'param'),
+        Modification('src/A.java', '+     *     more', None, None, None, 'throws'),
+    ])
+    return commit
+
+
+def test_stored_commit_loads_the_same(tmp_path):
+    path = os.path.join(str(tmp_path), 'cache.sqlite')
+    with ResultCache(path) as cache:
+        cache.store(_commit())
+    with ResultCache(path) as cache:
+        loaded = Commit('a' * 40, ['src/A.java', 'src/B.java'], datetime.datetime(2020, 1, 3))
+        assert cache.load(loaded)
+        expected = _commit()
+        assert (loaded.commit_type, list(loaded.file_statuses), loaded.modifications) == \
+            (expected.commit_type, list(expected.file_statuses), expected.modifications)
+        # Other files than cached, e.g. the log parsed differently, classify the commit again
+        assert not cache.load(Commit('a' * 40, ['src/A.java'], datetime.datetime(2020, 1, 3)))
+        assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_other_rules_are_not_loaded(tmp_path):
+    path = os.path.join(str(tmp_path), 'cache.sqlite')
+    with ResultCache(path) as cache:
+        cache.store(_commit())
+    with ResultCache(path) as cache:
+        cache.rules = 'other'
+        assert not cache.load(Commit('a' * 40, ['src/A.java', 'src/B.java'], datetime.datetime(2020, 1, 3)))
+
+
+def test_cached_run_reports_as_reference(tmp_path):
+    repo = str(tmp_path)
+    make_review_repository(repo)
+    reference_rows, reference_printed = reference_report(repo)
+    rows, printed = run_ripper(repo, '-ca')
+    assert 'Cached results reused for 0 commits, 4 commits classified' in printed
+    assert (rows, report(printed)) == (reference_rows, reference_printed)
+    rows, printed = run_ripper(repo, '-ca', '-j', '2', fresh=False)
+    assert 'Cached results reused for 4 commits, 0 commits classified' in printed
+    assert (rows, report(printed)) == (reference_rows, reference_printed)
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+
+import os
+import pytest
+from repo_fixtures import make_review_repository, run_ripper
+from tag_index import TagIndex
+
+
+@pytest.mark.parametrize('mode', [[], ['-eg', 'model'], ['-st']])
+def test_continuation_line_counts_for_its_tag(tmp_path, mode):
+    shas = make_review_repository(str(tmp_path))
+    run_ripper(str(tmp_path), '-ti', *mode)
+    with TagIndex(os.path.join(str(tmp_path), '__rip-rep-tags.sqlite')) as index:
+        assert [(c.sha1, c.signature) for c in index.query(tag='throws')] == [
+            (shas['edit throws continuation'], 'public int add(int a, int c)')
+        ]
+        assert [c.sha1 for c in index.query(tag='param')] == [shas['edit param']]
+        assert [c.sha1 for c in index.query(tag='return')] == [shas['edit quoted']]
+        assert [c.tag for c in index.query()] == ['param', 'return', 'throws']
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+# The text helpers of the analyzer give what the plain string operations they replace do
+
+import random
+import pytest
+import repo_fixtures  # puts the repository on sys.path
+import javadoc_analyzer
+from javadoc_analyzer import TextComparison, only_whitespaces, patch_lines, whitespaces
+
+_pieces = ['', ' ', '\t', 'a', 'b', 'ab', 'a b', ' ba ', '@param', '@param x', '*/', ' * ', 'xyz\t', 'é']
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_text_comparison_as_only_whitespaces(seed):
+    rnd = random.Random(seed)
+    for _ in range(2000):
+        comparison = TextComparison()
+        before = []
+        after = []
+        for _ in range(rnd.randint(0, 8)):
+            text = rnd.choice(_pieces)
+            side = rnd.random()
+            if side < 0.3:
+                comparison.add_before(text)
+                before.append(text)
+            elif side < 0.6:
+                comparison.add_after(text)
+                after.append(text)
+            else:
+                comparison.add_both(text)
+                before.append(text)
+                after.append(text)
+        assert comparison.same() == only_whitespaces(''.join(before), ''.join(after)), (before, after)
+        assert comparison.length_difference == \
+            len(whitespaces.sub('', ''.join(before))) - len(whitespaces.sub('', ''.join(after)))
+
+
+_patch_pieces = ['@@ -1,2 +1,2 @@', ' a', '+b', '-c', '', '+', ' ', '+++ b/x', '--- a/x', '\\ No newline at end of file',
+                 ' * @param é']
+
+
+def _patches(rnd: random.Random, count: int, cr: bool):
+    for _ in range(count):
+        lines = [rnd.choice(_patch_pieces) for _ in range(rnd.randint(0, 20))]
+        if cr:
+            lines = [l + '\r' if rnd.random() < 0.3 else l for l in lines]
+        yield '\n'.join(lines) + rnd.choice(['', '\n'])
+
+
+@pytest.mark.parametrize('chunk', [1, 5, 1 << 16])
+def test_patch_lines_as_split(monkeypatch, chunk):
+    monkeypatch.setattr(javadoc_analyzer, '_lines_chunk', chunk)
+    for patch in _patches(random.Random(chunk), 1000, True):
+        assert list(patch_lines(patch)) == patch.replace('\r', '').split('\n')
+